@@ -1,12 +1,17 @@
 import os
 import sys
-from time import time, sleep
+from time import time, sleep, perf_counter_ns
 import gradio as gr
 
 from dbd.AI_model import AI_model
 from dbd.utils.directkeys import PressKey, ReleaseKey, SPACE
+from dbd.utils.frame_gate import FrameGate
+from dbd.utils.frame_pipeline import FramePipeline, format_stats
 from dbd.utils.humanizer import humanized_press
 from dbd.utils.monitoring_mss import Monitoring_mss
+from dbd.utils.scan_scheduler import AdaptiveScanRate
+from dbd.utils.stage_timer import CAPTURE, DECISION, KEY_DISPATCH, SLEEP, StageTimer
+from dbd.utils.trace_profiler import TracingStageTimer, export_trace, format_summary
 
 # Optional: BetterCam (Windows only)
 try:
@@ -26,6 +31,30 @@ except ImportError:
     v4l2_ok = False
     V4L2_AVAILABLE = False
 
+# Optional: X11 MIT-SHM native capture (Linux X11 only)
+try:
+    from dbd.utils.monitoring_xshm import Monitoring_xshm, XSHM_AVAILABLE
+    xshm_ok = XSHM_AVAILABLE
+    if xshm_ok:
+        print("Info: xshm (X11 MIT-SHM) feature available (Linux).")
+except ImportError:
+    xshm_ok = False
+
+try:
+    from dbd.utils.monitoring_xdamage import Monitoring_xdamage, XDAMAGE_AVAILABLE, format_stats as format_xdamage_stats
+    xdamage_ok = XDAMAGE_AVAILABLE
+except ImportError:
+    xdamage_ok = False
+
+# Optional: recorded session replay (frames in the replays/ folder)
+try:
+    from dbd.utils.monitoring_replay import Monitoring_replay, REPLAY_AVAILABLE
+    replay_ok = REPLAY_AVAILABLE
+    if replay_ok:
+        print("Info: replay (recorded session) feature available.")
+except ImportError:
+    replay_ok = False
+
 
 # Detect platform
 def get_platform_info():
@@ -53,6 +82,7 @@ print(f"Info: Platform detected: {platform_info['display']}")
 
 
 ai_model = None
+profile_mode = False  # --profile: ONNX Runtime profiling and stage spans, merged in a trace when monitoring stops
 devices = ["CPU (default)", "GPU"]
 
 def cleanup():
@@ -79,7 +109,8 @@ def apply_fps_preset(preset_name):
     return gr.skip()
 
 
-def monitor(ai_model_path, device, monitoring_str, monitor_id, hit_ante, nb_cpu_threads, use_hesitation):
+def monitor(ai_model_path, device, monitoring_str, monitor_id, hit_ante, nb_cpu_threads, use_hesitation, use_frame_gate, use_adaptive_scan,
+            use_pipeline):
     if ai_model_path is None or not os.path.exists(ai_model_path):
         raise gr.Error("Invalid AI model file", duration=0)
 
@@ -92,15 +123,25 @@ def monitor(ai_model_path, device, monitoring_str, monitor_id, hit_ante, nb_cpu_
     use_gpu = (device == devices[1])
 
     if monitoring_str == "v4l2 (OBS VirtualCam)" and v4l2_ok:
-        monitoring = Monitoring_v4l2(device_id=monitor_id, crop_size=224)
+        monitoring = Monitoring_v4l2(device_id=monitor_id, crop_size=224, threaded=True)
+    elif monitoring_str == "replay" and replay_ok:
+        monitoring = Monitoring_replay(monitor_id, crop_size=224, realtime=True)
+    elif monitoring_str == "xshm" and xshm_ok:
+        monitoring = Monitoring_xshm(monitor_id=monitor_id, crop_size=224)
+    elif monitoring_str == "xdamage" and xdamage_ok:
+        monitoring = Monitoring_xdamage(monitor_id=monitor_id, crop_size=224)
     elif monitoring_str == "bettercam" and bettercam_ok:
         monitoring = Monitoring_bettercam(monitor_id=monitor_id, crop_size=224, target_fps=240)
     else:
-        monitoring = Monitoring_mss(monitor_id=monitor_id, crop_size=224)
+        # Threaded capture: grabbing overlaps with the AI model inference
+        monitoring = Monitoring_mss(monitor_id=monitor_id, crop_size=224, threaded=True)
 
     try:
         global ai_model
-        model_instance = AI_model(ai_model_path, use_gpu, nb_cpu_threads, monitoring)
+        # Cascade stage-1 presence model, if saved next to the classifier
+        presence_model_path = AI_model.find_presence_model(ai_model_path)
+        model_instance = AI_model(ai_model_path, use_gpu, nb_cpu_threads, monitoring, presence_model_path=presence_model_path,
+                                  profile=profile_mode)
         ai_model = model_instance
         execution_provider = model_instance.check_provider()
     except Exception as e:
@@ -113,46 +154,95 @@ def monitor(ai_model_path, device, monitoring_str, monitor_id, hit_ante, nb_cpu_
     elif execution_provider == "TensorRT":
         gr.Info("Running AI model on GPU (success, TensorRT)")
     else:
-        gr.Info(f"Running AI model on CPU (success, {nb_cpu_threads} threads)")
+        if model_instance.session_config is not None:
+            gr.Info(f"Running AI model on CPU (success, auto-tuned: {model_instance.session_config['intra_op_num_threads']} threads)")
+        else:
+            gr.Info(f"Running AI model on CPU (success, {nb_cpu_threads} threads)")
         if use_gpu:
             Warning("Could not run AI model on GPU device. Check python console logs to debug.")
 
     # Variables
     t0 = time()
     nb_frames = 0
+    frame_gate = FrameGate() if use_frame_gate else None
+    scan_scheduler = AdaptiveScanRate() if use_adaptive_scan else None
+    timer = TracingStageTimer() if profile_mode else StageTimer()  # per-stage latency histograms
+    model_instance.stage_timer = timer
+    pipeline = FramePipeline(model_instance, frame_gate=frame_gate, scan_scheduler=scan_scheduler,
+                             stage_timer=timer) if use_pipeline else None
+    prediction = None  # last AI model prediction (PredictionResult)
 
     try:
+        if pipeline is not None:
+            pipeline.start()
+
         while True:
             if model_instance is None:
                 break
-                
-            frame_np = model_instance.grab_screenshot()
+
+            if pipeline is not None:
+                # Capture, frame gate and inference run on the pipeline threads
+                item = pipeline.get()
+                if item is None:
+                    continue
+                frame_np, prediction = item
+            else:
+                if scan_scheduler is not None:
+                    t_sleep = perf_counter_ns()
+                    scan_scheduler.wait()
+                    timer.record(SLEEP, perf_counter_ns() - t_sleep)
+
+                t_capture = perf_counter_ns()
+                frame_np = model_instance.grab_screenshot()
+                timer.record(CAPTURE, perf_counter_ns() - t_capture)
+
+                # Frame gate: reuse the last prediction if the frame did not change
+                if frame_gate is None or frame_gate.changed(frame_np):
+                    prediction = model_instance.predict(frame_np)  # records preprocess, inference, postprocess
+
+            t_decision = perf_counter_ns()
             nb_frames += 1
 
-            pred, desc, probs, should_hit = model_instance.predict(frame_np)
+            pred = prediction.pred
+
+            if scan_scheduler is not None:
+                scan_scheduler.update(pred, prediction.none_probability)
+
+            if prediction.hit:
+                t_sleep = perf_counter_ns()
+                timer.record(DECISION, t_sleep - t_decision)
 
-            if should_hit:
                 # ante-frontier hit delay
                 if pred == 2 and hit_ante > 0:
                     sleep(hit_ante * 0.001)
 
                 # Humanized key press
+                t_press = perf_counter_ns()
                 cooldown = humanized_press(
                     SPACE, PressKey, ReleaseKey, use_hesitation=use_hesitation
                 )
+                timer.record(KEY_DISPATCH, perf_counter_ns() - t_press)
 
-                yield gr.skip(), frame_np, probs
+                yield gr.skip(), frame_np.copy(), prediction.probs, gr.skip()  # capture buffers are reused by the next grab
 
+                t_cooldown = perf_counter_ns()
                 sleep(cooldown)  # humanized cooldown
+                timer.record(SLEEP, perf_counter_ns() - t_cooldown + t_press - t_sleep)  # cooldown + ante-frontier delay
+                if frame_gate is not None:
+                    frame_gate.reset()  # do not reuse the hit prediction on a still unchanged frame
+                if pipeline is not None:
+                    pipeline.flush()  # frames captured during the cooldown are stale
                 t0 = time()
                 nb_frames = 0
                 continue
 
+            timer.record(DECISION, perf_counter_ns() - t_decision)
+
             # Compute fps
             t_diff = time() - t0
             if t_diff > 1.0:
                 fps = round(nb_frames / t_diff, 1)
-                yield fps, gr.skip(), gr.skip()
+                yield fps, gr.skip(), gr.skip(), timer.rows()
 
                 t0 = time()
                 nb_frames = 0
@@ -161,17 +251,61 @@ def monitor(ai_model_path, device, monitoring_str, monitor_id, hit_ante, nb_cpu_
         print(f"Monitor loop error: {e}")
         pass
     finally:
+        if pipeline is not None:
+            pipeline_stats = pipeline.get_stats()
+            pipeline.stop()
         print("Monitoring stopped.")
+        if pipeline is not None:
+            print(f"Pipeline: {format_stats(pipeline_stats)}")
+        if monitoring_str == "xdamage" and xdamage_ok:
+            print(f"xdamage: {format_xdamage_stats(monitoring.get_stats())}")
+        if frame_gate is not None:
+            print(f"Frame gate: skipped {frame_gate.hits}/{frame_gate.hits + frame_gate.misses} frames ({frame_gate.hit_rate:.0%})")
+        if scan_scheduler is not None:
+            scan_stats = scan_scheduler.get_stats()
+            print(f"Adaptive scan rate: patrol {scan_stats['time_patrol']:.0f}s, full {scan_stats['time_full']:.0f}s, "
+                  f"{scan_stats['switches_to_full']} switches to full rate "
+                  f"(latency mean {scan_stats['switch_latency_mean'] * 1000:.1f}ms, max {scan_stats['switch_latency_max'] * 1000:.1f}ms)")
+        if model_instance.presence_model_path is not None:
+            cascade_stats = model_instance.get_cascade_stats()
+            print(f"Cascade: {cascade_stats['stage2']}/{cascade_stats['stage1']} frames escalated to the classifier "
+                  f"({cascade_stats['escalation_rate']:.0%})")
+        if timer.histograms:
+            print(f"Stage latency:\n{timer.format_table()}")
+            try:
+                latency_file = timer.dump_json(metadata={
+                    "model": os.path.basename(ai_model_path), "device": device, "capture": monitoring_str,
+                    "cpu_threads": nb_cpu_threads, "pipeline": use_pipeline})
+                print(f"Stage latency saved to {latency_file}")
+            except OSError as e:
+                print(f"Could not save the stage latency: {e}")
+        if profile_mode:
+            try:
+                trace = export_trace(model_instance, timer, metadata={
+                    "model": os.path.basename(ai_model_path), "device": device, "capture": monitoring_str,
+                    "cpu_threads": nb_cpu_threads, "pipeline": use_pipeline})
+                if trace is not None:
+                    print(format_summary(trace[1]))
+                    print(f"Trace saved to {trace[0]} (open in https://ui.perfetto.dev)")
+            except (OSError, ValueError) as e:
+                print(f"Could not save the profiling trace: {e}")
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DBD Auto Skill Check - Web UI")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile the AI model (ONNX Runtime) and the loop stages, save a Chrome/Perfetto trace when monitoring stops")
+    profile_mode = parser.parse_args().profile
+
     models_folder = "models"
 
     fps_info = "Number of frames per second the AI model analyses the monitored frame."
     cpu_choices = [("Low", 2), ("Normal", 4), ("High", 6), ("CPU BBQ Mode", 8)]
 
     # Find available AI models
-    model_files = [(f, f'{models_folder}/{f}') for f in os.listdir(f"{models_folder}/") if f.endswith(".onnx") or f.endswith(".trt")]
+    model_files = [(f, f'{models_folder}/{f}') for f in os.listdir(f"{models_folder}/") if (f.endswith(".onnx") or f.endswith(".trt")) and not f.endswith("_presence.onnx")]
     if len(model_files) == 0:
         raise gr.Error(f"No AI model found in {models_folder}/", duration=0)
 
@@ -181,12 +315,21 @@ if __name__ == "__main__":
         "mss": "Cross-platform screen capture. Works on Windows and Linux (X11). Does NOT work on Wayland.",
         "bettercam": "Windows-only high-performance screen capture. Recommended for Windows users.",
         "v4l2 (OBS VirtualCam)": "Linux screen capture via OBS Virtual Camera. Works on both X11 and Wayland. Requires OBS with 'Start Virtual Camera' enabled.",
+        "xshm": "Linux X11 native capture through a persistent MIT-SHM shared memory segment. Lower overhead than mss. Does NOT work on Wayland.",
+        "xdamage": "Linux X11 event-driven capture: grabs (MIT-SHM) only when the monitored region is repainted (XDamage events). Near-zero idle CPU. Does NOT work on Wayland.",
+        "replay": "Plays back a recorded session from the replays/ folder (image folder, .npy frame stack or video). For testing and benchmarking without the game.",
     }
     
     if bettercam_ok:
         monitoring_choices.insert(0, "bettercam")
     if v4l2_ok:
         monitoring_choices.append("v4l2 (OBS VirtualCam)")
+    if xshm_ok and platform_info["display"] == "X11":
+        monitoring_choices.append("xshm")
+    if xdamage_ok and platform_info["display"] == "X11":
+        monitoring_choices.append("xdamage")
+    if replay_ok:
+        monitoring_choices.append("replay")
 
     # Auto-select best default monitoring method
     if platform_info["display"] == "Windows" and bettercam_ok:
@@ -206,6 +349,10 @@ if __name__ == "__main__":
     def switch_monitoring_cb(monitoring_str):
         if monitoring_str == "v4l2 (OBS VirtualCam)" and v4l2_ok:
             monitor_choices = Monitoring_v4l2.get_monitors_info()
+        elif monitoring_str == "replay" and replay_ok:
+            monitor_choices = Monitoring_replay.get_monitors_info()
+        elif monitoring_str in ("xshm", "xdamage") and xshm_ok:
+            monitor_choices = Monitoring_xshm.get_monitors_info()
         elif monitoring_str == "bettercam" and bettercam_ok:
             monitor_choices = Monitoring_bettercam.get_monitors_info()
         else:
@@ -226,6 +373,12 @@ if __name__ == "__main__":
             if monitoring_str == "v4l2 (OBS VirtualCam)" and v4l2_ok:
                 with Monitoring_v4l2(monitor_id, crop_size=520) as mon:
                     return mon.get_frame_np()
+            elif monitoring_str == "replay" and replay_ok:
+                with Monitoring_replay(monitor_id, crop_size=520) as mon:
+                    return mon.get_frame_np()
+            elif monitoring_str in ("xshm", "xdamage") and xshm_ok:
+                with Monitoring_xshm(monitor_id, crop_size=520) as mon:
+                    return mon.get_frame_np()
             elif monitoring_str == "bettercam" and bettercam_ok:
                 with Monitoring_bettercam(monitor_id, crop_size=520) as mon:
                     return mon.get_frame_np()
@@ -321,6 +474,28 @@ if __name__ == "__main__":
                              "but creates a small chance of hitting 'Good' instead of 'Great'."
                     )
 
+                    use_frame_gate = gr.Checkbox(
+                        label="Skip Unchanged Frames",
+                        value=False,
+                        info="Reuses the last AI prediction when the monitored frame did not change "
+                             "(lobby, idle). Reduces CPU usage, but may miss a skill check whose cursor "
+                             "moves between the sampled pixels."
+                    )
+
+                    use_adaptive_scan = gr.Checkbox(
+                        label="Adaptive Scan Rate",
+                        value=True,
+                        info="Scans at 20 FPS while no skill check is visible, and switches instantly to full rate "
+                             "when one shows up. Reduces CPU usage."
+                    )
+
+                    use_pipeline = gr.Checkbox(
+                        label="Pipelined Loop",
+                        value=False,
+                        info="Captures the next frame while the AI model classifies the current one. "
+                             "Higher FPS on multi-core CPUs."
+                    )
+
                 # Controls
                 with gr.Column():
                     run_button = gr.Button("▶ RUN", variant="primary", size="lg")
@@ -332,12 +507,15 @@ if __name__ == "__main__":
                 fps = gr.Number(label="AI Model FPS", info=fps_info, interactive=False)
                 image_visu = gr.Image(label="Last hit skill check frame", height=224, interactive=False)
                 probs = gr.Label(label="Skill Check AI Recognition")
+                latency = gr.Dataframe(label="Stage Latency (ms)", headers=["Stage", "p50", "p95", "p99", "max", "count"],
+                                       interactive=False)
 
         # Event handlers
         monitoring = run_button.click(
             fn=monitor, 
-            inputs=[ai_model_path, device, monitoring_str, monitor_id, hit_ante, cpu_stress, use_hesitation],
-            outputs=[fps, image_visu, probs]
+            inputs=[ai_model_path, device, monitoring_str, monitor_id, hit_ante, cpu_stress, use_hesitation, use_frame_gate, use_adaptive_scan,
+                    use_pipeline],
+            outputs=[fps, image_visu, probs, latency]
         )
 
         stop_button.click(fn=cleanup, inputs=None, outputs=fps)
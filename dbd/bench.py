@@ -0,0 +1,397 @@
+# bench.py
+# Benchmark suite: "which setup is fastest on this machine" in one command.
+#
+# Scenarios (all by default, or the ones given on the command line):
+#   capture     get_frame_np of each Monitoring backend available on the host
+#   preprocess  numpy preprocessing variants (allocating, in-place buffer, batch), and preprocessing + inference of each
+#               model, which compares the numpy preprocessing with the preprocessing baked in a uint8 input model
+#   inference   every ONNX model of models/ x execution providers x CPU thread counts
+#   loop        full monitoring loop (tui.py, sequential and pipelined) on a scripted display, photon-to-press latency
+#
+# Each scenario is a function decorated with @scenario(name), yielding result dicts (see make_result).
+# Results are printed as a table, saved as JSON (samples included) in logs/bench_<date>.json and recorded
+# in the benchmark history (see dbd.utils.bench_history, --compare flags the regressions against the previous commit
+# and exits with code 1 if there are any).
+#
+# Usage (from the project root):
+#   python -m dbd.bench [capture preprocess inference loop] [--warmup 20] [--iters 200] [--threads 1 4] [--pin-cpu]
+
+import argparse
+import json
+import os
+import platform
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from glob import glob
+from pathlib import Path
+from time import perf_counter_ns
+
+import numpy as np
+import onnxruntime as ort
+
+from dbd.utils import bench_history
+from dbd.utils.ort_tuner import cpu_model
+
+_ROOT_DIR = Path(__file__).resolve().parent.parent
+_LOG_DIR = _ROOT_DIR / "logs"
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Register a scenario: fn(args) yielding result dicts."""
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+def make_result(scenario_name, name, samples_ms=None, params=None, error=None, **extra) -> dict:
+    """Result of one benchmark: latency samples (ms) and their summary, or the reason it was skipped."""
+    result = {"scenario": scenario_name, "name": name, "params": params or {}}
+    if error is not None:
+        result["error"] = error
+        return result
+
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    result.update({
+        "count": len(samples),
+        "mean": float(samples.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(samples.max()),
+        "fps": float(1000 / samples.mean()) if samples.mean() > 0 else None,
+        "samples": [round(float(s), 4) for s in samples],
+    })
+    result.update(extra)
+    return result
+
+
+def time_calls(fn, nb_warmup, nb_iter) -> np.ndarray:
+    """Latency of fn() in ms, after nb_warmup calls."""
+    for _ in range(nb_warmup):
+        fn()
+
+    samples = np.empty(nb_iter, dtype=np.float64)
+    for i in range(nb_iter):
+        t0 = perf_counter_ns()
+        fn()
+        samples[i] = (perf_counter_ns() - t0) / 1e6
+    return samples
+
+
+@contextmanager
+def cpu_frequency_pinned(enabled=True):
+    """
+    Set the Linux cpufreq governor of every core to "performance" (root only) during the benchmark,
+    and restore the previous governors. Yields the governor in use (or None if unknown).
+    """
+    paths = sorted(glob("/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_governor"))
+    previous = {}
+    for path in paths:
+        try:
+            with open(path) as f:
+                previous[path] = f.read().strip()
+        except OSError:
+            pass
+    governor = ",".join(sorted(set(previous.values()))) or None
+
+    if enabled:
+        if not paths:
+            print("Info: CPU frequency scaling not available (not Linux or no cpufreq), frequency not pinned.")
+        else:
+            try:
+                for path in paths:
+                    with open(path, "w") as f:
+                        f.write("performance")
+                governor = "performance"
+            except OSError:
+                print("Info: cannot set the CPU governor (requires root), frequency not pinned.")
+                enabled = False
+
+    try:
+        yield governor
+    finally:
+        if enabled:
+            for path, value in previous.items():
+                try:
+                    with open(path, "w") as f:
+                        f.write(value)
+                except OSError:
+                    pass
+
+
+# --- Scenarios ---
+
+def _capture_backends(args):
+    """[(name, factory)] of the Monitoring backends available on the host."""
+    from dbd.utils.monitoring_mss import Monitoring_mss
+
+    backends = [
+        ("mss", lambda: Monitoring_mss(monitor_id=args.monitor, crop_size=224)),
+        ("mss threaded", lambda: Monitoring_mss(monitor_id=args.monitor, crop_size=224, threaded=True)),
+    ]
+
+    try:
+        from dbd.utils.monitoring_xshm import Monitoring_xshm, XSHM_AVAILABLE
+        if XSHM_AVAILABLE:
+            backends.append(("xshm", lambda: Monitoring_xshm(monitor_id=args.monitor, crop_size=224)))
+    except ImportError:
+        pass
+
+    try:
+        from dbd.utils.monitoring_xdamage import Monitoring_xdamage, XDAMAGE_AVAILABLE
+        if XDAMAGE_AVAILABLE:
+            backends.append(("xdamage", lambda: Monitoring_xdamage(monitor_id=args.monitor, crop_size=224)))
+    except ImportError:
+        pass
+
+    try:
+        from dbd.utils.monitoring_v4l2 import Monitoring_v4l2, V4L2_AVAILABLE
+        if V4L2_AVAILABLE:
+            backends.append(("v4l2", lambda: Monitoring_v4l2(device_id=0, crop_size=224, threaded=True)))
+    except ImportError:
+        pass
+
+    try:
+        from dbd.utils.monitoring_bettercam import Monitoring_bettercam
+        backends.append(("bettercam", lambda: Monitoring_bettercam(monitor_id=args.monitor - 1, crop_size=224)))
+    except ImportError:
+        pass
+
+    from dbd.utils.monitoring_replay import Monitoring_replay, REPLAY_FOLDER, _is_replay_source
+    replay_source = args.replay
+    if replay_source is None and REPLAY_FOLDER.is_dir():
+        replay_source = next((e.path for e in sorted(os.scandir(REPLAY_FOLDER), key=lambda e: e.name)
+                              if _is_replay_source(e.path)), None)
+    if replay_source is not None:
+        backends.append(("replay", lambda: Monitoring_replay(replay_source, crop_size=224)))
+
+    return backends
+
+
+@scenario("capture")
+def bench_capture(args):
+    for name, factory in _capture_backends(args):
+        try:
+            with factory() as monitoring:
+                samples = time_calls(monitoring.get_frame_np, args.warmup, args.iters)
+        except Exception as e:
+            yield make_result("capture", name, error=f"{type(e).__name__}: {e}")
+            continue
+        yield make_result("capture", name, samples, params={"backend": name, "monitor": args.monitor})
+
+
+@scenario("preprocess")
+def bench_preprocess(args):
+    from dbd.inference_engine import InferenceEngine
+
+    frame = np.random.default_rng(0).integers(0, 256, (224, 224, 3), dtype=np.uint8)
+    buffer = np.empty((1, 3, 224, 224), dtype=np.float32)
+    frames = np.repeat(frame[None], 32, axis=0)
+    batch_buffer = np.empty((32, 3, 224, 224), dtype=np.float32)
+
+    variants = [
+        ("allocating", lambda: InferenceEngine._preprocess_image_for_inference(frame), 1),
+        ("in-place buffer", lambda: InferenceEngine._preprocess_image_for_inference(frame, out=buffer), 1),
+        ("batch of 32, in-place", lambda: InferenceEngine._preprocess_image_for_inference(frames, out=batch_buffer), 32),
+    ]
+    for name, fn, batch_size in variants:
+        samples = time_calls(fn, args.warmup, args.iters) / batch_size
+        yield make_result("preprocess", name, samples, params={"variant": name, "batch_size": batch_size,
+                                                               "stage": "numpy"})
+
+    # Preprocessing baked in the graph (uint8 input models, see model_to_onnx) moves the normalisation into the
+    # session run: only preprocessing + inference (InferenceEngine.predict_classifier) compares it with numpy
+    nb_threads = args.threads[-1]
+    for model_path in args.models:
+        name = f"{os.path.basename(model_path)} predict {nb_threads}t"
+        params = {"model": model_path, "threads": nb_threads, "stage": "preprocess + inference"}
+        try:
+            engine = InferenceEngine(model_path, use_gpu=False, nb_cpu_threads=nb_threads)
+            params["variant"] = "baked in model" if engine.raw_input else "in-place buffer"
+            samples = time_calls(lambda: engine.predict_classifier(frame), args.warmup, args.iters)
+            engine.cleanup()
+        except Exception as e:
+            yield make_result("preprocess", name, params=params, error=f"{type(e).__name__}: {e}")
+            continue
+        yield make_result("preprocess", name, samples, params=params)
+
+
+def _model_inputs(session):
+    model_input = session.get_inputs()[0]
+    shape = [d if isinstance(d, int) else 1 for d in model_input.shape]
+    if model_input.type == "tensor(uint8)":
+        x = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    else:
+        x = np.random.default_rng(0).standard_normal(shape).astype(np.float32)
+    return {model_input.name: x}
+
+
+@scenario("inference")
+def bench_inference(args):
+    for model_path in args.models:
+        for provider in args.providers:
+            # Thread counts only apply to the CPU provider
+            thread_counts = args.threads if provider == "CPUExecutionProvider" else [None]
+            for nb_threads in thread_counts:
+                name = f"{os.path.basename(model_path)} {provider.replace('ExecutionProvider', '')}"
+                if nb_threads is not None:
+                    name += f" {nb_threads}t"
+                params = {"model": model_path, "provider": provider, "threads": nb_threads}
+                try:
+                    sess_options = ort.SessionOptions()
+                    if nb_threads is not None:
+                        sess_options.intra_op_num_threads = nb_threads
+                        sess_options.inter_op_num_threads = nb_threads
+                    session = ort.InferenceSession(model_path, providers=[provider], sess_options=sess_options)
+                    inputs = _model_inputs(session)
+                    samples = time_calls(lambda: session.run(None, inputs), args.warmup, args.iters)
+                except Exception as e:
+                    yield make_result("inference", name, params=params, error=f"{type(e).__name__}: {e}")
+                    continue
+                yield make_result("inference", name, samples, params=params)
+
+
+@scenario("loop")
+def bench_loop(args):
+    from dbd.latency_harness import measure
+
+    nb_threads = args.threads[-1]
+    for model_path in args.models:
+        for use_pipeline in [False, True]:
+            mode = "pipelined" if use_pipeline else "sequential"
+            name = f"tui {mode} {os.path.basename(model_path)} {nb_threads}t"
+            params = {"loop": "tui", "mode": mode, "model": model_path, "threads": nb_threads, "events": args.events}
+            try:
+                result = measure("tui", model_path, nb_cpu_threads=nb_threads, nb_events=args.events,
+                                 use_pipeline=use_pipeline)
+            except Exception as e:
+                yield make_result("loop", name, params=params, error=f"{type(e).__name__}: {e}")
+                continue
+            if len(result["photon_to_press"]) == 0:
+                yield make_result("loop", name, params=params, error="no skill check detected")
+                continue
+            # Latency from the skill check appearance to the key press
+            yield make_result("loop", name, result["photon_to_press"], params=params,
+                              fps=None, missed=result["missed"], unexpected=result["unexpected"])
+
+
+# --- Report ---
+
+def metadata(governor=None) -> dict:
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": bench_history.git_commit(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "cpu": cpu_model(),
+        "cpu_governor": governor,
+        "python": platform.python_version(),
+        "onnxruntime": ort.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def format_table(results) -> str:
+    width = max([len(r["name"]) for r in results] + [4])
+    lines = [f"{'scenario':<10} {'name':<{width}} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'fps':>9}  (ms)"]
+    for r in results:
+        if "error" in r:
+            lines.append(f"{r['scenario']:<10} {r['name']:<{width}} skipped: {r['error']}")
+            continue
+        fps = f"{r['fps']:9.1f}" if r["fps"] is not None else f"{'-':>9}"
+        lines.append(f"{r['scenario']:<10} {r['name']:<{width}} {r['p50']:9.3f} {r['p95']:9.3f} {r['p99']:9.3f} "
+                     f"{r['max']:9.3f} {fps}")
+
+    # Fastest setup of each scenario, among the results measuring the same stage
+    def group(r):
+        return r["scenario"], r["params"].get("stage")
+
+    for scenario_name, stage in dict.fromkeys(group(r) for r in results):
+        measured = [r for r in results if group(r) == (scenario_name, stage) and "error" not in r]
+        if len(measured) > 1:
+            best = min(measured, key=lambda r: r["p50"])
+            title = f"{scenario_name} ({stage})" if stage else scenario_name
+            lines.append(f"fastest {title}: {best['name']} ({best['p50']:.3f} ms p50)")
+    return "\n".join(lines)
+
+
+def run(scenarios, args) -> dict:
+    with cpu_frequency_pinned(args.pin_cpu) as governor:
+        report = {"metadata": metadata(governor), "settings": {"warmup": args.warmup, "iters": args.iters}, "results": []}
+        for name in scenarios:
+            print(f"Running {name}...")
+            for result in SCENARIOS[name](args):
+                report["results"].append(result)
+    return report
+
+
+def parse_args(argv=None):
+    available_providers = ort.get_available_providers()
+    default_providers = [p for p in ["CUDAExecutionProvider", "DmlExecutionProvider", "CPUExecutionProvider"]
+                         if p in available_providers]
+    cpu_count = os.cpu_count() or 1
+    default_threads = sorted({n for n in [1, 2, 4, cpu_count] if n <= cpu_count})
+
+    parser = argparse.ArgumentParser(description="Benchmark suite: capture, preprocessing, inference and full loop")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--warmup", type=int, default=20, help="warmup iterations (not measured)")
+    parser.add_argument("--iters", type=int, default=200, help="measured iterations")
+    parser.add_argument("--models", nargs="+", default=sorted(glob("models/*.onnx")), help="ONNX models (default: models/*.onnx)")
+    parser.add_argument("--providers", nargs="+", default=default_providers, help="ONNX Runtime execution providers")
+    parser.add_argument("--threads", nargs="+", type=int, default=default_threads, help="CPU thread counts")
+    parser.add_argument("--monitor", type=int, default=1, help="monitor id of the capture backends")
+    parser.add_argument("--replay", default=None, help="replay source of the capture scenario (default: first of replays/)")
+    parser.add_argument("--events", type=int, default=20, help="skill checks per run of the loop scenario")
+    parser.add_argument("--pin-cpu", action="store_true", help="set the CPU governor to performance (Linux, root)")
+    parser.add_argument("--json", default=None, help="JSON report path (default: logs/bench_<date>.json)")
+    parser.add_argument("--no-history", action="store_true", help="do not record the run in bench_history.sqlite")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare with the previous commit run, exit code 1 on regression")
+    args = parser.parse_args(argv)
+    if args.compare and args.no_history:
+        parser.error("--compare needs the run to be recorded in the history, it cannot be used with --no-history")
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    return args
+
+
+def main(argv=None) -> int:
+    """Run the benchmarks. Returns the exit code: 1 if --compare found a regression, else 0."""
+    args = parse_args(argv)
+    report = run(args.scenarios, args)
+
+    print()
+    print(format_table(report["results"]))
+
+    path = args.json
+    if path is None:
+        _LOG_DIR.mkdir(exist_ok=True)
+        path = _LOG_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {path}")
+
+    if not args.no_history:
+        run_id = bench_history.record(report)
+        print(f"Run {run_id} recorded in the benchmark history (python -m dbd.utils.bench_history).")
+        if args.compare:
+            comparison = bench_history.compare(candidate_ref=str(run_id))
+            if comparison is None:
+                print("No previous run to compare with.")
+            else:
+                print()
+                print(bench_history.format_comparison(comparison))
+                if bench_history.has_regression(comparison):
+                    return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -54,7 +54,8 @@ if __name__ == '__main__':
             print(f"Pre-annotation using AI. Please wait...", flush=True)
             t0 = time.time()
             torch_ok = importlib.util.find_spec("torch") is not None
-            results1 = infer_from_folder_onnx(dataset_folder, "models/model.onnx", use_gpu=torch_ok, move=True)
+            results1 = infer_from_folder_onnx(dataset_folder, "models/model.onnx", use_gpu=torch_ok,
+                                              nb_cpu_threads=os.cpu_count(), move=True)
             print(f"Pre-annotation using AI done in {time.time() - t0:.2f} seconds", flush=True)
 
             # Reduce frames of folder 0
@@ -3,7 +3,7 @@ import os
 import importlib.util
 from PIL import Image
 
-from dbd.AI_model import AI_model
+from dbd.inference_engine import InferenceEngine
 from dbd.utils.monitoring_mss import Monitoring_mss
 
 
@@ -27,8 +27,8 @@ if __name__ == '__main__':
             # Init AI model
             print("Loading AI model...")
             torch_ok = importlib.util.find_spec("torch") is not None
-            ai_model = AI_model(model_path=model_path, use_gpu=torch_ok, nb_cpu_threads=NB_CPU_THREADS)
-            ai_model.monitor.stop()
+            # Frames are captured here (320x320), the engine only classifies them
+            ai_model = InferenceEngine(model_path=model_path, use_gpu=torch_ok, nb_cpu_threads=NB_CPU_THREADS)
             print(f"AI model loaded using {ai_model.check_provider()} for inference")
 
             # Infinite loop
@@ -42,7 +42,7 @@ if __name__ == '__main__':
                 frame_np = mon.get_frame_np()
 
                 frame_np_224 = frame_np[48:272, 48:272]  # center crop to 224x224
-                pred, _, _, _ = ai_model.predict(frame_np_224)
+                pred = ai_model.predict(frame_np_224).pred
 
                 if pred != 0:
                     output_file = os.path.join(dataset_folder, str(pred), "{:05d}.png".format(image_idx))
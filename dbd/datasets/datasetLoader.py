@@ -1,11 +1,11 @@
 import os.path
 import torch
 import numpy as np
-from glob import glob
 
 import math
 
 from dbd.datasets.transforms import get_training_transforms, get_validation_transforms
+from dbd.utils.dataset_utils import parse_dbd_datasetfolder as _parse_dbd_datasetfolder  # torch-free, shared with the ONNX tools
 from torch.utils.data import DataLoader, WeightedRandomSampler, Dataset
 from torchvision.io import read_image, ImageReadMode
 
@@ -60,35 +60,6 @@ class DBD_dataset(Dataset):
         return dataloader
 
 
-def _parse_dbd_datasetfolder(root_dataset_path):
-    """
-    Get dataset as list of pairs {image path, label} in numpy array format
-    Args:
-        root_dataset_path:
-
-    Returns: numpy array with shape (nb_images, 2), data type is str
-
-    """
-    folders = os.scandir(root_dataset_path)
-    images_all = []
-    targets_all = []
-
-    for folder in folders:
-        name, path = folder.name, folder.path
-        if not name.isdigit():
-            print("Skipping folder " + name)
-            continue
-
-        images = glob(os.path.join(path, "*.*"))
-        print("Parsing folder {} : {} images found".format(name, len(images)))
-
-        images_all += images
-        targets_all += [name] * len(images)
-
-    dataset = np.stack([images_all, targets_all], axis=-1)
-    return dataset
-
-
 def get_dataloaders(root_dataset_path, batch_size=32, seed=42, num_workers=0):
     """  Get training and validation data loaders
     Args:
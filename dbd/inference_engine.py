@@ -0,0 +1,566 @@
+import importlib.util
+import math
+import os
+from time import perf_counter_ns
+
+import numpy as np
+import onnxruntime as ort
+
+from dbd.utils.ort_cache import create_session
+from dbd.utils.ort_tuner import apply_session_config, load_tuning
+from dbd.utils.stage_timer import INFERENCE, POSTPROCESS, PREPROCESS, PRESENCE
+
+# Optional GPU libraries, only probed here (importing torch takes seconds and hundreds of MB):
+# they are imported when the GPU mode or a TensorRT engine is selected
+torch_ok = importlib.util.find_spec("torch") is not None
+if torch_ok:
+    print("Info: torch library found.")
+
+trt_ok = importlib.util.find_spec("tensorrt") is not None and importlib.util.find_spec("pycuda") is not None
+if trt_ok:
+    print("Info: tensorRT and pycuda library found.")
+
+# ONNX Runtime profiles are saved in the logs folder (project root level)
+_PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+
+trt = None  # tensorrt module, imported by InferenceEngine.load_tensorrt
+cuda = None  # pycuda.driver module, imported by InferenceEngine.load_tensorrt
+
+
+class PredictionResult:
+    """
+    Result of InferenceEngine.predict. Only the predicted class and the hit decision are computed per frame,
+    the probabilities (softmax, labelled dict) are computed on first access, when the UI renders them.
+
+    Unpacks as the (pred, desc, probs, should_hit) tuple of previous versions.
+    """
+    __slots__ = ("pred", "hit", "logits", "_probs")
+
+    def __init__(self, pred: int, hit: bool, logits: np.ndarray):
+        self.pred = pred
+        self.hit = hit
+        self.logits = logits  # raw model output, owned by the result
+        self._probs = None
+
+    @property
+    def desc(self) -> str:
+        return InferenceEngine.DESCS[self.pred]
+
+    @property
+    def probs_array(self) -> np.ndarray:
+        if self._probs is None:
+            exp_x = np.exp(self.logits - np.max(self.logits))
+            self._probs = exp_x / np.sum(exp_x)
+        return self._probs
+
+    @property
+    def probs(self) -> dict:
+        """{class description: probability}"""
+        return dict(zip(InferenceEngine.DESCS, self.probs_array.tolist()))
+
+    @property
+    def none_probability(self) -> float:
+        """Probability of class 0 ("None"), read per frame by the scan scheduler: no softmax array is built."""
+        if self._probs is not None:
+            return float(self._probs[0])
+        logits = self.logits.tolist()  # 11 scalars: plain floats are faster than numpy temporaries
+        max_logit = max(logits)
+        return math.exp(logits[0] - max_logit) / sum(math.exp(x - max_logit) for x in logits)
+
+    def __iter__(self):
+        return iter((self.pred, self.desc, self.probs, self.hit))
+
+    def __repr__(self):
+        return f"PredictionResult(pred={self.pred}, desc={self.desc!r}, hit={self.hit})"
+
+
+class InferenceEngine:
+    """
+    Skill check classifier (ONNX Runtime or TensorRT) and optional cascade presence model, without screen capture:
+    used as is by the offline tools (predict_folder, data collection, quantization), and by AI_model with a capture backend.
+    """
+
+    MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+    # (x / 255 - MEAN) / STD == x * SCALE + BIAS, per channel (C, 1, 1)
+    SCALE = (1.0 / (255.0 * STD))[:, None, None]
+    BIAS = (-MEAN / STD)[:, None, None]
+
+    pred_dict = {
+        0: {"desc": "None", "hit": False},
+        1: {"desc": "repair-heal (great)", "hit": True},
+        2: {"desc": "repair-heal (ante-frontier)", "hit": True},
+        3: {"desc": "repair-heal (out)", "hit": False},
+        4: {"desc": "full white (great)", "hit": True},
+        5: {"desc": "full white (out)", "hit": False},
+        6: {"desc": "full black (great)", "hit": True},
+        7: {"desc": "full black (out)", "hit": False},
+        8: {"desc": "wiggle (great)", "hit": True},
+        9: {"desc": "wiggle (frontier)", "hit": False},
+        10: {"desc": "wiggle (out)", "hit": False}
+    }
+
+    # Class metadata lookup arrays, indexed by class
+    DESCS = tuple(v["desc"] for v in pred_dict.values())
+    HITS = np.array([v["hit"] for v in pred_dict.values()], dtype=bool)
+
+    # Profiling stops by itself after this many classifier runs: the profile has an event per operator and per run
+    PROFILE_MAX_RUNS = 2000
+
+    def __init__(self, model_path="model.onnx", use_gpu=False, nb_cpu_threads=None, presence_model_path=None,
+                 presence_threshold=0.2, profile=False):
+        """
+        Args:
+            model_path: classifier model (.onnx or .trt)
+            use_gpu: run the models on GPU
+            nb_cpu_threads: number of CPU threads (CPU mode)
+            presence_model_path: optional cascade stage-1 presence model (.onnx), see find_presence_model.
+                                 Frames it rejects are predicted "None" without running the classifier
+            presence_threshold: minimum presence probability for a frame to be escalated to the classifier
+            profile: enable the ONNX Runtime profiling of the classifier session, for the first PROFILE_MAX_RUNS
+                     runs (see end_profiling)
+        """
+        self.model_path = model_path
+        self.use_gpu = use_gpu
+        self.nb_cpu_threads = nb_cpu_threads
+        self.presence_model_path = presence_model_path
+        self.presence_threshold = presence_threshold
+        self.session_config = None  # auto-tuned CPU session options, if any (see dbd.utils.ort_tuner)
+        self.stage_timer = None  # optional StageTimer, records the preprocess/inference/postprocess latencies
+        self.profile = profile
+        self._nb_profiled_runs = 0
+        self._profile_result = None  # (profile JSON path, start ns) once profiling stopped, see end_profiling
+
+        # Onnx model
+        self.ort_session = None
+        self.input_name = None
+        self.raw_input = False  # preprocessing baked in the graph (uint8 HxWx3 RGB input), see model_to_onnx
+        self.batch_dynamic = False  # dynamic batch dimension, see predict_batch
+        self.io_binding = None  # persistent input/output buffers bound once, see _bind_buffers
+
+        # Persistent input/output buffers (ONNX IOBinding and TensorRT)
+        self._input_buffer = None
+        self._output_buffer = None
+
+        # Cascade stage-1 presence model
+        self.presence_session = None
+        self.presence_input_name = None
+        self.presence_input_size = None
+        self.presence_raw_input = False
+        self.nb_frames_stage1 = 0
+        self.nb_frames_stage2 = 0
+        # Prediction returned for frames rejected by the presence model: P(None) = 1
+        none_logits = np.full(len(self.pred_dict), -np.inf, dtype=np.float32)
+        none_logits[0] = 0.0
+        self._none_result = PredictionResult(0, False, none_logits)
+
+        # TensorRT model
+        self.cuda_context = None
+        self.engine = None
+        self.context = None
+        self.stream = None
+        self.tensor_shapes = None
+        self.bindings = None
+
+        if model_path.endswith(".trt"):
+            self.load_tensorrt()
+        else:
+            self.load_onnx()
+
+        if presence_model_path is not None:
+            self.load_presence_onnx()
+
+    def softmax(self, x):
+        exp_x = np.exp(x - np.max(x))
+        return exp_x / np.sum(exp_x)
+
+    @staticmethod
+    def find_presence_model(model_path):
+        """Return the cascade stage-1 model saved next to the classifier (<name>_presence.onnx), or None."""
+        presence_model_path = os.path.splitext(model_path)[0] + "_presence.onnx"
+        return presence_model_path if os.path.exists(presence_model_path) else None
+
+    def _create_onnx_session(self, model_path):
+        sess_options = ort.SessionOptions()
+
+        # Auto-tuned configuration of this model on this CPU, replaces the number of threads
+        session_config = None if self.use_gpu else load_tuning(model_path)
+        if session_config is not None:
+            apply_session_config(sess_options, session_config)
+            if model_path == self.model_path:
+                self.session_config = session_config
+                print(f"Info: using auto-tuned session options ({session_config['intra_op_num_threads']} threads).")
+
+        elif not self.use_gpu and self.nb_cpu_threads is not None:
+            sess_options.intra_op_num_threads = self.nb_cpu_threads
+            sess_options.inter_op_num_threads = self.nb_cpu_threads
+
+        # ONNX Runtime profiling of the classifier (one event per operator and run), see dbd.utils.trace_profiler
+        if self.profile and model_path == self.model_path:
+            os.makedirs(_PROFILE_DIR, exist_ok=True)
+            sess_options.enable_profiling = True
+            sess_options.profile_file_prefix = os.path.join(_PROFILE_DIR, "ort_profile")
+
+        if self.use_gpu:
+            assert torch_ok, "GPU mode requires torch lib"
+            import torch  # noqa: F401 (loads the CUDA/cuDNN libraries used by onnxruntime-gpu)
+            available_providers = ort.get_available_providers()
+            preferred_execution_providers = ['CUDAExecutionProvider', 'DmlExecutionProvider', 'CPUExecutionProvider']
+            execution_providers = [p for p in preferred_execution_providers if p in available_providers]
+        else:
+            execution_providers = ["CPUExecutionProvider"]
+
+        # Optimized graph loaded from the disk cache when available (CPU), see dbd.utils.ort_cache
+        return create_session(model_path, sess_options, execution_providers)
+
+    @staticmethod
+    def _is_raw_input(model_input):
+        return model_input.type == "tensor(uint8)"
+
+    def load_onnx(self):
+        self.ort_session = self._create_onnx_session(self.model_path)
+        model_input = self.ort_session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.raw_input = self._is_raw_input(model_input)
+        if self.raw_input:
+            print("Info: preprocessing baked in the AI model (uint8 input).")
+
+        # (batch, 3, H, W) float input, or (batch, H, W, 3) uint8 input
+        self.batch_dynamic = len(model_input.shape) == 4 and not isinstance(model_input.shape[0], int)
+
+        self._bind_buffers()
+
+    def _bind_buffers(self):
+        """
+        Bind persistent input and output buffers to the ONNX session once (IOBinding): each frame is preprocessed
+        in place in the input buffer and ORT writes the logits in the output buffer, nothing is allocated per frame.
+        Models with dynamic input or output dimensions keep the regular session.run path.
+        """
+        model_input = self.ort_session.get_inputs()[0]
+        model_output = self.ort_session.get_outputs()[0]
+        input_shape, output_shape = model_input.shape, model_output.shape
+        if self.batch_dynamic:
+            input_shape, output_shape = [1] + input_shape[1:], [1] + output_shape[1:]  # single frame
+        if not all(isinstance(d, int) for d in input_shape + output_shape):
+            return
+
+        self._input_buffer = np.zeros(input_shape, dtype=np.uint8 if self.raw_input else np.float32)
+        self._output_buffer = np.zeros(output_shape, dtype=np.float32)
+
+        # OrtValues wrap the numpy buffers memory (CPU), no copy
+        self.io_binding = self.ort_session.io_binding()
+        self.io_binding.bind_ortvalue_input(model_input.name, ort.OrtValue.ortvalue_from_numpy(self._input_buffer))
+        self.io_binding.bind_ortvalue_output(model_output.name, ort.OrtValue.ortvalue_from_numpy(self._output_buffer))
+
+    def load_presence_onnx(self):
+        self.presence_session = self._create_onnx_session(self.presence_model_path)
+        presence_input = self.presence_session.get_inputs()[0]
+        self.presence_input_name = presence_input.name
+        self.presence_raw_input = self._is_raw_input(presence_input)
+        input_size = presence_input.shape[1 if self.presence_raw_input else -1]  # HWC or NCHW, square
+        self.presence_input_size = input_size if isinstance(input_size, int) else None  # None: resized in the graph
+        print(f"Info: cascade presence model loaded ({input_size}x{input_size} input).")
+
+    def load_tensorrt(self):
+        # https://github.com/NVIDIA/TensorRT/blob/HEAD/quickstart/IntroNotebooks/2.%20Using%20PyTorch%20through%20ONNX.ipynb
+        assert self.use_gpu, "TensorRT engine model requires GPU mode. Aborting."
+        assert torch_ok, "TensorRT engine model requires torch lib. Aborting."
+        assert trt_ok, "TensorRT engine model requires tensorrt lib. Aborting."
+
+        global trt, cuda
+        import torch  # noqa: F401 (CUDA libraries)
+        import tensorrt as trt
+        import pycuda.driver as cuda
+
+        cuda.init()
+        device = cuda.Device(0)
+        self.cuda_context = device.make_context()
+
+        logger = trt.Logger(trt.Logger.WARNING)
+        runtime = trt.Runtime(logger)
+
+        with open(self.model_path, "rb") as f:
+            engine_data = f.read()
+            self.engine = runtime.deserialize_cuda_engine(engine_data)
+            self.context = self.engine.create_execution_context()
+
+        tensor_names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        assert len(tensor_names) == 2
+
+        self.tensor_shapes = [self.engine.get_tensor_shape(n) for n in tensor_names]
+        self._input_buffer = np.empty(self.tensor_shapes[0], dtype=np.float32)
+        self._output_buffer = np.empty(self.tensor_shapes[1], dtype=np.float32)
+
+        p_input = cuda.mem_alloc(1 * self._input_buffer.nbytes)
+        p_output = cuda.mem_alloc(1 * self._output_buffer.nbytes)
+
+        self.context.set_tensor_address(tensor_names[0], int(p_input))
+        self.context.set_tensor_address(tensor_names[1], int(p_output))
+
+        self.bindings = [p_input, p_output]
+        self.stream = cuda.Stream()
+
+    @classmethod
+    def _preprocess_image_for_inference(cls, img_np: np.ndarray, out: np.ndarray = None):
+        """
+        Args:
+            img_np: frame (H, W, 3) RGB, uint8, or stack of frames (N, H, W, 3) if out is given
+            out: optional (1, 3, H, W) or (N, 3, H, W) float32 buffer written in place (no allocation)
+        """
+        if out is not None:
+            x = out if img_np.ndim == 4 else out[0]
+            np.copyto(x, np.moveaxis(img_np, -1, -3))  # (..., H,W,C) to (..., C,H,W), uint8 to float32
+            np.multiply(x, cls.SCALE, out=x)
+            np.add(x, cls.BIAS, out=x)
+            return out
+
+        img = np.asarray(img_np, dtype=np.float32) / 255.0
+        img = np.transpose(img, (2, 0, 1))  # (H,W,C) to (C,H,W) i.e. channel first format
+        img = (img - cls.MEAN[:, None, None]) / cls.STD[:, None, None]
+        img = np.expand_dims(img, axis=0)
+        img = np.ascontiguousarray(img)
+        return img
+
+    def predict_presence(self, img_np: np.ndarray) -> float:
+        """Cascade stage 1: probability that the frame (224x224x3 RGB) contains a skill check."""
+        size = self.presence_input_size
+        img_small = img_np
+        if size is not None and img_np.shape[:2] != (size, size):
+            import cv2
+            img_small = cv2.resize(img_np, (size, size), interpolation=cv2.INTER_AREA)
+        if not self.presence_raw_input:
+            img_small = self._preprocess_image_for_inference(img_small)
+
+        output = self.presence_session.run(None, {self.presence_input_name: img_small})
+        probs = self.softmax(np.squeeze(output))
+        return float(probs[1])
+
+    def predict(self, img_np: np.ndarray):
+        if self.presence_session is not None:
+            self.nb_frames_stage1 += 1
+            if self.stage_timer is not None:
+                t0 = perf_counter_ns()
+                presence = self.predict_presence(img_np)
+                self.stage_timer.record(PRESENCE, perf_counter_ns() - t0)
+            else:
+                presence = self.predict_presence(img_np)
+            if presence < self.presence_threshold:
+                return self._none_result
+            self.nb_frames_stage2 += 1
+
+        return self.predict_classifier(img_np)
+
+    def predict_classifier(self, img_np: np.ndarray):
+        """Run the full classifier, bypassing the cascade stage 1."""
+        timer = self.stage_timer
+        if timer is not None:
+            t0 = perf_counter_ns()
+
+        # Preprocessing, in the persistent input buffer (TensorRT and IOBinding)
+        if self.engine or self.io_binding is not None:
+            if self.raw_input:
+                np.copyto(self._input_buffer, img_np)
+            else:
+                self._preprocess_image_for_inference(img_np, out=self._input_buffer)
+        elif not self.raw_input:
+            img_np = self._preprocess_image_for_inference(img_np)
+        elif self.batch_dynamic:
+            img_np = img_np[None]
+
+        if timer is not None:
+            t1 = perf_counter_ns()
+            timer.record(PREPROCESS, t1 - t0)
+
+        # Inference
+        if self.engine:
+            output = self._output_buffer
+            cuda.memcpy_htod_async(self.bindings[0], self._input_buffer, self.stream)  # transfer input data to device
+            self.context.execute_async_v3(self.stream.handle)  # execute model
+            cuda.memcpy_dtoh_async(output, self.bindings[1], self.stream)  # transfer predictions back
+            self.stream.synchronize()  # synchronize threads
+
+        elif self.io_binding is not None:
+            self.ort_session.run_with_iobinding(self.io_binding)
+            output = self._output_buffer
+
+        else:
+            ort_inputs = {self.input_name: img_np}
+            output = self.ort_session.run(None, ort_inputs)
+
+        if timer is not None:
+            t2 = perf_counter_ns()
+            timer.record(INFERENCE, t2 - t1)
+
+        if self.profile:
+            self._nb_profiled_runs += 1
+            if self._nb_profiled_runs >= self.PROFILE_MAX_RUNS:
+                self._stop_profiling()
+
+        logits = np.array(output, dtype=np.float32).reshape(-1)  # copy: the output buffer is reused by the next call
+        pred = int(logits.argmax())
+        result = PredictionResult(pred, bool(self.HITS[pred]), logits)
+
+        if timer is not None:
+            timer.record(POSTPROCESS, perf_counter_ns() - t2)
+        return result
+
+    def predict_batch(self, frames: np.ndarray) -> list:
+        """
+        Classify a stack of frames with the classifier (no cascade), in a single inference call if the model has
+        a dynamic batch dimension (see model_to_onnx), else frame by frame.
+
+        Args:
+            frames: (N, 224, 224, 3) RGB frames, uint8
+        Returns:
+            list of N PredictionResult
+        """
+        if self.engine or not self.batch_dynamic:
+            return [self.predict_classifier(frame) for frame in frames]
+
+        if self.raw_input:
+            batch = np.ascontiguousarray(frames)
+        else:
+            batch = np.empty((len(frames), 3) + frames.shape[1:3], dtype=np.float32)
+            self._preprocess_image_for_inference(frames, out=batch)
+
+        logits = self.ort_session.run(None, {self.input_name: batch})[0]
+        preds = logits.argmax(axis=1)
+        hits = self.HITS[preds]
+
+        return [PredictionResult(int(pred), bool(hit), row) for pred, hit, row in zip(preds, hits, logits)]
+
+    def predict_many(self, frames, batch_size=32):
+        """
+        Streaming version of predict_batch: classify the frames of an iterable (e.g. a generator of decoded images)
+        in batches of batch_size, and yield one PredictionResult per frame, in order.
+        """
+        stack = None
+        n = 0
+        for frame in frames:
+            if stack is None:
+                stack = np.empty((batch_size,) + frame.shape, dtype=frame.dtype)
+            stack[n] = frame
+            n += 1
+
+            if n == batch_size:
+                yield from self.predict_batch(stack)
+                n = 0
+
+        if n > 0:
+            yield from self.predict_batch(stack[:n])
+
+    def get_cascade_stats(self) -> dict:
+        """Number of frames seen by each cascade stage, and the fraction escalated to the classifier."""
+        return {
+            "stage1": self.nb_frames_stage1,
+            "stage2": self.nb_frames_stage2,
+            "escalation_rate": self.nb_frames_stage2 / self.nb_frames_stage1 if self.nb_frames_stage1 else 0.0,
+        }
+
+    def _stop_profiling(self):
+        start_ns = self.ort_session.get_profiling_start_time_ns()
+        self._profile_result = (self.ort_session.end_profiling(), start_ns)
+        self.profile = False
+
+    def end_profiling(self):
+        """
+        Stop the ONNX Runtime profiling of the classifier (if PROFILE_MAX_RUNS did not stop it already) and write
+        its trace.
+        Returns:
+            (profile JSON path, profiling start time in ns since the epoch), or None if profiling is not enabled
+        """
+        if self._profile_result is None:
+            if not self.profile or self.ort_session is None:
+                return None
+            self._stop_profiling()
+        result, self._profile_result = self._profile_result, None
+        return result
+
+    def check_provider(self):
+        return "TensorRT" if self.engine else self.ort_session.get_providers()[0]
+
+    def cleanup(self):
+        self.stream = None
+        self.context = None
+        self.engine = None
+        self.presence_session = None
+        self.io_binding = None
+
+        if self.bindings:
+            for binding in self.bindings:
+                binding.free()
+            self.bindings = None
+
+        if self.cuda_context:
+            self.cuda_context.pop()
+            self.cuda_context = None
+            print("Info: Cuda context released")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cleanup()
+
+    def __del__(self):
+        self.cleanup()
+
+
+if __name__ == '__main__':
+    # Steady-state allocation of the inference call: session.run (new input and output arrays per frame)
+    # versus IOBinding (persistent buffers). Exits with code 1 if the IOBinding path allocates per frame.
+    #   python -m dbd.inference_engine [model_path]
+    import sys
+    import tracemalloc
+    from time import perf_counter
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "models/model.onnx"
+    frame = np.random.default_rng(0).integers(0, 256, (224, 224, 3), dtype=np.uint8)
+    nb_warmup, nb_iter = 50, 1000
+
+    # IOBinding allocation budgets: only the small result objects (logits copy, PredictionResult) per call,
+    # and no growth with the number of calls
+    max_peak_bytes = 16 * 1024
+    max_growth_bytes = 256 * 1024
+    failed = False
+
+    for mode in ["session.run", "IOBinding"]:
+        engine = InferenceEngine(model_path, nb_cpu_threads=1)
+        if mode == "session.run":
+            engine.io_binding = None
+        elif engine.io_binding is None:
+            print("Model has dynamic dimensions, IOBinding not available")
+            continue
+
+        for _ in range(nb_warmup):
+            engine.predict_classifier(frame)
+
+        # Allocation: peak traced memory within a single inference call, and net growth over all calls
+        # (result arrays preallocated so that the measure itself does not allocate)
+        peaks = np.zeros(nb_iter, dtype=np.int64)
+        latencies = np.zeros(nb_iter, dtype=np.float64)
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        for i in range(nb_iter):
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            t0 = perf_counter()
+            engine.predict_classifier(frame)
+            latencies[i] = perf_counter() - t0
+            peaks[i] = tracemalloc.get_traced_memory()[1] - start
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        latencies = np.sort(latencies) * 1000
+        print(f"{mode:>12}: per-call peak allocation {np.median(peaks) / 1024:7.1f} KiB (max {peaks.max() / 1024:7.1f} KiB), "
+              f"net growth over {nb_iter} calls {growth / 1024:6.1f} KiB | "
+              f"p50 {latencies[len(latencies) // 2]:.3f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms")
+        engine.cleanup()
+
+        if mode == "IOBinding" and (np.median(peaks) > max_peak_bytes or growth > max_growth_bytes):
+            print(f"Error: IOBinding allocates per frame (budgets: {max_peak_bytes // 1024} KiB peak per call, "
+                  f"{max_growth_bytes // 1024} KiB net growth)")
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,318 @@
+# latency_harness.py
+# End-to-end frame-to-keypress latency of the monitoring loops.
+#
+# Drives the real monitoring loops (tui.py DBDAutoSkillCheck.run, app.py monitor) headless, with:
+#   - a scripted frame source emulating a display: "None" frames, then a skill check appears (at a refresh)
+#     and stays on screen for a while, repeatedly. The frames are not altered: the source remembers the presentation
+#     time (perf_counter_ns) of the last frame it returned, read when the AI model classifies a frame as a hit.
+#   - a recording sink in place of directkeys.PressKey / ReleaseKey, and a direct press (humanizer timings bypassed).
+#
+# Reported latencies: photon-to-press (skill check appearance -> key press) and frame-to-press (presentation of the
+# frame classified as a hit -> key press), with the missed skill checks and the unexpected presses, for every
+# combination of models, devices and CPU thread counts.
+# The sequential loop classifies the frame it just grabbed: frame-to-press is exact. The pipelined loop may have grabbed
+# the next frame already: frame-to-press is then understated by at most one capture interval.
+#
+# Usage (from the project root, no display needed):
+#   python -m dbd.latency_harness [--models models/model.onnx ...] [--threads 1 4] [--loop tui app] [--events 30]
+
+import argparse
+import itertools
+import os
+from time import perf_counter_ns, sleep
+
+import numpy as np
+
+from dbd.predict_folder import _load_image
+from dbd.utils.monitoring_mss import Monitoring
+
+_IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images")
+
+# Skill check frames (classified as great hits) and background frame of the README images
+HIT_IMAGES = ["merciless.png", "repair.png", "struggle.png", "wiggle.png"]
+NONE_IMAGE = "run_1.png"
+
+class ScriptEnd(Exception):
+    """Raised by the scripted source at the end of the scenario, ends the monitoring loop."""
+
+
+class ScriptedMonitoring(Monitoring):
+    """
+    Display emulation: the frame on screen changes at each refresh, following the scenario
+    [none_duration of "None" frames, hit_duration of skill check frames] x nb_events.
+    get_frame_np returns the frame currently on screen, like a screen grab.
+    """
+
+    def __init__(self, nb_events=30, none_duration=0.4, hit_duration=0.15, refresh_hz=144, grab_time=0.0,
+                 crop_size=224):
+        super().__init__()
+        self.nb_events = nb_events
+        self.none_duration = none_duration
+        self.hit_duration = hit_duration
+        self.refresh_period_ns = int(1e9 / refresh_hz)
+        self.grab_time = grab_time
+
+        self.none_frame = self._load(NONE_IMAGE, crop_size, crop=True)
+        self.hit_frames = [self._load(name, crop_size) for name in HIT_IMAGES]
+        self._frame = np.empty_like(self.none_frame)
+        self.t_start = None
+        self.last_presented = None  # presentation time of the last returned frame, perf_counter_ns
+
+    @staticmethod
+    def _load(name, crop_size, crop=False):
+        path = os.path.join(_IMAGES_DIR, name)
+        if not crop:
+            return _load_image(path)  # 320x320 skill check crops, as in the dataset
+
+        import cv2
+        img = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)  # full screenshot: center crop as the capture does
+        h, w = img.shape[:2]
+        size = int(crop_size / 1080 * h)
+        img = img[h // 2 - size // 2:h // 2 - size // 2 + size, w // 2 - size // 2:w // 2 - size // 2 + size]
+        return cv2.resize(img, (crop_size, crop_size), interpolation=cv2.INTER_CUBIC)
+
+    @property
+    def event_period_ns(self):
+        return int((self.none_duration + self.hit_duration) * 1e9)
+
+    def _refresh_after(self, t: int) -> int:
+        """First display refresh at or after t (perf_counter_ns)."""
+        return self.t_start + -(-(t - self.t_start) // self.refresh_period_ns) * self.refresh_period_ns
+
+    def _event(self, i: int):
+        onset = self.t_start + i * self.event_period_ns + int(self.none_duration * 1e9)
+        return self._refresh_after(onset), self._refresh_after(onset + int(self.hit_duration * 1e9))
+
+    def events(self):
+        """[(appearance, disappearance)] of the skill checks on screen, perf_counter_ns."""
+        return [self._event(i) for i in range(self.nb_events)]
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def begin(self):
+        self.t_start = perf_counter_ns()
+
+    def get_frame_np(self) -> np.ndarray:
+        if self.t_start is None:
+            self.begin()
+        if self.grab_time > 0:
+            sleep(self.grab_time)
+
+        now = perf_counter_ns()
+        elapsed = now - self.t_start
+        event = elapsed // self.event_period_ns
+        if event >= self.nb_events:
+            raise ScriptEnd()
+
+        # Frame on screen: presented at the last refresh
+        presented = self.t_start + (elapsed // self.refresh_period_ns) * self.refresh_period_ns
+        onset, offset = self._event(event)
+        on_hit = onset <= presented < offset
+
+        np.copyto(self._frame, self.hit_frames[event % len(self.hit_frames)] if on_hit else self.none_frame)
+        self.last_presented = presented
+        return self._frame
+
+
+class RecordingSink:
+    """Replaces PressKey / ReleaseKey: records the key events, with the frame that triggered each press."""
+
+    def __init__(self):
+        self.presses = []
+        self.releases = []
+        self.hit_timestamps = []  # presentation time of the last hit frame, for each press
+        self.recorder = None  # HitFrameRecorder of the AI model
+
+    def press(self, key):
+        self.presses.append(perf_counter_ns())
+        self.hit_timestamps.append(self.recorder.last_hit_timestamp if self.recorder is not None else None)
+
+    def release(self, key):
+        self.releases.append(perf_counter_ns())
+
+
+class DirectPress:
+    """Humanizer replacement: press and release immediately, fixed cooldown (humanized timings bypassed)."""
+
+    def __init__(self, cooldown=0.2):
+        self.cooldown = cooldown
+
+    def press(self, key_code, press_fn, release_fn, use_hesitation=True) -> float:
+        press_fn(key_code)
+        release_fn(key_code)
+        return self.cooldown
+
+    __call__ = press  # app.py humanized_press signature
+
+
+class HitFrameRecorder:
+    """Wraps AI_model.predict: remembers the presentation time of the last frame classified as a hit."""
+
+    def __init__(self, ai_model, source):
+        self.predict = ai_model.predict
+        self.source = source
+        self.last_hit_timestamp = None
+        ai_model.predict = self
+
+    def __call__(self, frame):
+        presented = self.source.last_presented  # read before the inference: the capture may go on meanwhile
+        prediction = self.predict(frame)
+        if prediction.hit:
+            self.last_hit_timestamp = presented
+        return prediction
+
+
+def _patch_load_onnx(ai_model_class, source, sink):
+    """Attach the recorder once the model is loaded, and start the scenario: model loading is not measured."""
+    load_onnx = ai_model_class.load_onnx
+
+    def load_onnx_and_record(ai_model):
+        load_onnx(ai_model)
+        sink.recorder = HitFrameRecorder(ai_model, source)
+        source.begin()
+
+    ai_model_class.load_onnx = load_onnx_and_record
+    return load_onnx
+
+
+def run_tui_loop(model_path, use_gpu, nb_cpu_threads, source, sink, use_pipeline=False, use_frame_gate=False,
+                 use_adaptive_scan=False, cooldown=0.2):
+    """Run tui.py DBDAutoSkillCheck.run (quick start) on the scripted source."""
+    import tui
+
+    tui.console.quiet = True
+    tui.load_config = lambda: None
+    tui.Humanizer = lambda: DirectPress(cooldown)
+    tui.PressKey, tui.ReleaseKey = sink.press, sink.release
+
+    app = tui.DBDAutoSkillCheck()
+    app.model_path = model_path
+    app.use_gpu = use_gpu
+    app.cpu_threads = nb_cpu_threads
+    app.monitor_id = 1
+    app.hit_ante = 0
+    app.use_hesitation = False
+    app.use_pipeline = use_pipeline
+    app.use_frame_gate = use_frame_gate
+    app.use_adaptive_scan = use_adaptive_scan
+    app.clear_screen = lambda: None
+    app.ui_update_loop = lambda: None
+    app.get_monitor_list = lambda monitoring_type: [("scripted", 1)]
+    app.create_monitoring = lambda: source
+
+    load_onnx = _patch_load_onnx(tui.AI_model, source, sink)
+    try:
+        app.run(skip_config=True)  # ends with ScriptEnd, caught by the loop
+    finally:
+        tui.AI_model.load_onnx = load_onnx
+
+
+def run_app_loop(model_path, use_gpu, nb_cpu_threads, source, sink, use_pipeline=False, use_frame_gate=False,
+                 use_adaptive_scan=False, cooldown=0.2):
+    """Run app.py monitor (Web UI loop generator, requires gradio) on the scripted source."""
+    import app
+
+    app.Monitoring_mss = lambda **kwargs: source
+    app.humanized_press = DirectPress(cooldown)
+    app.PressKey, app.ReleaseKey = sink.press, sink.release
+
+    load_onnx = _patch_load_onnx(app.AI_model, source, sink)
+    try:
+        device = app.devices[1] if use_gpu else app.devices[0]
+        for _ in app.monitor(model_path, device, "mss", 1, 0, nb_cpu_threads, False, use_frame_gate, use_adaptive_scan,
+                             use_pipeline):
+            pass
+    except (ScriptEnd, RuntimeError):  # RuntimeError: ScriptEnd raised in a FramePipeline thread
+        pass
+    finally:
+        app.AI_model.load_onnx = load_onnx
+
+
+LOOPS = {"tui": run_tui_loop, "app": run_app_loop}
+
+
+def analyze(events, presses, hit_timestamps, slack=0.1):
+    """
+    Match each skill check with the first key press between its appearance and its disappearance (+ slack).
+    Returns:
+        dict with photon-to-press and frame-to-press latencies (ms), misses and unexpected presses
+    """
+    slack_ns = int(slack * 1e9)
+    photon_to_press, frame_to_press = [], []
+    matched = set()
+    for onset, offset in events:
+        for i, t in enumerate(presses):
+            if i not in matched and onset <= t <= offset + slack_ns:
+                matched.add(i)
+                photon_to_press.append((t - onset) / 1e6)
+                if hit_timestamps[i] is not None:
+                    frame_to_press.append((t - hit_timestamps[i]) / 1e6)
+                break
+
+    return {
+        "events": len(events),
+        "photon_to_press": np.array(photon_to_press),
+        "frame_to_press": np.array(frame_to_press),
+        "missed": len(events) - len(photon_to_press),
+        "unexpected": len(presses) - len(matched),
+    }
+
+
+def measure(loop, model_path, use_gpu=False, nb_cpu_threads=4, nb_events=30, refresh_hz=144, grab_time=0.0,
+            use_pipeline=False, use_frame_gate=False, use_adaptive_scan=False):
+    source = ScriptedMonitoring(nb_events=nb_events, refresh_hz=refresh_hz, grab_time=grab_time)
+    sink = RecordingSink()
+    LOOPS[loop](model_path, use_gpu, nb_cpu_threads, source, sink, use_pipeline=use_pipeline,
+                use_frame_gate=use_frame_gate, use_adaptive_scan=use_adaptive_scan)
+    if source.t_start is None:
+        raise RuntimeError(f"{loop} loop did not start (model loading failed?)")
+    return analyze(source.events(), sink.presses, sink.hit_timestamps)
+
+
+def format_result(result) -> str:
+    def stats(values):
+        if len(values) == 0:
+            return f"{'-':>7} {'-':>7} {'-':>7} {'-':>7}"
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return f"{p50:>7.2f} {p95:>7.2f} {p99:>7.2f} {values.max():>7.2f}"
+
+    return (f"{stats(result['photon_to_press'])} | {stats(result['frame_to_press'])} | "
+            f"{result['missed']:>2}/{result['events']:<3} missed, {result['unexpected']} unexpected")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="End-to-end frame-to-keypress latency of the monitoring loops")
+    parser.add_argument("--models", nargs="+", default=["models/model.onnx"])
+    parser.add_argument("--devices", nargs="+", default=["cpu"], choices=["cpu", "gpu"])
+    parser.add_argument("--threads", nargs="+", type=int, default=[4], help="CPU thread counts")
+    parser.add_argument("--loop", nargs="+", default=["tui"], choices=list(LOOPS), help="monitoring loops (app requires gradio)")
+    parser.add_argument("--events", type=int, default=30, help="skill checks per run")
+    parser.add_argument("--refresh-hz", type=float, default=144, help="emulated display refresh rate")
+    parser.add_argument("--grab-ms", type=float, default=0.0, help="emulated capture time")
+    parser.add_argument("--pipeline", action="store_true", help="pipelined loop")
+    parser.add_argument("--frame-gate", action="store_true", help="skip unchanged frames")
+    parser.add_argument("--adaptive-scan", action="store_true", help="adaptive scan rate")
+    args = parser.parse_args()
+
+    rows = []
+    for loop, model_path, device, nb_threads in itertools.product(args.loop, args.models, args.devices, args.threads):
+        name = f"{loop} {os.path.basename(model_path)} {device} {nb_threads}t"
+        print(f"Running {name}...")
+        try:
+            result = measure(loop, model_path, use_gpu=device == "gpu", nb_cpu_threads=nb_threads,
+                             nb_events=args.events, refresh_hz=args.refresh_hz, grab_time=args.grab_ms / 1000,
+                             use_pipeline=args.pipeline, use_frame_gate=args.frame_gate,
+                             use_adaptive_scan=args.adaptive_scan)
+            rows.append((name, format_result(result)))
+        except Exception as e:
+            rows.append((name, f"failed: {type(e).__name__}: {e}"))
+
+    width = max(len(name) for name, _ in rows)
+    print(f"\n{'':<{width}}   {'photon-to-press (ms)':^31} | {'frame-to-press (ms)':^31}")
+    print(f"{'run':<{width}}   {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} | {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}")
+    for name, line in rows:
+        print(f"{name:<{width}} | {line}")
@@ -1,13 +1,135 @@
+import argparse
 import glob
 import os
+import sys
 
+import numpy as np
+import onnx
 import onnxruntime
-import torch
+from onnx import helper, numpy_helper, TensorProto
 
-from dbd.networks.model import Model
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+
+
+def make_batch_dynamic(model_path, output_path):
+    """
+    Make the batch dimension of an exported ONNX model dynamic (input and output dimension 0), so that
+    AI_model.predict_batch can run several frames per inference call.
+    """
+    model = onnx.load(model_path)
+    graph = model.graph
+
+    for value in list(graph.input[:1]) + list(graph.output):
+        value.type.tensor_type.shape.dim[0].dim_param = "batch"
+
+    # Intermediate shapes were inferred with a batch of 1
+    del graph.value_info[:]
+
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+
+
+def bake_preprocessing(model_path, output_path, resize=False):
+    """
+    Fold the AI_model preprocessing into an exported ONNX model: the new model takes the raw frame as a
+    uint8 (H, W, 3) RGB array, and runs the float conversion, scaling, MEAN/STD normalisation and the
+    (H,W,C) -> (1,C,H,W) layout change in the graph, so that ONNX Runtime can fuse them with the first convolution.
+    AI_model detects such models from their uint8 input and skips its numpy preprocessing.
+
+    Args:
+        model_path: exported ONNX model with a float32 (1, 3, H, W) input, or (batch, 3, H, W) for a dynamic batch
+                    dimension (the new input is then (batch, H, W, 3))
+        output_path: path of the new model
+        resize: if True, the input height and width are dynamic and the frame is resized (bicubic) to the
+                model input size in the graph
+    """
+    model = onnx.load(model_path)
+    graph = model.graph
+
+    model_input = graph.input[0]
+    batch_dim, channels, height, width = model_input.type.tensor_type.shape.dim
+    channels, height, width = channels.dim_value, height.dim_value, width.dim_value
+    assert channels == 3 and height > 0 and width > 0, "Model input must be (1, 3, H, W) with a fixed size"
+    batch = batch_dim.dim_param or None  # dynamic batch dimension name
+
+    # (x / 255 - mean) / std == x * scale + bias, computed on the (1, 3, H, W) float tensor
+    std = np.array(STD, dtype=np.float32).reshape((1, 3, 1, 1))
+    mean = np.array(MEAN, dtype=np.float32).reshape((1, 3, 1, 1))
+    initializers = [
+        numpy_helper.from_array(1.0 / (255.0 * std), "preprocess_scale"),
+        numpy_helper.from_array(-mean / std, "preprocess_bias"),
+    ]
+
+    nodes = [helper.make_node("Cast", ["image"], ["preprocess_float" if batch is None else "preprocess_nhwc"], to=TensorProto.FLOAT)]
+    if batch is None:
+        initializers.append(numpy_helper.from_array(np.array([0], dtype=np.int64), "preprocess_axes"))
+        nodes.append(helper.make_node("Unsqueeze", ["preprocess_float", "preprocess_axes"], ["preprocess_nhwc"]))
+    nodes.append(helper.make_node("Transpose", ["preprocess_nhwc"], ["preprocess_nchw"], perm=[0, 3, 1, 2]))
+    last_output = "preprocess_nchw"
+
+    if resize:
+        # Target sizes: (batch, 3) of the input, (height, width) of the model
+        initializers += [
+            numpy_helper.from_array(np.array([height, width], dtype=np.int64), "preprocess_hw"),
+            numpy_helper.from_array(np.array([0], dtype=np.int64), "preprocess_start"),
+            numpy_helper.from_array(np.array([2], dtype=np.int64), "preprocess_end"),
+        ]
+        nodes += [
+            helper.make_node("Shape", [last_output], ["preprocess_shape"]),
+            helper.make_node("Slice", ["preprocess_shape", "preprocess_start", "preprocess_end"], ["preprocess_nc"]),
+            helper.make_node("Concat", ["preprocess_nc", "preprocess_hw"], ["preprocess_sizes"], axis=0),
+        ]
+        nodes.append(helper.make_node("Resize", [last_output, "", "", "preprocess_sizes"], ["preprocess_resized"],
+                                      mode="cubic", cubic_coeff_a=-0.75, coordinate_transformation_mode="half_pixel"))
+        last_output = "preprocess_resized"
+
+    nodes += [
+        helper.make_node("Mul", [last_output, "preprocess_scale"], ["preprocess_scaled"]),
+        helper.make_node("Add", ["preprocess_scaled", "preprocess_bias"], [model_input.name]),
+    ]
+
+    input_shape = ["height", "width", 3] if resize else [height, width, 3]
+    if batch is not None:
+        input_shape = [batch] + input_shape
+    image_input = helper.make_tensor_value_info("image", TensorProto.UINT8, input_shape)
+
+    graph.input.remove(model_input)
+    graph.input.insert(0, image_input)
+    graph.initializer.extend(initializers)
+    for node in reversed(nodes):
+        graph.node.insert(0, node)
+
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
 
 
 if __name__ == '__main__':
+    # Convert an already exported model (no torch required):
+    #   python -m dbd.model_to_onnx models/model.onnx models/model_uint8.onnx [--resize] [--dynamic-batch] [--keep-preprocessing]
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Convert an exported ONNX model")
+        parser.add_argument("model_path")
+        parser.add_argument("output_path")
+        parser.add_argument("--resize", action="store_true", help="resize frames of any size to the model input size in the graph")
+        parser.add_argument("--dynamic-batch", action="store_true", help="dynamic batch dimension, for AI_model.predict_batch")
+        parser.add_argument("--keep-preprocessing", action="store_true", help="do not bake the preprocessing in the graph")
+        args = parser.parse_args()
+
+        model_path = args.model_path
+        if args.dynamic_batch:
+            make_batch_dynamic(model_path, args.output_path)
+            model_path = args.output_path
+        if not args.keep_preprocessing:
+            bake_preprocessing(model_path, args.output_path, resize=args.resize)
+
+        session = onnxruntime.InferenceSession(args.output_path)
+        print(f"Saved {args.output_path} (input {session.get_inputs()[0].shape} {session.get_inputs()[0].type})")
+        sys.exit(0)
+
+    import torch
+    from dbd.networks.model import Model, PresenceModel
+
     checkpoint = "./lightning_logs/version_11/checkpoints"
     checkpoint = glob.glob(os.path.join(checkpoint, "*.ckpt"))[0]
 
@@ -15,7 +137,32 @@ if __name__ == '__main__':
 
     # TO ONNX
     filepath = "model.onnx"
+    dynamic_batch = True  # dynamic batch dimension, for AI_model.predict_batch (fixed batch of 1 for TensorRT conversion)
     input_sample = torch.zeros((1, 3, 224, 224), dtype=torch.float32)
-    model.to_onnx(filepath, input_sample, export_params=True)
+    dynamic_axes = {"input": {0: "batch"}, "output": {0: "batch"}} if dynamic_batch else None
+    model.to_onnx(filepath, input_sample, export_params=True,
+                  input_names=["input"], output_names=["output"], dynamic_axes=dynamic_axes)
     ort_session = onnxruntime.InferenceSession(filepath)
     input_name = ort_session.get_inputs()[0].name
+
+    # Preprocessing baked in the graph (optional): uint8 HxWx3 RGB input, see bake_preprocessing
+    bake_preprocessing_in_graph = False
+    if bake_preprocessing_in_graph:
+        bake_preprocessing(filepath, "model_uint8.onnx")
+        onnxruntime.InferenceSession("model_uint8.onnx")
+
+    # Cascade stage-1 presence model (optional), saved next to the classifier as <name>_presence.onnx
+    # so that AI_model picks it up automatically
+    presence_checkpoint = None  # e.g. "./lightning_logs/version_12/checkpoints"
+    if presence_checkpoint is not None:
+        presence_checkpoint = glob.glob(os.path.join(presence_checkpoint, "*.ckpt"))[0]
+        presence_model = PresenceModel.load_from_checkpoint(presence_checkpoint, strict=True)
+
+        presence_filepath = "model_presence.onnx"
+        input_size = presence_model.input_size
+        input_sample = torch.zeros((1, 3, input_size, input_size), dtype=torch.float32)
+        presence_model.to_onnx(presence_filepath, input_sample, export_params=True)
+        onnxruntime.InferenceSession(presence_filepath)
+
+        if bake_preprocessing_in_graph:
+            bake_preprocessing(presence_filepath, "model_uint8_presence.onnx")
@@ -89,3 +89,80 @@ class Model(pl.LightningModule):
         # scheduler = ExponentialLR(optimizer, gamma=0.9)
 
         return optimizer
+
+
+class PresenceModel(pl.LightningModule):
+    """
+    Cascade stage 1: tiny binary classifier answering "is there a skill check in the frame?" (class 0 vs others).
+    Runs on a 64x64 downscale of the 224x224 frame, only positive frames are escalated to the full Model.
+    Trained on the same dataset as Model, the loss is weighted towards the positive class to favour recall.
+    """
+
+    def __init__(self, lr=1e-3, input_size=64, pos_weight=4.0):
+        super().__init__()
+        self.example_input_array = torch.zeros((32, 3, input_size, input_size), dtype=torch.float32)
+        self.input_size = input_size
+        self.lr = lr
+
+        self.model = self.build_model()
+        self.register_buffer("class_weights", torch.tensor([1.0, pos_weight], dtype=torch.float32))
+
+        self.recall_val = torchmetrics.Recall(task='binary')
+        self.precision_val = torchmetrics.Precision(task='binary')
+
+    def build_model(self):
+        def conv_block(c_in, c_out):
+            return [torch.nn.Conv2d(c_in, c_out, 3, stride=2, padding=1, bias=False),
+                    torch.nn.BatchNorm2d(c_out),
+                    torch.nn.ReLU(inplace=True)]
+
+        # 64 -> 32 -> 16 -> 8 -> 4
+        model = torch.nn.Sequential(
+            *conv_block(3, 16),
+            *conv_block(16, 32),
+            *conv_block(32, 64),
+            *conv_block(64, 64),
+            torch.nn.AdaptiveAvgPool2d(1),
+            torch.nn.Flatten(),
+            torch.nn.Linear(64, 2)
+        )
+        return model
+
+    def _step(self, batch):
+        x, y = batch
+        y = (y != 0).long()  # skill check present or not
+        pred = self(x)
+        loss = torch.nn.functional.cross_entropy(pred, y, weight=self.class_weights)
+        return pred, y, loss
+
+    def training_step(self, batch, batch_idx):
+        _, _, loss = self._step(batch)
+        self.log("loss/train", loss)
+        return loss
+
+    def validation_step(self, batch, batch_idx):
+        pred, y, loss = self._step(batch)
+        self.log("loss/val", loss)
+
+        pred = torch.argmax(pred, dim=-1)
+        self.recall_val.update(pred, y)
+        self.precision_val.update(pred, y)
+
+        return loss
+
+    def on_validation_epoch_end(self):
+        self.log_dict({"Recall/val": self.recall_val.compute(), "Precision/val": self.precision_val.compute()})
+
+        self.recall_val.reset()
+        self.precision_val.reset()
+
+    def forward(self, x):
+        # The dataloaders yield 224x224 frames, downscale them as the runtime does
+        if x.shape[-1] != self.input_size:
+            x = torch.nn.functional.interpolate(x, size=(self.input_size, self.input_size), mode="area")
+        pred = self.model(x)
+        return pred
+
+    def configure_optimizers(self):
+        optimizer = torch.optim.Adam(self.parameters(), lr=self.lr, weight_decay=1e-4)
+        return optimizer
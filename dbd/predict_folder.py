@@ -1,7 +1,9 @@
 import os
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
-from time import time
+from time import time, perf_counter
 
 import numpy as np
 import tqdm
@@ -31,30 +33,52 @@ def infer_from_folder_ckpt(folder, checkpoint):
     return results
 
 
-def infer_from_folder_onnx(folder, model_path, use_gpu=True, nb_cpu_threads=1, copy=False, move=False):
-    from dbd.AI_model import AI_model
+def _load_image(image):
+    """Load a dataset image as the 224x224x3 RGB frame seen by the AI model at runtime."""
+    img = Image.open(image).convert("RGB")
 
-    images = sorted(glob(os.path.join(folder, "*.*")))
-    ai_model = AI_model(model_path=model_path, use_gpu=use_gpu, nb_cpu_threads=nb_cpu_threads)
-    print(f"Using {ai_model.check_provider()} for inference")
-    ai_model.monitor.stop()
+    if img.width != 320 or img.height != 320:
+        img = img.resize((320, 320), Image.Resampling.BICUBIC)
 
-    results = []
-    for image in tqdm.tqdm(images):
-        img = Image.open(image).convert("RGB")
+    # crop to 224x224 from center
+    left = (img.width - 224) // 2
+    top = (img.height - 224) // 2
+    right = left + 224
+    bottom = top + 224
+    img = img.crop((left, top, right, bottom))
+
+    return np.asarray(img)
+
+
+def _iter_images(images, num_workers=4):
+    """Decode images in a thread pool (PIL releases the GIL), in order, with a bounded read-ahead."""
+    with ThreadPoolExecutor(num_workers) as pool:
+        pending = deque()
+        for image in images:
+            pending.append(pool.submit(_load_image, image))
+            if len(pending) > 4 * num_workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
 
-        if img.width != 320 or img.height != 320:
-            img = img.resize((320, 320), Image.Resampling.BICUBIC)
 
-        # crop to 224x224 from center
-        left = (img.width - 224) // 2
-        top = (img.height - 224) // 2
-        right = left + 224
-        bottom = top + 224
-        img = img.crop((left, top, right, bottom))
+def infer_from_folder_onnx(folder, model_path, use_gpu=True, nb_cpu_threads=1, copy=False, move=False,
+                           batch_size=32, num_workers=4):
+    from dbd.inference_engine import InferenceEngine
 
-        img = np.asarray(img)
-        pred, _, _, _ = ai_model.predict(img)
+    images = sorted(glob(os.path.join(folder, "*.*")))
+    ai_model = InferenceEngine(model_path=model_path, use_gpu=use_gpu, nb_cpu_threads=nb_cpu_threads)
+    print(f"Using {ai_model.check_provider()} for inference")
+
+    if not ai_model.batch_dynamic:
+        print("Info: the AI model has a fixed batch size of 1, frames are classified one by one. "
+              "Convert it for batched inference: python -m dbd.model_to_onnx <model.onnx> <output.onnx> --dynamic-batch")
+
+    results = []
+    predictions = ai_model.predict_many(_iter_images(images, num_workers), batch_size=batch_size)
+    for image, prediction in tqdm.tqdm(zip(images, predictions), total=len(images)):
+        pred = prediction.pred
 
         pred_folder = str(pred)
         if copy: shutil.copy(image, os.path.join(folder, pred_folder, os.path.basename(image)))
@@ -65,6 +89,73 @@ def infer_from_folder_onnx(folder, model_path, use_gpu=True, nb_cpu_threads=1, c
     return results
 
 
+def evaluate_cascade(dataset_root, model_path, presence_model_path, presence_threshold=0.2, use_gpu=False,
+                     nb_cpu_threads=1, none_ratio=0.95):
+    """
+    Report of the cascade detector on a labeled dataset folder (one sub folder per class):
+    stage-1 recall (skill check frames escalated to the classifier), escalation rate on "None" frames,
+    and mean per-frame cost of the cascade versus the classifier alone.
+
+    Args:
+        none_ratio: fraction of "None" frames during a match, used to estimate the in-game per-frame cost
+                    (the class distribution of the dataset is not the in-game one)
+    """
+    from dbd.inference_engine import InferenceEngine
+    from dbd.utils.dataset_utils import parse_dbd_datasetfolder
+
+    dataset = parse_dbd_datasetfolder(dataset_root)
+    labels = dataset[:, 1].astype(np.int64)
+
+    ai_model = InferenceEngine(model_path=model_path, use_gpu=use_gpu, nb_cpu_threads=nb_cpu_threads,
+                               presence_model_path=presence_model_path, presence_threshold=presence_threshold)
+    print(f"Using {ai_model.check_provider()} for inference")
+
+    presence = np.empty(len(dataset), dtype=np.float32)
+    preds = np.empty(len(dataset), dtype=np.int64)
+    t_stage1 = np.empty(len(dataset), dtype=np.float64)
+    t_stage2 = np.empty(len(dataset), dtype=np.float64)
+
+    for i, image in enumerate(tqdm.tqdm(dataset[:, 0])):
+        img = _load_image(image)
+
+        t0 = perf_counter()
+        presence[i] = ai_model.predict_presence(img)
+        t1 = perf_counter()
+        preds[i] = ai_model.predict_classifier(img).pred
+        t2 = perf_counter()
+
+        t_stage1[i], t_stage2[i] = t1 - t0, t2 - t1
+
+    positives = labels != 0
+    hits = InferenceEngine.HITS[labels]
+
+    print(f"\nCascade report: {len(dataset)} images, {positives.sum()} with a skill check")
+    print(f"{'threshold':>9} | {'recall':>7} | {'recall (hit classes)':>20} | {'None escalated':>14} | {'cascade acc':>11}")
+    for threshold in sorted({0.05, 0.1, 0.2, 0.3, 0.5, presence_threshold}):
+        escalated = presence >= threshold
+        cascade_preds = np.where(escalated, preds, 0)
+        marker = " *" if threshold == presence_threshold else ""
+        print(f"{threshold:>9.2f} | {escalated[positives].mean():>7.2%} | {escalated[hits].mean():>20.2%} | "
+              f"{escalated[~positives].mean():>14.2%} | {np.mean(cascade_preds == labels):>11.2%}{marker}")
+    print(f"Classifier alone accuracy: {np.mean(preds == labels):.2%}")
+
+    # Per-frame cost: stage 1 always runs, stage 2 only on escalated frames
+    escalated = presence >= presence_threshold
+    cost_stage1 = t_stage1.mean() * 1000
+    cost_stage2 = t_stage2.mean() * 1000
+    escalation_dataset = escalated.mean()
+    escalation_ingame = none_ratio * escalated[~positives].mean() + (1 - none_ratio) * escalated[positives].mean()
+
+    print(f"\nMean cost: stage 1 {cost_stage1:.3f} ms, classifier {cost_stage2:.3f} ms")
+    print(f"Cascade per-frame cost (dataset mix, {escalation_dataset:.1%} escalated): "
+          f"{cost_stage1 + escalation_dataset * cost_stage2:.3f} ms")
+    print(f"Cascade per-frame cost ({none_ratio:.0%} None frames, {escalation_ingame:.1%} escalated): "
+          f"{cost_stage1 + escalation_ingame * cost_stage2:.3f} ms "
+          f"(x{cost_stage2 / (cost_stage1 + escalation_ingame * cost_stage2):.1f} versus the classifier alone)")
+
+    return presence, preds, labels
+
+
 if __name__ == '__main__':
     folder = "20250814-112924/"
 
@@ -77,6 +168,9 @@ if __name__ == '__main__':
     results1 = infer_from_folder_onnx(folder, "models/model.onnx", use_gpu=True, move=True)
     print(f"Model 1: {time() - t0:.2f} seconds")
 
+    # CASCADE REPORT (stage-1 recall and per-frame cost)
+    # evaluate_cascade("dataset/", "models/model.onnx", "models/model_presence.onnx", use_gpu=False)
+
     # COMPARE
     # t0 = time()
     # results1 = infer_from_folder_onnx(folder, "models/model.onnx", use_gpu=False, nb_cpu_threads=8)
@@ -0,0 +1,181 @@
+"""
+Post-training INT8 static quantization of the ONNX AI model, for CPU inference.
+
+Calibration uses class-balanced batches taken from a labeled dataset folder (one sub folder per class,
+see parse_dbd_datasetfolder). The quantized model is written next to the original (<name>_int8.onnx), then
+both models are evaluated through InferenceEngine on the remaining images: per-class accuracy deltas, CPU latency
+and throughput.
+
+Usage:
+    python -m dbd.quantize_model models/model.onnx dataset/ [--format qdq|qoperator] [--calib-per-class 32]
+"""
+
+import argparse
+import os
+import tempfile
+from time import perf_counter
+
+import numpy as np
+import onnxruntime as ort
+import tqdm
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                      quant_pre_process, quantize_static)
+
+from dbd.inference_engine import InferenceEngine
+from dbd.predict_folder import _load_image
+from dbd.utils.dataset_utils import parse_dbd_datasetfolder
+
+
+class BalancedCalibrationReader(CalibrationDataReader):
+    """Feed calibration frames, preprocessed as InferenceEngine does, alternating between classes."""
+
+    def __init__(self, images, labels, input_name, raw_input=False):
+        self.input_name = input_name
+        self.raw_input = raw_input
+
+        # Interleave classes so that every calibration batch covers all of them
+        per_class = [list(images[labels == c]) for c in np.unique(labels)]
+        self.images = [img for group in zip(*per_class) for img in group]
+        self.images += [img for group in per_class for img in group[min(map(len, per_class)):]]
+        self._iter = iter(self.images)
+
+    def get_next(self):
+        image = next(self._iter, None)
+        if image is None:
+            return None
+
+        img = _load_image(image)
+        if not self.raw_input:
+            img = InferenceEngine._preprocess_image_for_inference(img)
+        return {self.input_name: img}
+
+    def rewind(self):
+        self._iter = iter(self.images)
+
+
+def split_dataset(dataset_root, calib_per_class=32, max_eval_per_class=None, seed=42):
+    """
+    Class-balanced calibration set and held-out evaluation set.
+    Returns:
+        (calib_images, calib_labels), (eval_images, eval_labels)
+    """
+    dataset = parse_dbd_datasetfolder(dataset_root)
+    images, labels = dataset[:, 0], dataset[:, 1].astype(np.int64)
+
+    rng = np.random.default_rng(seed)
+    calib_idx, eval_idx = [], []
+    for c in np.unique(labels):
+        idx = rng.permutation(np.flatnonzero(labels == c))
+        calib_idx += list(idx[:calib_per_class])
+        eval_idx += list(idx[calib_per_class:calib_per_class + max_eval_per_class] if max_eval_per_class else idx[calib_per_class:])
+
+    calib_idx, eval_idx = np.array(calib_idx, dtype=np.int64), np.array(eval_idx, dtype=np.int64)
+    return (images[calib_idx], labels[calib_idx]), (images[eval_idx], labels[eval_idx])
+
+
+def quantize_model(model_path, calib_images, calib_labels, output_path=None, quant_format="qdq", per_channel=True):
+    """
+    Static INT8 quantization (activations uint8, weights int8) calibrated on the given images.
+    Returns:
+        path of the quantized model (default: <name>_int8.onnx next to the original)
+    """
+    if output_path is None:
+        output_path = os.path.splitext(model_path)[0] + "_int8.onnx"
+
+    fmt = {"qdq": QuantFormat.QDQ, "qoperator": QuantFormat.QOperator}[quant_format.lower()]
+
+    # Input signature (float NCHW, or uint8 HWC when the preprocessing is baked in the graph)
+    model_input = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0]
+    reader = BalancedCalibrationReader(calib_images, calib_labels, model_input.name,
+                                       raw_input=InferenceEngine._is_raw_input(model_input))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Shape inference and graph optimization before quantization, as recommended by onnxruntime
+        # (the model input has static dimensions, ONNX shape inference is enough: no sympy dependency)
+        preprocessed_path = os.path.join(tmp_dir, "model_preprocessed.onnx")
+        quant_pre_process(model_path, preprocessed_path, skip_symbolic_shape=True)
+
+        quantize_static(preprocessed_path, output_path, reader,
+                        quant_format=fmt,
+                        activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8,
+                        per_channel=per_channel,
+                        calibrate_method=CalibrationMethod.MinMax)
+
+    return output_path
+
+
+def evaluate(model_path, images, labels, nb_cpu_threads=1, nb_warmup=20):
+    """
+    Evaluate a model through InferenceEngine on CPU. Images are decoded one at a time (constant memory), in the
+    same thread: only the predict_classifier calls are timed, without decoding threads competing for the CPU.
+    Returns:
+        dict with per-class accuracy, latencies (seconds) and predictions
+    """
+    ai_model = InferenceEngine(model_path=model_path, use_gpu=False, nb_cpu_threads=nb_cpu_threads)
+
+    preds = np.empty(len(images), dtype=np.int64)
+    latencies = np.empty(len(images), dtype=np.float64)
+    for i, image in enumerate(tqdm.tqdm(images, desc=os.path.basename(model_path))):
+        frame = _load_image(image)
+        if i == 0:
+            for _ in range(nb_warmup):
+                ai_model.predict_classifier(frame)
+
+        t0 = perf_counter()
+        preds[i] = ai_model.predict_classifier(frame).pred
+        latencies[i] = perf_counter() - t0
+
+    ai_model.cleanup()
+
+    accuracy = {int(c): float(np.mean(preds[labels == c] == c)) for c in np.unique(labels)}
+    return {"accuracy": accuracy, "latencies": latencies, "preds": preds}
+
+
+def print_report(results_fp32, results_int8, labels, nb_cpu_threads):
+    print(f"\n{'class':<30} | {'images':>6} | {'fp32 acc':>8} | {'int8 acc':>8} | {'delta':>7}")
+    for c, acc_fp32 in results_fp32["accuracy"].items():
+        acc_int8 = results_int8["accuracy"][c]
+        desc = InferenceEngine.DESCS[c] if c < len(InferenceEngine.DESCS) else str(c)
+        print(f"{f'{c}: {desc}':<30} | {np.sum(labels == c):>6} | {acc_fp32:>8.2%} | {acc_int8:>8.2%} | "
+              f"{(acc_int8 - acc_fp32) * 100:>+6.2f}%")
+
+    mean_fp32 = np.mean(list(results_fp32["accuracy"].values()))
+    mean_int8 = np.mean(list(results_int8["accuracy"].values()))
+    agreement = np.mean(results_fp32["preds"] == results_int8["preds"])
+    print(f"{'mean':<30} | {len(labels):>6} | {mean_fp32:>8.2%} | {mean_int8:>8.2%} | {(mean_int8 - mean_fp32) * 100:>+6.2f}%")
+    print(f"fp32/int8 prediction agreement: {agreement:.2%}")
+
+    print(f"\nCPU latency ({nb_cpu_threads} threads, InferenceEngine.predict_classifier):")
+    for name, results in [("fp32", results_fp32), ("int8", results_int8)]:
+        lat = np.sort(results["latencies"]) * 1000
+        print(f"  {name}: p50 {np.percentile(lat, 50):.3f} ms, p99 {np.percentile(lat, 99):.3f} ms, "
+              f"throughput {1000 / lat.mean():.1f} frames/s")
+
+    speedup = results_fp32["latencies"].mean() / results_int8["latencies"].mean()
+    print(f"  int8 speedup: x{speedup:.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="INT8 static quantization of the ONNX AI model")
+    parser.add_argument("model_path", help="float ONNX model, e.g. models/model.onnx")
+    parser.add_argument("dataset_root", help="labeled dataset folder (one sub folder per class)")
+    parser.add_argument("--output", default=None, help="quantized model path (default: <name>_int8.onnx)")
+    parser.add_argument("--format", default="qdq", choices=["qdq", "qoperator"], help="quantized graph format")
+    parser.add_argument("--calib-per-class", type=int, default=32, help="calibration images per class")
+    parser.add_argument("--eval-per-class", type=int, default=None, help="max evaluation images per class")
+    parser.add_argument("--threads", type=int, default=1, help="CPU threads for the latency report")
+    args = parser.parse_args()
+
+    (calib_images, calib_labels), (eval_images, eval_labels) = split_dataset(
+        args.dataset_root, calib_per_class=args.calib_per_class, max_eval_per_class=args.eval_per_class)
+    print(f"Calibration: {len(calib_images)} images, evaluation: {len(eval_images)} images")
+
+    t0 = perf_counter()
+    output_path = quantize_model(args.model_path, calib_images, calib_labels, args.output, quant_format=args.format)
+    print(f"Saved {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB, "
+          f"{args.format}, {perf_counter() - t0:.1f}s)")
+
+    results_fp32 = evaluate(args.model_path, eval_images, eval_labels, nb_cpu_threads=args.threads)
+    results_int8 = evaluate(output_path, eval_images, eval_labels, nb_cpu_threads=args.threads)
+    print_report(results_fp32, results_int8, eval_labels, args.threads)
@@ -6,7 +6,7 @@ from pytorch_lightning.callbacks import ModelCheckpoint
 from pytorch_lightning.utilities.model_summary import ModelSummary
 
 from dbd.datasets.datasetLoader import get_dataloaders
-from dbd.networks.model import Model
+from dbd.networks.model import Model, PresenceModel
 
 # torch.set_float32_matmul_precision('high')
 
@@ -14,16 +14,20 @@ if __name__ == '__main__':
     ##########################################################
     checkpoint = "./lightning_logs/version_11/checkpoints"
     dataset_root = "dataset/"
+    train_presence = False  # train the cascade stage-1 presence model (64x64 input) instead of the classifier
 
     ##########################################################
-    checkpoint = glob.glob(os.path.join(checkpoint, "*.ckpt"))[-1]
-
     # Dataset
     dataloader_train, dataloader_val = get_dataloaders(dataset_root, num_workers=8, batch_size=32)
 
     # Model
-    # model = Model(lr=1e-4)
-    model = Model.load_from_checkpoint(checkpoint, strict=True, lr=1e-5)
+    if train_presence:
+        # Trained from scratch, see PresenceModel
+        model = PresenceModel(lr=1e-3)
+    else:
+        checkpoint = glob.glob(os.path.join(checkpoint, "*.ckpt"))[-1]
+        # model = Model(lr=1e-4)
+        model = Model.load_from_checkpoint(checkpoint, strict=True, lr=1e-5)
 
     # Print model summary
     summary = ModelSummary(model, max_depth=4)
@@ -37,7 +41,10 @@ if __name__ == '__main__':
 
     # Training
     checkpoint_callback = ModelCheckpoint(save_top_k=1, monitor="loss/val")
-    checkpoint_callback2 = ModelCheckpoint(save_top_k=1, monitor="Acc/val_mean")
+    if train_presence:
+        checkpoint_callback2 = ModelCheckpoint(save_top_k=1, monitor="Recall/val", mode="max")
+    else:
+        checkpoint_callback2 = ModelCheckpoint(save_top_k=1, monitor="Acc/val_mean")
     trainer = pl.Trainer(accelerator='gpu', devices=1, max_epochs=500, num_sanity_val_steps=0, precision="16-mixed", callbacks=[checkpoint_callback, checkpoint_callback2])
     trainer.fit(model=model, train_dataloaders=dataloader_train, val_dataloaders=dataloader_val)
 
@@ -0,0 +1,298 @@
+# bench_history.py
+# History of the benchmark runs (python -m dbd.bench) and regression detection.
+#
+# Every run is stored in a local SQLite database (bench_history.sqlite, project root level) with its git commit,
+# the host fingerprint and, for each result, the scenario, the benchmark name, the model hash and the latency samples.
+# `compare` matches the results of two runs of the same host (same scenario, name and model hash) and applies a
+# one-sided Mann-Whitney U test on the samples: a result is a regression when the candidate is significantly slower
+# (p < alpha) and its median latency increased by more than the threshold.
+#
+# Usage (from the project root):
+#   python -m dbd.utils.bench_history list
+#   python -m dbd.utils.bench_history compare [--baseline REF] [--candidate REF] [--threshold 5] [--alpha 0.01]
+#   python -m dbd.utils.bench_history import logs/bench_<date>.json
+# REF is a run id or a git commit (latest run of that commit). Defaults: the latest run against the previous run
+# of another commit on this host (or the previous run of this host). Runs of different hosts can be compared
+# explicitly but never count as regressions. compare exits with code 1 when a regression is found.
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import subprocess
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from dbd.utils.ort_tuner import cpu_model, file_hash
+
+_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+_HISTORY_PATH = _ROOT_DIR / "bench_history.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    git_commit TEXT NOT NULL,
+    host TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    scenario TEXT NOT NULL,
+    name TEXT NOT NULL,
+    model_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    p50 REAL,
+    p99 REAL,
+    samples TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_key ON results (scenario, name, model_hash);
+"""
+
+
+def git_commit() -> str:
+    """Short hash of HEAD, with a -dirty suffix if tracked files are modified ("unknown" outside a git repository)."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_ROOT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=_ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + "-dirty" if status else commit
+
+
+def host_fingerprint(metadata: Optional[dict] = None) -> str:
+    """Hash of the machine and software stack: results are only compared between runs of the same host."""
+    metadata = metadata or {}
+    key = "|".join([
+        metadata.get("host", ""),
+        metadata.get("cpu", cpu_model()),
+        metadata.get("platform", ""),
+        metadata.get("onnxruntime", ""),
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def connect(path=None) -> sqlite3.Connection:
+    """Open the history database. The caller closes it (sqlite3 connection context managers only commit)."""
+    connection = sqlite3.connect(path or _HISTORY_PATH)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def _model_hash(params: dict) -> str:
+    model_path = params.get("model")
+    if model_path and os.path.exists(model_path):
+        return file_hash(model_path)
+    return ""
+
+
+def record(report: dict, commit: Optional[str] = None, path=None) -> int:
+    """
+    Save a benchmark report (see dbd.bench.run) in the history. Skipped results are not saved.
+    Returns:
+        run id
+    """
+    metadata = report["metadata"]
+    with closing(connect(path)) as connection, connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (date, git_commit, host, metadata, settings) VALUES (?, ?, ?, ?, ?)",
+            (metadata["date"], commit or metadata.get("git_commit") or git_commit(), host_fingerprint(metadata),
+             json.dumps(metadata), json.dumps(report.get("settings", {}))))
+        run_id = cursor.lastrowid
+        connection.executemany(
+            "INSERT INTO results (run_id, scenario, name, model_hash, params, p50, p99, samples) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(run_id, r["scenario"], r["name"], _model_hash(r["params"]), json.dumps(r["params"]), r["p50"], r["p99"],
+              json.dumps(r["samples"])) for r in report["results"] if "error" not in r])
+    return run_id
+
+
+def list_runs(path=None) -> list:
+    """[(id, date, git commit, host, number of results)], oldest first."""
+    with closing(connect(path)) as connection:
+        return connection.execute(
+            "SELECT runs.id, date, git_commit, host, COUNT(results.run_id) FROM runs "
+            "LEFT JOIN results ON results.run_id = runs.id GROUP BY runs.id ORDER BY runs.id").fetchall()
+
+
+def resolve_run(connection, ref: Optional[str] = None, host: Optional[str] = None,
+                exclude_commit: Optional[str] = None, before: Optional[int] = None) -> Optional[tuple]:
+    """
+    (id, git commit, host) of a run: run id, or latest run of a git commit (prefix). Without ref, the latest run
+    (of the host, of another commit than exclude_commit and older than the run id before, if given).
+    """
+    if ref is not None and ref.isdigit():
+        row = connection.execute("SELECT id, git_commit, host FROM runs WHERE id = ?", (int(ref),)).fetchone()
+        if row is not None:
+            return row
+
+    query, args = "SELECT id, git_commit, host FROM runs WHERE 1", []
+    if ref is not None:
+        query += " AND git_commit LIKE ?"
+        args.append(ref + "%")
+    if host is not None:
+        query += " AND host = ?"
+        args.append(host)
+    if exclude_commit is not None:
+        query += " AND git_commit != ?"
+        args.append(exclude_commit)
+    if before is not None:
+        query += " AND id < ?"
+        args.append(before)
+    return connection.execute(query + " ORDER BY id DESC LIMIT 1", args).fetchone()
+
+
+def _load_results(connection, run_id) -> dict:
+    rows = connection.execute("SELECT scenario, name, model_hash, samples FROM results WHERE run_id = ?", (run_id,))
+    return {(scenario, name, model_hash): np.array(json.loads(samples)) for scenario, name, model_hash, samples in rows}
+
+
+def _rank(values: np.ndarray) -> np.ndarray:
+    """Ranks starting at 1, ties get their average rank."""
+    order = np.argsort(values, kind="mergesort")
+    sorted_values = values[order]
+    ranks = np.empty(len(values), dtype=np.float64)
+    start = 0
+    for end in range(1, len(values) + 1):
+        if end == len(values) or sorted_values[end] != sorted_values[start]:
+            ranks[order[start:end]] = (start + end + 1) / 2
+            start = end
+    return ranks
+
+
+def mann_whitney_u(baseline, candidate):
+    """
+    One-sided Mann-Whitney U test, alternative: the candidate samples tend to be greater (slower) than the baseline.
+    Normal approximation with tie and continuity corrections (benchmarks have tens to hundreds of samples).
+    Returns:
+        (U statistic of the candidate, p-value)
+    """
+    x = np.asarray(baseline, dtype=np.float64)
+    y = np.asarray(candidate, dtype=np.float64)
+    n1, n2 = len(x), len(y)
+    values = np.concatenate([x, y])
+    ranks = _rank(values)
+    u = ranks[n1:].sum() - n2 * (n2 + 1) / 2
+
+    n = n1 + n2
+    _, tie_counts = np.unique(values, return_counts=True)
+    variance = n1 * n2 / 12 * ((n + 1) - (tie_counts ** 3 - tie_counts).sum() / (n * (n - 1)))
+    if variance <= 0:
+        return float(u), 1.0
+
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return float(u), 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(baseline_ref=None, candidate_ref=None, threshold=0.05, alpha=0.01, path=None) -> Optional[dict]:
+    """
+    Compare the results of two runs (see the module comment for the defaults).
+    Args:
+        threshold: minimum relative increase of the median latency of a regression (0.05 = 5%)
+        alpha: significance level of the Mann-Whitney test
+    Returns:
+        {"baseline": run, "candidate": run, "same_host": bool, "rows": [...]} or None if there are no runs to compare.
+        Rows of runs from different hosts have the status "not comparable"
+    """
+    with closing(connect(path)) as connection:
+        candidate = resolve_run(connection, candidate_ref)
+        if candidate is None:
+            return None
+        if baseline_ref is None:
+            baseline = resolve_run(connection, host=candidate[2], exclude_commit=candidate[1], before=candidate[0]) \
+                       or resolve_run(connection, host=candidate[2], before=candidate[0])
+        else:
+            baseline = resolve_run(connection, baseline_ref)
+        if baseline is None or baseline[0] == candidate[0]:
+            return None
+
+        baseline_results = _load_results(connection, baseline[0])
+        candidate_results = _load_results(connection, candidate[0])
+
+    same_host = baseline[2] == candidate[2]
+    rows = []
+    for key, y in candidate_results.items():
+        x = baseline_results.get(key)
+        if x is None:
+            continue
+        _, p_value = mann_whitney_u(x, y)
+        median_x, median_y = float(np.median(x)), float(np.median(y))
+        change = median_y / median_x - 1 if median_x > 0 else 0.0
+        if not same_host:
+            status = "not comparable"
+        elif p_value < alpha and change > threshold:
+            status = "REGRESSION"
+        elif mann_whitney_u(y, x)[1] < alpha and change < -threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({"scenario": key[0], "name": key[1], "baseline_p50": median_x, "candidate_p50": median_y,
+                     "change": change, "p_value": p_value, "status": status})
+
+    return {"baseline": baseline, "candidate": candidate, "same_host": same_host, "rows": rows}
+
+
+def has_regression(comparison: Optional[dict]) -> bool:
+    return comparison is not None and any(r["status"] == "REGRESSION" for r in comparison["rows"])
+
+
+def format_comparison(comparison: dict) -> str:
+    baseline, candidate = comparison["baseline"], comparison["candidate"]
+    lines = [f"Baseline run {baseline[0]} ({baseline[1]}) -> candidate run {candidate[0]} ({candidate[1]})"]
+    if not comparison["same_host"]:
+        lines.append("Warning: the runs come from different hosts, latencies are not comparable.")
+
+    rows = comparison["rows"]
+    if not rows:
+        lines.append("No common results (same scenario, name and model) between the runs.")
+        return "\n".join(lines)
+
+    width = max(len(r["name"]) for r in rows)
+    lines.append(f"{'scenario':<10} {'name':<{width}} {'baseline':>9} {'candidate':>9} {'change':>8} {'p-value':>8}  (p50 ms)")
+    for r in rows:
+        lines.append(f"{r['scenario']:<10} {r['name']:<{width}} {r['baseline_p50']:9.3f} {r['candidate_p50']:9.3f} "
+                     f"{r['change']:+8.1%} {r['p_value']:8.4f}  {r['status']}")
+
+    nb_regressions = sum(r["status"] == "REGRESSION" for r in rows)
+    lines.append(f"{nb_regressions} regression(s) out of {len(rows)} results")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Benchmark history and regression detection")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="list the recorded runs")
+    parser_compare = subparsers.add_parser("compare", help="compare two runs, exit code 1 on regression")
+    parser_compare.add_argument("--baseline", default=None, help="run id or git commit (default: previous commit)")
+    parser_compare.add_argument("--candidate", default=None, help="run id or git commit (default: latest run)")
+    parser_compare.add_argument("--threshold", type=float, default=5.0, help="minimum p50 increase of a regression (%%)")
+    parser_compare.add_argument("--alpha", type=float, default=0.01, help="significance level of the test")
+    parser_import = subparsers.add_parser("import", help="record a JSON report of python -m dbd.bench")
+    parser_import.add_argument("report")
+    parser_import.add_argument("--commit", default=None, help="git commit of the report (default: HEAD)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for run_id, date, commit, host, nb_results in list_runs():
+            print(f"{run_id:>4}  {date}  {commit:<16} host {host}  {nb_results} results")
+
+    elif args.command == "import":
+        with open(args.report) as f:
+            print(f"Recorded run {record(json.load(f), commit=args.commit)}.")
+
+    else:
+        comparison = compare(args.baseline, args.candidate, args.threshold / 100, args.alpha)
+        if comparison is None:
+            print("Not enough runs to compare (run python -m dbd.bench at least twice).")
+            sys.exit(0)
+        print(format_comparison(comparison))
+        sys.exit(1 if has_regression(comparison) else 0)
@@ -5,6 +5,35 @@ import numpy as np
 import glob
 
 
+def parse_dbd_datasetfolder(root_dataset_path):
+    """
+    Get dataset as list of pairs {image path, label} in numpy array format
+    Args:
+        root_dataset_path:
+
+    Returns: numpy array with shape (nb_images, 2), data type is str
+
+    """
+    folders = os.scandir(root_dataset_path)
+    images_all = []
+    targets_all = []
+
+    for folder in folders:
+        name, path = folder.name, folder.path
+        if not name.isdigit():
+            print("Skipping folder " + name)
+            continue
+
+        images = glob.glob(os.path.join(path, "*.*"))
+        print("Parsing folder {} : {} images found".format(name, len(images)))
+
+        images_all += images
+        targets_all += [name] * len(images)
+
+    dataset = np.stack([images_all, targets_all], axis=-1)
+    return dataset
+
+
 def delete_similar_images(folder):
     files = glob.glob(os.path.join(folder, "*.*"))
     files.sort()
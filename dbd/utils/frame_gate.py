@@ -0,0 +1,86 @@
+# frame_gate.py
+# Change gate placed between frame capture and AI inference.
+#
+# Most frames of a match contain no skill check and are (nearly) identical to the
+# previous one while idle in the lobby or standing still. The gate computes a very
+# cheap signature of the frame (sparse pixel sample) and reports whether it changed
+# since the last inference, so the previous prediction can be reused instead of
+# running the AI model again.
+#
+# The sample (1 pixel out of step x step) can miss small changes such as the thin skill check cursor moving:
+# the gate is opt-in in the UIs, check the missed skill checks with python -m dbd.latency_harness --frame-gate.
+
+from typing import Optional
+
+import numpy as np
+
+
+class FrameGate:
+    """Skip inference on frames that did not change since the last inferred frame.
+
+    Usage:
+        gate = FrameGate()
+        if gate.changed(frame_np):
+            result = ai_model.predict(frame_np)
+        # else: reuse the previous result
+    """
+
+    def __init__(self, step: int = 4, tolerance: int = 8):
+        """
+        Args:
+            step: sampling step in pixels along both axes (4 -> 1/16 of the pixels of the frame)
+            tolerance: maximum absolute difference (0-255) of any sampled value for the frame to be considered unchanged
+        """
+        self.step = step
+        self.tolerance = tolerance
+        self._signature: Optional[np.ndarray] = None
+        self._sample: Optional[np.ndarray] = None
+        self.hits = 0  # unchanged frames, inference skipped
+        self.misses = 0  # changed frames, inference required
+
+    def reset(self):
+        """Forget the reference frame: the next frame is reported as changed and re-inferred (counters are kept).
+
+        Call it after a key press, so that a still unchanged frame does not reuse the hit prediction.
+        May be called from another thread than changed().
+        """
+        self._signature = None
+        self._sample = None
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def changed(self, frame: np.ndarray) -> bool:
+        """Check a frame against the signature of the last changed frame.
+
+        Args:
+            frame: frame as a numpy array (H x W x C), uint8
+
+        Returns:
+            True if the frame changed (inference must run), False if the previous prediction can be reused.
+        """
+        sample = frame[::self.step, ::self.step]
+        signature, diff = self._signature, self._sample  # local references: reset() may run concurrently
+
+        if signature is None or diff is None or signature.shape != sample.shape:
+            self._signature = sample.astype(np.int16)
+            self._sample = np.empty_like(self._signature)
+            self.misses += 1
+            return True
+
+        np.copyto(diff, sample)
+        np.subtract(diff, signature, out=diff)
+        np.abs(diff, out=diff)
+
+        if diff.max() <= self.tolerance:
+            self.hits += 1
+            return False
+
+        np.copyto(signature, sample)
+        self.misses += 1
+        return True
+
+    def __repr__(self):
+        return f"FrameGate(step={self.step}, tolerance={self.tolerance}, hits={self.hits}, misses={self.misses})"
@@ -0,0 +1,378 @@
+# frame_pipeline.py
+# Pipelined capture/inference for the monitoring loops.
+#
+# The sequential loop runs grab -> predict -> decision one frame at a time. ONNX Runtime releases
+# the GIL during inference (and most capture backends during the grab), so frame N+1 can be
+# captured while frame N is classified. The pipeline runs capture and inference on their own
+# threads, the decision (key press) stays in the caller's loop:
+#
+#   capture thread --[ready queue]--> inference thread --[done queue]--> get() (decision)
+#
+# Frames live in a fixed set of 2-3 preallocated slots. Both queues hold at most one item and
+# drop the oldest one when full, so the decision always sees the freshest frame. When every slot
+# is in use (inference or decision still busy), the capture thread blocks (backpressure).
+
+import threading
+from collections import deque
+from time import perf_counter, perf_counter_ns
+from typing import Optional
+
+import numpy as np
+
+from dbd.utils.stage_timer import CAPTURE, SLEEP
+
+
+class _Slot:
+    __slots__ = ("frame", "prediction", "t_grab", "t_captured", "t_infer", "t_inferred")
+
+    def __init__(self):
+        self.frame = None  # allocated on the first grab, with the shape of the capture frames
+        self.prediction = None
+        self.t_grab = 0.0  # capture started
+        self.t_captured = 0.0  # frame copied in the slot
+        self.t_infer = 0.0  # inference started
+        self.t_inferred = 0.0  # prediction available
+
+
+class FramePipeline:
+    """Capture and inference on their own threads, with 2 or 3 frames in flight.
+
+    Usage:
+        pipeline = FramePipeline(ai_model, frame_gate=gate, scan_scheduler=scheduler)
+        pipeline.start()
+        while running:
+            item = pipeline.get()
+            if item is None:
+                continue  # no frame within the timeout
+            frame_np, prediction = item  # frame valid until the next get()
+            ...
+            if key pressed:
+                sleep(cooldown)
+                pipeline.flush()  # frames captured during the cooldown are stale
+        pipeline.stop()
+    """
+
+    def __init__(self, ai_model, nb_slots: int = 3, frame_gate=None, scan_scheduler=None, stage_timer=None,
+                 history: int = 1000):
+        """
+        Args:
+            ai_model: AI_model instance (grab_screenshot and predict), only used by the pipeline threads
+            nb_slots: number of frame slots in flight (2: double buffering, 3: triple buffering)
+            frame_gate: optional FrameGate, the last prediction is reused on unchanged frames
+            scan_scheduler: optional AdaptiveScanRate, paces the capture thread (update() stays with the caller)
+            stage_timer: optional StageTimer, records the capture and scan rate sleep latencies of the capture thread
+            history: number of recent frames kept for the latency statistics
+        """
+        assert nb_slots in (2, 3), "FramePipeline supports 2 or 3 frame slots"
+        self.ai_model = ai_model
+        self.nb_slots = nb_slots
+        self.frame_gate = frame_gate
+        self.scan_scheduler = scan_scheduler
+        self.stage_timer = stage_timer
+
+        self._cond = threading.Condition()
+        self._free = deque(_Slot() for _ in range(nb_slots))
+        self._ready = deque()  # captured, waiting for inference (max 1)
+        self._done = deque()  # inferred, waiting for the decision (max 1)
+        self._current = None  # slot returned by get(), owned by the caller
+        self._last_prediction = None
+        self._threads = []
+        self._running = False
+        self._error = None
+
+        # Statistics
+        self._t_start = 0.0
+        self.nb_captured = 0
+        self.nb_inferred = 0
+        self.nb_delivered = 0
+        self.nb_dropped_frames = 0  # captured frames replaced before inference
+        self.nb_dropped_results = 0  # predictions replaced before the decision
+        self.nb_stalls = 0  # capture blocked, no free slot
+        self.stall_time = 0.0
+        self._capture_times = deque(maxlen=history)
+        self._queue_times = deque(maxlen=history)
+        self._inference_times = deque(maxlen=history)
+        self._latencies = deque(maxlen=history)  # capture start -> delivered to the decision
+
+    def start(self):
+        self._running = True
+        self._error = None
+        self._t_start = perf_counter()
+        self._threads = [threading.Thread(target=self._capture_loop, name="FramePipeline-capture", daemon=True),
+                         threading.Thread(target=self._inference_loop, name="FramePipeline-inference", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _acquire_slot(self) -> Optional[_Slot]:
+        # Called with the lock held
+        t_stall = None
+        while self._running:
+            if self._free:
+                if t_stall is not None:
+                    self.stall_time += perf_counter() - t_stall
+                return self._free.popleft()
+
+            # Backpressure: every other slot is being classified or held by the decision
+            if t_stall is None:
+                t_stall = perf_counter()
+                self.nb_stalls += 1
+            self._cond.wait(timeout=0.1)
+
+        return None
+
+    def _capture_loop(self):
+        try:
+            slot = None
+            while self._running:
+                if self.scan_scheduler is not None:
+                    t_sleep = perf_counter_ns()
+                    self.scan_scheduler.wait()
+                    if self.stage_timer is not None:
+                        self.stage_timer.record(SLEEP, perf_counter_ns() - t_sleep)
+
+                if slot is None:
+                    with self._cond:
+                        slot = self._acquire_slot()
+                    if slot is None:
+                        break
+
+                t_grab = perf_counter()
+                t_grab_ns = perf_counter_ns()
+                frame = self.ai_model.grab_screenshot()
+                if slot.frame is None or slot.frame.shape != frame.shape:
+                    slot.frame = np.empty_like(frame)
+                np.copyto(slot.frame, frame)  # capture buffers are reused by the next grab
+                slot.t_grab, slot.t_captured = t_grab, perf_counter()
+                if self.stage_timer is not None:
+                    self.stage_timer.record(CAPTURE, perf_counter_ns() - t_grab_ns)
+
+                with self._cond:
+                    self.nb_captured += 1
+                    self._capture_times.append(slot.t_captured - t_grab)
+                    # Drop-oldest: the new frame replaces the one still waiting for inference,
+                    # whose slot is reused for the next grab
+                    if self._ready:
+                        previous = self._ready.popleft()
+                        self.nb_dropped_frames += 1
+                    else:
+                        previous = None
+                    self._ready.append(slot)
+                    self._cond.notify_all()
+                slot = previous
+        except Exception as e:
+            self._fail(e)
+
+    def _inference_loop(self):
+        try:
+            while True:
+                with self._cond:
+                    while self._running and not self._ready:
+                        self._cond.wait(timeout=0.1)
+                    if not self._running:
+                        break
+                    slot = self._ready.popleft()
+
+                slot.t_infer = perf_counter()
+                # Frame gate: reuse the last prediction if the frame did not change
+                if self.frame_gate is None or self.frame_gate.changed(slot.frame):
+                    self._last_prediction = self.ai_model.predict(slot.frame)
+                slot.prediction = self._last_prediction
+                slot.t_inferred = perf_counter()
+
+                with self._cond:
+                    if self._done:
+                        # Drop-oldest: the decision has not consumed the previous prediction yet
+                        self._free.append(self._done.popleft())
+                        self.nb_dropped_results += 1
+                    self._done.append(slot)
+                    self.nb_inferred += 1
+                    self._queue_times.append(slot.t_infer - slot.t_captured)
+                    self._inference_times.append(slot.t_inferred - slot.t_infer)
+                    self._cond.notify_all()
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        with self._cond:
+            self._error = error
+            self._running = False
+            self._cond.notify_all()
+
+    def get(self, timeout: float = 1.0):
+        """
+        Wait for the next prediction.
+        Returns:
+            (frame_np, prediction), or None if no frame was classified within the timeout. The frame is a pipeline
+            slot, valid until the next get() or flush(): copy it if it must be kept.
+        """
+        with self._cond:
+            self._release_current()
+
+            deadline = perf_counter() + timeout
+            while not self._done:
+                if self._error is not None:
+                    raise RuntimeError(f"FramePipeline stage failed: {self._error}") from self._error
+                remaining = deadline - perf_counter()
+                if not self._running or remaining <= 0:
+                    return None
+                self._cond.wait(timeout=remaining)
+
+            slot = self._current = self._done.popleft()
+            self.nb_delivered += 1
+            self._latencies.append(perf_counter() - slot.t_grab)
+
+        return slot.frame, slot.prediction
+
+    def _release_current(self):
+        # Called with the lock held
+        if self._current is not None:
+            self._free.append(self._current)
+            self._current = None
+            self._cond.notify_all()
+
+    def flush(self):
+        """Drop the frames in flight (e.g. captured during a key press cooldown), including the last get() frame."""
+        with self._cond:
+            self._release_current()
+            while self._ready:
+                self._free.append(self._ready.popleft())
+            while self._done:
+                self._free.append(self._done.popleft())
+            self._cond.notify_all()
+
+    def get_stats(self) -> dict:
+        """
+        Per-stage throughput (frames/s) and latency (ms, p50/p99 over the recent frames), dropped frames and
+        capture stalls (backpressure).
+        """
+        def percentiles(values):
+            if not values:
+                return 0.0, 0.0
+            p50, p99 = np.percentile(np.array(values) * 1000, [50, 99])
+            return float(p50), float(p99)
+
+        with self._cond:
+            elapsed = max(perf_counter() - self._t_start, 1e-9)
+            stats = {
+                "capture_fps": self.nb_captured / elapsed,
+                "inference_fps": self.nb_inferred / elapsed,
+                "output_fps": self.nb_delivered / elapsed,
+                "capture_ms": percentiles(self._capture_times),
+                "queue_ms": percentiles(self._queue_times),
+                "inference_ms": percentiles(self._inference_times),
+                "latency_ms": percentiles(self._latencies),
+                "dropped_frames": self.nb_dropped_frames,
+                "dropped_results": self.nb_dropped_results,
+                "stalls": self.nb_stalls,
+                "stall_time": self.stall_time,
+            }
+        return stats
+
+
+def run_sequential(ai_model, duration: float, frame_gate=None):
+    """
+    Reference sequential loop (grab -> predict) of the same duration, for the comparison with the pipeline.
+    Returns:
+        stats dict with the keys of FramePipeline.get_stats()
+    """
+    capture_times, inference_times, latencies = [], [], []
+    prediction = None
+    t_start = perf_counter()
+    while perf_counter() - t_start < duration:
+        t_grab = perf_counter()
+        frame = ai_model.grab_screenshot()
+        t_captured = perf_counter()
+        if frame_gate is None or frame_gate.changed(frame):
+            prediction = ai_model.predict(frame)
+        t_inferred = perf_counter()
+        capture_times.append(t_captured - t_grab)
+        inference_times.append(t_inferred - t_captured)
+        latencies.append(t_inferred - t_grab)
+
+    elapsed = perf_counter() - t_start
+    fps = len(latencies) / elapsed
+    p = lambda values: tuple(float(v) for v in np.percentile(np.array(values) * 1000, [50, 99]))
+    return {"capture_fps": fps, "inference_fps": fps, "output_fps": fps,
+            "capture_ms": p(capture_times), "queue_ms": (0.0, 0.0), "inference_ms": p(inference_times),
+            "latency_ms": p(latencies), "dropped_frames": 0, "dropped_results": 0, "stalls": 0, "stall_time": 0.0}
+
+
+def format_stats(stats: dict) -> str:
+    return (f"capture {stats['capture_fps']:.1f} fps ({stats['capture_ms'][0]:.2f}/{stats['capture_ms'][1]:.2f} ms) | "
+            f"queue {stats['queue_ms'][0]:.2f}/{stats['queue_ms'][1]:.2f} ms | "
+            f"inference {stats['inference_fps']:.1f} fps ({stats['inference_ms'][0]:.2f}/{stats['inference_ms'][1]:.2f} ms) | "
+            f"output {stats['output_fps']:.1f} fps | "
+            f"end-to-end {stats['latency_ms'][0]:.2f}/{stats['latency_ms'][1]:.2f} ms (p50/p99) | "
+            f"dropped {stats['dropped_frames']} frames, {stats['dropped_results']} results | "
+            f"{stats['stalls']} stalls")
+
+
+if __name__ == '__main__':
+    # Sequential loop vs pipeline on a simulated capture source (no display needed):
+    #   python -m dbd.utils.frame_pipeline [model] [--grab-ms 4] [--duration 5]
+    import argparse
+    from time import sleep
+
+    from dbd.AI_model import AI_model
+    from dbd.utils.monitoring_mss import Monitoring
+
+    parser = argparse.ArgumentParser(description="Sequential loop vs capture/inference pipeline")
+    parser.add_argument("model_path", nargs="?", default="models/model.onnx")
+    parser.add_argument("--grab-ms", type=float, default=4.0, help="simulated capture time (GIL released, like a screen grab)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads of the AI model")
+    args = parser.parse_args()
+
+    class _SimulatedCapture(Monitoring):
+        def __init__(self, grab_time, crop_size=224):
+            super().__init__()
+            self.grab_time = grab_time
+            self._frames = np.random.default_rng(0).integers(0, 256, (8, crop_size, crop_size, 3), dtype=np.uint8)
+            self._i = 0
+
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def get_frame_np(self):
+            sleep(self.grab_time)
+            self._i = (self._i + 1) % len(self._frames)
+            return self._frames[self._i]
+
+    ai_model = AI_model(args.model_path, use_gpu=False, nb_cpu_threads=args.threads,
+                        monitoring=_SimulatedCapture(args.grab_ms / 1000))
+    for _ in range(20):
+        ai_model.predict(ai_model.grab_screenshot())
+
+    print(f"Simulated capture {args.grab_ms} ms/frame, {args.duration}s per run")
+    print(f"{'sequential':>12}: {format_stats(run_sequential(ai_model, args.duration))}")
+
+    for nb_slots in (2, 3):
+        pipeline = FramePipeline(ai_model, nb_slots=nb_slots)
+        pipeline.start()
+        t_start = perf_counter()
+        while perf_counter() - t_start < args.duration:
+            pipeline.get()
+        stats = pipeline.get_stats()
+        pipeline.stop()
+        print(f"{f'{nb_slots} slots':>12}: {format_stats(stats)}")
+
+    ai_model.cleanup()
@@ -0,0 +1,105 @@
+# import_time.py
+# Import-time benchmark of the entry points, to keep the startup of app.py and tui.py fast.
+#
+# Each module is imported in a fresh interpreter with `python -X importtime`, the report gives the median
+# total import time and the packages that take the most time. The check fails (exit code 1) when a module
+# imports a package it must not (e.g. torch or gradio when importing AI_model), exceeds its time budget or fails to
+# import. A module is only skipped when an optional dependency of its own is not installed (e.g. gradio for app).
+#
+# Usage (from the project root):
+#   python -m dbd.utils.import_time [--runs 5] [--budget-scale 2.0]
+
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+
+# module -> (packages that must not be imported, time budget in ms)
+# torch, tensorrt and pycuda are only imported when the GPU mode is selected, gradio and rich by their UI only,
+# the screen capture libraries by the capture backends only
+CHECKS = {
+    "dbd.inference_engine": (["torch", "tensorrt", "pycuda", "gradio", "rich", "mss", "cv2"], 400),
+    "dbd.AI_model": (["torch", "tensorrt", "pycuda", "gradio", "rich"], 500),
+    "dbd.utils.monitoring_mss": (["torch", "onnxruntime", "gradio", "rich"], 300),
+    "tui": (["torch", "tensorrt", "pycuda", "gradio"], 1000),
+    "app": (["torch", "tensorrt", "pycuda", "rich"], 5000),
+}
+
+# module -> optional dependencies: the module is skipped (not failed) if one of them is not installed
+OPTIONAL_DEPENDENCIES = {
+    "app": ["gradio"],
+}
+
+
+def measure_import(module):
+    """
+    Import a module in a fresh interpreter.
+    Returns:
+        (total import time in ms, {package: self import time in ms}), or None if the import failed
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=_ROOT_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        return None
+
+    total = 0.0
+    packages = defaultdict(float)
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+        if not name[1:].startswith(" "):  # top-level import
+            total += int(cumulative_us) / 1000
+
+    return total, dict(packages)
+
+
+def run_checks(nb_runs=5, budget_scale=1.0, verbose=True):
+    """Returns: True if every module passes its checks."""
+    ok = True
+    for module, (forbidden, budget_ms) in CHECKS.items():
+        runs = [measure_import(module) for _ in range(nb_runs)]
+        if runs[0] is None:
+            error = subprocess.run([sys.executable, "-c", f"import {module}"], cwd=_ROOT_DIR,
+                                   capture_output=True, text=True).stderr.strip().splitlines()
+            error = error[-1] if error else "import failed"
+            missing = re.match(r"ModuleNotFoundError: No module named '([\w.]+)'", error)
+            skipped = missing is not None and missing.group(1).split(".")[0] in OPTIONAL_DEPENDENCIES.get(module, [])
+            ok &= skipped
+            if verbose:
+                print(f"{module:<26} {'skipped' if skipped else 'FAIL'} ({error})")
+            continue
+
+        total = float(np.median([r[0] for r in runs]))
+        packages = runs[-1][1]
+        imported = [p for p in forbidden if p in packages]
+        budget = budget_ms * budget_scale
+        passed = not imported and total <= budget
+        ok &= passed
+
+        if verbose:
+            heaviest = sorted(packages.items(), key=lambda p: -p[1])[:5]
+            print(f"{module:<26} {total:8.1f} ms (budget {budget:.0f} ms) {'OK' if passed else 'FAIL'}")
+            print(f"{'':<26} heaviest: " + ", ".join(f"{name} {t:.1f} ms" for name, t in heaviest))
+            if imported:
+                print(f"{'':<26} must not import: {', '.join(imported)}")
+
+    return ok
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import-time benchmark of the entry points")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module (median)")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply the time budgets (slow machines)")
+    args = parser.parse_args()
+
+    sys.exit(0 if run_checks(args.runs, args.budget_scale) else 1)
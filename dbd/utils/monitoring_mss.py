@@ -1,3 +1,6 @@
+import threading
+from time import perf_counter
+
 import cv2
 import numpy as np
 from mss import mss
@@ -33,20 +36,106 @@ class Monitoring:
 
 
 class Monitoring_mss(Monitoring):
-    def __init__(self, monitor_id=1, crop_size=224):
+    def __init__(self, monitor_id=1, crop_size=224, threaded=False, on_demand=False, max_frame_age=0.1):
+        """
+        Args:
+            monitor_id: mss monitor index (1 is the main monitor)
+            crop_size: size of the returned square frame
+            threaded: if True, a dedicated worker thread owns the mss instance and keeps grabbing frames,
+                      get_frame_np then returns the most recent frame without blocking
+            on_demand: threaded mode, opt-in: the worker grabs the next frame only when get_frame_np is called
+                       (it idles while the caller sleeps, saving CPU), instead of grabbing continuously
+            max_frame_age: on-demand mode, oldest frame (seconds) get_frame_np returns without waiting for the
+                           requested grab, e.g. after the caller slept
+        """
         super().__init__()
         self.crop_size = crop_size
         self.monitor_region = self._get_monitor_region(monitor_id, crop_size)
         self.sct = None
 
+        # Persistent buffers for the zero-copy path of get_frame_np
+        self._frame_out = np.empty((crop_size, crop_size, 3), dtype=np.uint8)
+        self._frame_resized = np.empty((crop_size, crop_size, 4), dtype=np.uint8)
+
+        # Threaded capture: triple buffering (back: written by worker, slot: latest published, front: returned to reader)
+        self.threaded = threaded
+        self._thread = None
+        self._running = False
+        self.on_demand = on_demand
+        self.max_frame_age = max_frame_age
+        self._cond = threading.Condition()  # guards the slot, the demand flag and the thread error
+        self._slot_fresh = False
+        self._slot_time = float("-inf")  # grab start time (perf_counter) of the frame in the slot
+        self._demand = False  # on-demand mode: the worker grabs a frame only when asked for one
+        self._first_frame = threading.Event()
+        self._thread_error = None
+        self._frame_back = np.empty_like(self._frame_out)
+        self._frame_slot = np.empty_like(self._frame_out)
+
     def start(self):
-        self.sct = mss()
+        if not self.threaded:
+            self.sct = mss()
+            return
+
+        self._running = True
+        self._slot_fresh = False
+        self._slot_time = float("-inf")
+        self._demand = True  # first frame
+        self._thread_error = None
+        self._first_frame.clear()
+        self._thread = threading.Thread(target=self._capture_loop, name="Monitoring_mss", daemon=True)
+        self._thread.start()
+
+        if not self._first_frame.wait(timeout=5.0):
+            self.stop()
+            raise RuntimeError("Monitoring_mss capture thread did not grab a frame within 5 seconds")
+        if self._thread_error is not None:
+            self.stop()
+            raise RuntimeError(f"Monitoring_mss capture thread failed: {self._thread_error}")
 
     def stop(self):
+        if self._thread is not None:
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
         if self.sct is not None:
             self.sct.close()
             self.sct = None
 
+    def _capture_loop(self):
+        # mss is not thread-safe: the instance is created, used and closed by this thread only
+        try:
+            with mss() as sct:
+                while self._running:
+                    if self.on_demand:
+                        # Idle until the reader asks for a frame: no capture while the loop sleeps
+                        with self._cond:
+                            self._cond.wait_for(lambda: self._demand or not self._running)
+                            if not self._running:
+                                break
+                            self._demand = False
+
+                    t_grab = perf_counter()
+                    frame = sct.grab(self.monitor_region)
+                    self._bgra_to_rgb(frame, self._frame_back)
+
+                    # Publish: overwrite the single slot with the newest frame
+                    with self._cond:
+                        self._frame_back, self._frame_slot = self._frame_slot, self._frame_back
+                        self._slot_fresh = True
+                        self._slot_time = t_grab
+                        self._cond.notify_all()
+
+                    self._first_frame.set()
+        except Exception as e:
+            with self._cond:
+                self._thread_error = e
+                self._cond.notify_all()
+            self._first_frame.set()
+
     @staticmethod
     def get_monitors_info():
         with mss() as sct:
@@ -71,12 +160,18 @@ class Monitoring_mss(Monitoring):
             return region
 
     def get_raw_frame(self):
+        if self.threaded:
+            raise RuntimeError("Monitoring_mss raw frames are not available in threaded mode. Use get_frame_np().")
+
         if self.sct is None:
             raise RuntimeError("Monitoring_mss not started. Call start() before grabbing frames.")
 
         return self.sct.grab(self.monitor_region)
 
     def get_frame_pil(self) -> Image:
+        if self.threaded:
+            return Image.fromarray(self.get_frame_np())
+
         frame = self.get_raw_frame()
         frame = Image.frombytes("RGB", frame.size, frame.bgra, "raw", "BGRX")
 
@@ -85,12 +180,99 @@ class Monitoring_mss(Monitoring):
 
         return frame
 
+    def _bgra_to_rgb(self, frame, out: np.ndarray) -> np.ndarray:
+        """
+        Convert a mss ScreenShot to a (crop_size x crop_size x 3) RGB array without intermediate copies.
+        The raw BGRA buffer is wrapped as a numpy view, optionally resized, then channel-swapped into a
+        persistent output buffer.
+        """
+        bgra = np.frombuffer(frame.raw, dtype=np.uint8).reshape(frame.height, frame.width, 4)
+
+        if bgra.shape[:2] != (self.crop_size, self.crop_size):
+            # Resizing before the colour conversion is equivalent (per-channel interpolation) and cheaper when downscaling
+            bgra = cv2.resize(bgra, (self.crop_size, self.crop_size), dst=self._frame_resized, interpolation=cv2.INTER_CUBIC)
+
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=out)
+
     def get_frame_np(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The frame (crop_size x crop_size x 3) in RGB format. The array is a persistent buffer
+            reused by the next call, copy it if it must be kept.
+        """
+        if self.threaded:
+            return self._get_latest_frame()
+
         frame = self.get_raw_frame()
+        return self._bgra_to_rgb(frame, self._frame_out)
+
+    def _get_latest_frame(self) -> np.ndarray:
+        if self._thread is None:
+            raise RuntimeError("Monitoring_mss not started. Call start() before grabbing frames.")
+
+        if self._thread_error is not None:
+            raise RuntimeError(f"Monitoring_mss capture thread failed: {self._thread_error}")
+
+        with self._cond:
+            if self.on_demand:
+                # Ask for the next frame: it is grabbed while the caller processes this one
+                self._demand = True
+                self._cond.notify_all()
+
+                # The published frame is recent unless the caller was idle (e.g. sleeping): then wait for the new grab
+                t_call = perf_counter()
+                if not self._cond.wait_for(lambda: self._thread_error is not None or
+                                           self._slot_time >= t_call - self.max_frame_age, timeout=1.0):
+                    raise RuntimeError("Monitoring_mss capture thread did not grab a frame within 1 second")
+                if self._thread_error is not None:
+                    raise RuntimeError(f"Monitoring_mss capture thread failed: {self._thread_error}")
+
+            # Non-blocking: take the newest published frame if any, else return the previous one again
+            if self._slot_fresh:
+                self._frame_out, self._frame_slot = self._frame_slot, self._frame_out
+                self._slot_fresh = False
+
+        return self._frame_out
+
+
+if __name__ == '__main__':
+    # Microbenchmark of the zero-copy BGRA to RGB path against the previous implementation (no display needed)
+    from time import perf_counter
+    from mss.screenshot import ScreenShot
+
+    def bgra_to_rgb_legacy(frame, crop_size):
         frame = np.array(frame, dtype=np.uint8)
         frame = np.flip(frame[:, :, :3], 2)  # Convert BGRA to RGB
 
-        if frame.shape[:2] != (self.crop_size, self.crop_size):
-            frame = cv2.resize(frame, (self.crop_size, self.crop_size), interpolation=cv2.INTER_CUBIC)
+        if frame.shape[:2] != (crop_size, crop_size):
+            frame = cv2.resize(frame, (crop_size, crop_size), interpolation=cv2.INTER_CUBIC)
 
         return frame
+
+    class _Bench(Monitoring_mss):
+        def __init__(self, crop_size=224):
+            Monitoring.__init__(self)
+            self.crop_size = crop_size
+            self._frame_out = np.empty((crop_size, crop_size, 3), dtype=np.uint8)
+            self._frame_resized = np.empty((crop_size, crop_size, 4), dtype=np.uint8)
+
+    nb_iters = 2000
+    rng = np.random.default_rng(0)
+    mon = _Bench(crop_size=224)
+
+    for screen_height in [1080, 1440, 2160]:
+        object_size = int(224 / 1080 * screen_height)
+        data = bytearray(rng.integers(0, 256, (object_size, object_size, 4), dtype=np.uint8).tobytes())
+        shot = ScreenShot.from_size(data, object_size, object_size)
+
+        out = np.empty((224, 224, 3), dtype=np.uint8)
+        assert np.array_equal(bgra_to_rgb_legacy(shot, 224), mon._bgra_to_rgb(shot, out))
+
+        for name, fn in [("legacy", lambda: bgra_to_rgb_legacy(shot, 224)), ("zero-copy", lambda: mon._bgra_to_rgb(shot, out))]:
+            for _ in range(50):
+                fn()
+            t0 = perf_counter()
+            for _ in range(nb_iters):
+                fn()
+            dt = (perf_counter() - t0) / nb_iters
+            print(f"{screen_height}p ({object_size}x{object_size}) {name:>10}: {dt * 1e6:8.1f} us/frame")
@@ -0,0 +1,279 @@
+"""
+Recorded session replay Monitoring backend
+
+Plays back previously recorded frames instead of capturing the screen, so the whole
+pipeline (capture -> AI model -> decision) can be run and profiled on a headless machine.
+
+Supported sources:
+- a folder of images (png, jpg), read in sorted file name order
+- a .npy frame stack of shape (N, H, W, 3) in RGB format, memory-mapped
+- a video file readable by OpenCV (mp4, mkv, avi, ...)
+
+Frames can either be full screen recordings (the center region is cropped as the other
+backends do on a monitor) or frames already center-cropped around the skill check, such as
+the 320x320 frames saved by the data collection scripts.
+
+Usage:
+    with Monitoring_replay("replays/session.npy", realtime=True) as mon:
+        frame = mon.get_frame_np()
+
+    # Convert an image folder to a .npy stack (faster replay, no decoding)
+    python -m dbd.utils.monitoring_replay <image_folder> <output.npy>
+"""
+
+import os
+from glob import glob
+from pathlib import Path
+from time import perf_counter
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from dbd.utils.monitoring_mss import Monitoring
+
+# Default folder scanned for replay sources (project root level)
+REPLAY_FOLDER = Path(__file__).resolve().parent.parent.parent / "replays"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".webm")
+
+
+def _is_replay_source(path):
+    if os.path.isdir(path):
+        return any(f.lower().endswith(IMAGE_EXTENSIONS) for f in os.listdir(path))
+    return path.lower().endswith((".npy",) + VIDEO_EXTENSIONS)
+
+
+REPLAY_AVAILABLE = False
+try:
+    if REPLAY_FOLDER.is_dir():
+        REPLAY_AVAILABLE = any(_is_replay_source(e.path) for e in os.scandir(REPLAY_FOLDER))
+except Exception:
+    pass
+
+
+class Monitoring_replay(Monitoring):
+    """
+    Replay frames from an image folder, a .npy frame stack or a video file.
+
+    Drop-in replacement of the screen capture backends for AI_model(monitoring=...), app.py and tui.py.
+    """
+
+    def __init__(self, source, crop_size=224, realtime=False, fps=None, loop=True, full_frame=None):
+        """
+        Args:
+            source: image folder, .npy file or video file path
+            crop_size: size of the returned square frame
+            realtime: if True, frames are served following the original timing (frames are skipped or repeated
+                      depending on how fast they are requested, like a screen capture). If False, every frame is
+                      served once, as fast as requested
+            fps: original frame rate, used in realtime mode. Defaults to the video frame rate, or 60
+            loop: restart from the first frame at the end of the source, else raise EOFError
+            full_frame: True if frames are full screen recordings (the center region is cropped relatively to the
+                        frame height, as on a monitor), False if frames are already center-cropped around the skill
+                        check. None to auto-detect (full screen if frame height >= 720)
+        """
+        super().__init__()
+        self.source = str(source)
+        self.crop_size = crop_size
+        self.realtime = realtime
+        self.fps = fps
+        self.loop = loop
+        self.full_frame = full_frame
+
+        self.nb_frames = 0
+        self.monitor_region = None
+
+        self._images = None  # image folder: sorted file paths
+        self._stack = None  # .npy: memory-mapped (N, H, W, 3) RGB array
+        self._cap = None  # video: cv2.VideoCapture
+        self._is_bgr = True
+
+        self._index = 0
+        self._video_index = -1
+        self._last_frame = None
+        self._last_index = -1
+        self._t_start = None
+
+        # Persistent output buffers of get_frame_np
+        self._frame_out = np.empty((crop_size, crop_size, 3), dtype=np.uint8)
+        self._frame_resized = np.empty((crop_size, crop_size, 3), dtype=np.uint8)
+
+    def start(self):
+        if os.path.isdir(self.source):
+            self._images = sorted(f for f in glob(os.path.join(self.source, "*.*")) if f.lower().endswith(IMAGE_EXTENSIONS))
+            self.nb_frames = len(self._images)
+            self._is_bgr = True
+        elif self.source.lower().endswith(".npy"):
+            self._stack = np.load(self.source, mmap_mode="r")
+            if self._stack.ndim != 4 or self._stack.shape[-1] != 3:
+                raise ValueError(f"Replay .npy source must have shape (N, H, W, 3), got {self._stack.shape}")
+            self.nb_frames = len(self._stack)
+            self._is_bgr = False
+        else:
+            self._cap = cv2.VideoCapture(self.source)
+            if not self._cap.isOpened():
+                raise RuntimeError(f"Could not open replay source: {self.source}")
+            self.nb_frames = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if self.fps is None and self._cap.get(cv2.CAP_PROP_FPS) > 0:
+                self.fps = self._cap.get(cv2.CAP_PROP_FPS)
+            self._is_bgr = True
+
+        if self.nb_frames == 0:
+            self.stop()
+            raise RuntimeError(f"No frame found in replay source: {self.source}")
+
+        if self.fps is None:
+            self.fps = 60
+
+        self._index = 0
+        self._video_index = -1
+
+        # Crop region from the first frame
+        frame = self._read_frame(0)
+        self._last_frame, self._last_index = frame, 0
+        height, width = frame.shape[:2]
+        full_frame = self.full_frame if self.full_frame is not None else height >= 720
+        if full_frame:
+            object_size = int(self.crop_size / 1080 * height)
+        else:
+            object_size = min(self.crop_size, height, width)
+        self.monitor_region = {
+            "left": width // 2 - object_size // 2,
+            "top": height // 2 - object_size // 2,
+            "width": object_size,
+            "height": object_size
+        }
+
+        self._t_start = perf_counter()
+
+    def stop(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self._stack = None
+        self._images = None
+
+    @staticmethod
+    def get_monitors_info():
+        """List replay sources available in the replays/ folder."""
+        sources = []
+        if REPLAY_FOLDER.is_dir():
+            for entry in sorted(os.scandir(REPLAY_FOLDER), key=lambda e: e.name):
+                if _is_replay_source(entry.path):
+                    sources.append((f"Replay: {entry.name}", entry.path))
+
+        if not sources:
+            sources = [("No replay source found", str(REPLAY_FOLDER))]
+
+        return sources
+
+    def _read_frame(self, index):
+        if self._images is not None:
+            frame = cv2.imread(self._images[index], cv2.IMREAD_COLOR)
+            if frame is None:
+                raise RuntimeError(f"Could not read replay image: {self._images[index]}")
+            return frame
+
+        if self._stack is not None:
+            return self._stack[index]
+
+        # Video: sequential decoding, skipped frames are grabbed without being decoded
+        if index < self._video_index:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            self._video_index = index - 1
+
+        while self._video_index < index - 1:
+            self._cap.grab()
+            self._video_index += 1
+
+        ret, frame = self._cap.read()
+        self._video_index += 1
+        if not ret or frame is None:
+            raise EOFError(f"Replay source ended: {self.source}")
+        return frame
+
+    def _next_index(self):
+        if self.realtime:
+            index = int((perf_counter() - self._t_start) * self.fps)
+        else:
+            index = self._index
+            self._index += 1
+
+        if index >= self.nb_frames:
+            if not self.loop:
+                raise EOFError(f"Replay source ended: {self.source}")
+            index %= self.nb_frames
+
+        return index
+
+    def get_raw_frame(self):
+        """Return the next full frame of the source (BGR for image folders and videos, RGB for .npy stacks)."""
+        if self._t_start is None or (self._images is None and self._stack is None and self._cap is None):
+            raise RuntimeError("Monitoring_replay not started. Call start() before grabbing frames.")
+
+        index = self._next_index()
+
+        # Realtime mode requested faster than the original frame rate: same frame as before
+        if self._last_frame is not None and index == self._last_index:
+            return self._last_frame
+
+        self._last_frame = self._read_frame(index)
+        self._last_index = index
+        return self._last_frame
+
+    def get_frame_pil(self) -> Image.Image:
+        return Image.fromarray(self.get_frame_np())
+
+    def get_frame_np(self) -> np.ndarray:
+        """
+        Return the center-cropped frame as numpy array (RGB).
+        The returned array is a persistent buffer reused by the next call, copy it if it must be kept.
+        """
+        frame = self.get_raw_frame()
+
+        region = self.monitor_region
+        frame = frame[
+            region['top']:region['top'] + region['height'],
+            region['left']:region['left'] + region['width']
+        ]
+
+        if frame.shape[:2] != (self.crop_size, self.crop_size):
+            frame = cv2.resize(frame, (self.crop_size, self.crop_size), dst=self._frame_resized, interpolation=cv2.INTER_CUBIC)
+
+        if self._is_bgr:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._frame_out)
+
+        np.copyto(self._frame_out, frame)
+        return self._frame_out
+
+
+def images_to_npy(folder, output_path):
+    """Convert an image folder (sorted by file name) to a .npy RGB frame stack for fast replay."""
+    images = sorted(f for f in glob(os.path.join(folder, "*.*")) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise RuntimeError(f"No image found in {folder}")
+
+    first = cv2.imread(images[0], cv2.IMREAD_COLOR)
+    stack = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.uint8, shape=(len(images),) + first.shape)
+
+    for i, image in enumerate(images):
+        frame = cv2.imread(image, cv2.IMREAD_COLOR)
+        if frame.shape != first.shape:
+            frame = cv2.resize(frame, (first.shape[1], first.shape[0]), interpolation=cv2.INTER_CUBIC)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=stack[i])
+
+    stack.flush()
+    return len(images)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m dbd.utils.monitoring_replay <image_folder> <output.npy>")
+        sys.exit(1)
+
+    nb_images = images_to_npy(sys.argv[1], sys.argv[2])
+    print(f"Saved {nb_images} frames to {sys.argv[2]}")
@@ -23,7 +23,9 @@ import cv2
 import numpy as np
 from PIL import Image
 import subprocess
+import threading
 import os
+from time import sleep
 
 from dbd.utils.monitoring_mss import Monitoring
 
@@ -50,7 +52,17 @@ class Monitoring_v4l2(Monitoring):
     This is the lowest-latency option for Wayland users.
     """
     
-    def __init__(self, device_id=0, crop_size=224):
+    # Grabber thread: consecutive failed reads (with backoff, ~3 s) before the device is considered lost
+    MAX_READ_FAILURES = 30
+
+    def __init__(self, device_id=0, crop_size=224, threaded=False):
+        """
+        Args:
+            device_id: v4l2 device index or path (e.g. /dev/video0)
+            crop_size: size of the returned square frame
+            threaded: if True, a grabber thread continuously drains the device and only the newest
+                      frame is kept, so slow inference never classifies stale queued buffers
+        """
         super().__init__()
         self.crop_size = crop_size
         
@@ -61,16 +73,38 @@ class Monitoring_v4l2(Monitoring):
         
         self.cap = None
 
+        # Persistent output buffers of get_frame_np
+        self._frame_out = np.empty((crop_size, crop_size, 3), dtype=np.uint8)
+        self._frame_resized = np.empty((crop_size, crop_size, 3), dtype=np.uint8)
+
+        # Draining grabber thread state
+        self.threaded = threaded
+        self.frames_captured = 0  # frames read from the device by the grabber thread
+        self.frames_dropped = 0  # frames overwritten before being consumed
+        self._thread = None
+        self._running = False
+        self._slot_lock = threading.Lock()
+        self._latest_frame = None
+        self._latest_fresh = False
+        self._thread_error = None
+
+    def _open_capture(self):
+        """Open the capture device. Override to plug another VideoCapture-like source (e.g. a fake for testing)."""
+        return cv2.VideoCapture(self.device_path, cv2.CAP_V4L2)
+
     def start(self):
         """Open the v4l2 device for capture."""
-        self.cap = cv2.VideoCapture(self.device_path, cv2.CAP_V4L2)
+        self.cap = self._open_capture()
         
         if not self.cap.isOpened():
             raise RuntimeError(
                 f"Could not open v4l2 device: {self.device_path}\n"
                 "Please ensure OBS 'Start Virtual Camera' is running."
             )
-        
+
+        # Keep the driver queue as short as possible, queued buffers are stale frames
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
         # Read initial frame to get dimensions
         ret, frame = self.cap.read()
         if not ret or frame is None:
@@ -86,8 +120,28 @@ class Monitoring_v4l2(Monitoring):
         
         print(f"v4l2: Capturing from {self.device_path} ({self._frame_width}x{self._frame_height})")
 
+        if self.threaded:
+            self.frames_captured = 0
+            self.frames_dropped = 0
+            self._latest_frame = frame
+            self._latest_fresh = True
+            self._thread_error = None
+            self._running = True
+            self._thread = threading.Thread(target=self._grab_loop, name="Monitoring_v4l2", daemon=True)
+            self._thread.start()
+
     def stop(self):
         """Release the capture device."""
+        if self._thread is not None:
+            self._running = False
+            self._thread.join(timeout=2.0)
+            alive = self._thread.is_alive()
+            self._thread = None
+            if alive:
+                # read() still blocked in the driver: the grabber thread releases the device once it returns
+                self.cap = None
+                return
+
         if self.cap is not None:
             self.cap.release()
             self.cap = None
@@ -136,11 +190,48 @@ class Monitoring_v4l2(Monitoring):
             "height": object_size
         }
 
+    def _grab_loop(self):
+        """Grabber thread: drain the device as fast as it delivers frames, keep only the newest one."""
+        cap = self.cap
+        nb_failures = 0
+        try:
+            while self._running:
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    # Device lost or unplugged: back off instead of spinning, give up after MAX_READ_FAILURES
+                    nb_failures += 1
+                    if nb_failures >= self.MAX_READ_FAILURES:
+                        with self._slot_lock:
+                            self._thread_error = RuntimeError(
+                                f"v4l2 device {self.device_path} stopped delivering frames ({nb_failures} failed reads)")
+                        break
+                    sleep(min(0.001 * 2 ** nb_failures, 0.1))
+                    continue
+
+                nb_failures = 0
+                with self._slot_lock:
+                    if self._latest_fresh:
+                        self.frames_dropped += 1
+                    self._latest_frame = frame
+                    self._latest_fresh = True
+                    self.frames_captured += 1
+        finally:
+            if self.cap is not cap:
+                cap.release()  # stop() did not wait for the last read, see stop()
+
     def get_raw_frame(self):
         """Grab a raw frame from the device."""
         if self.cap is None:
             raise RuntimeError("v4l2 not started. Call start() first.")
-        
+
+        if self.threaded:
+            # Non-blocking: newest drained frame (the previous one again if no new frame arrived yet)
+            with self._slot_lock:
+                if self._thread_error is not None:
+                    raise RuntimeError(f"Monitoring_v4l2 grabber thread failed: {self._thread_error}")
+                self._latest_fresh = False
+                return self._latest_frame
+
         ret, frame = self.cap.read()
         if not ret or frame is None:
             return np.zeros((self._frame_height, self._frame_width, 3), dtype=np.uint8)
@@ -153,13 +244,13 @@ class Monitoring_v4l2(Monitoring):
         return Image.fromarray(frame)
 
     def get_frame_np(self) -> np.ndarray:
-        """Return center-cropped frame as numpy array (RGB)."""
+        """
+        Return center-cropped frame as numpy array (RGB).
+        The crop is taken first (view, no copy), so resize and colour conversion only run on the region of interest
+        and write into persistent buffers. The returned array is reused by the next call, copy it if it must be kept.
+        """
         frame = self.get_raw_frame()
-        
-        # BGR -> RGB
-        if len(frame.shape) == 3 and frame.shape[2] == 3:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
+
         # Center crop
         region = self.monitor_region
         if frame.shape[0] > region['height'] or frame.shape[1] > region['width']:
@@ -167,9 +258,201 @@ class Monitoring_v4l2(Monitoring):
                 region['top']:region['top'] + region['height'],
                 region['left']:region['left'] + region['width']
             ]
-        
-        # Resize
+
+        if len(frame.shape) != 3 or frame.shape[2] != 3:
+            if frame.shape[:2] != (self.crop_size, self.crop_size):
+                frame = cv2.resize(frame, (self.crop_size, self.crop_size), interpolation=cv2.INTER_CUBIC)
+            return frame
+
+        # Resize (per-channel interpolation, so identical before or after the channel swap)
         if frame.shape[:2] != (self.crop_size, self.crop_size):
-            frame = cv2.resize(frame, (self.crop_size, self.crop_size), interpolation=cv2.INTER_CUBIC)
-        
+            frame = cv2.resize(frame, (self.crop_size, self.crop_size), dst=self._frame_resized, interpolation=cv2.INTER_CUBIC)
+
+        # BGR -> RGB
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._frame_out)
+
+
+if __name__ == '__main__':
+    # Draining grabber checks against fake VideoCaptures (no device needed), then the crop-first microbenchmark.
+    # Exits with code 1 if a check fails.
+    #   python -m dbd.utils.monitoring_v4l2
+    import sys
+    from time import perf_counter
+
+    failures = []
+
+    def expect(condition, message):
+        if not condition:
+            print(f"Error: {message}")
+            failures.append(message)
+
+    class FakeVideoCapture:
+        """60 FPS source with a 4-buffer driver queue that ignores the buffer size hint, like some loopback drivers."""
+
+        def __init__(self, fps=60, width=1920, height=1080, nb_buffers=4):
+            self.period = 1.0 / fps
+            self.shape = (height, width, 3)
+            self.nb_buffers = nb_buffers
+            self.t_start = perf_counter()
+            self.last_idx = -1
+
+        def isOpened(self):
+            return True
+
+        def set(self, prop, value):
+            return False
+
+        def read(self):
+            idx_now = int((perf_counter() - self.t_start) / self.period)
+            if idx_now <= self.last_idx:
+                # Block until the next frame is produced
+                sleep(self.t_start + (self.last_idx + 1) * self.period - perf_counter())
+                idx_now = self.last_idx + 1
+
+            # The queue holds the newest nb_buffers frames, the oldest queued one is dequeued
+            self.last_idx = max(self.last_idx + 1, idx_now - self.nb_buffers + 1)
+
+            frame = np.zeros(self.shape, dtype=np.uint8)
+            timestamp = self.t_start + self.last_idx * self.period
+            frame.reshape(-1)[:8].view(np.float64)[0] = timestamp  # timestamp embedded in the first bytes
+            return True, frame
+
+        def release(self):
+            pass
+
+    class FakeMonitoring(Monitoring_v4l2):
+        def _open_capture(self):
+            return FakeVideoCapture()
+
+    # Draining: with a consumer slower than the source, the grabber keeps the newest frame and counts the others dropped
+    inference_time = 0.030  # slower than the 60 FPS source
+    period = 1 / 60
+    nb_calls = 60
+    mean_ages = {}
+    for threaded in [False, True]:
+        with FakeMonitoring(threaded=threaded) as mon:
+            ages = []
+            for _ in range(nb_calls):
+                frame = mon.get_raw_frame()
+                ages.append(perf_counter() - frame.reshape(-1)[:8].view(np.float64)[0])
+                sleep(inference_time)
+
+            mode = "threaded" if threaded else "sync"
+            mean_ages[mode] = np.mean(ages)
+            print(f"{mode:>8}: mean frame age {mean_ages[mode] * 1000:5.1f} ms, dropped {mon.frames_dropped}/{mon.frames_captured}")
+
+            if threaded:
+                # Every captured frame is either consumed (at most one per call, + the first frame) or dropped
+                expect(mon.frames_captured - mon.frames_dropped <= nb_calls + 1,
+                       f"{mon.frames_captured - mon.frames_dropped} frames consumed by {nb_calls} calls")
+                expect(mon.frames_captured >= nb_calls * inference_time / period * 0.8,
+                       f"grabber captured {mon.frames_captured} frames, the source produced ~{nb_calls * inference_time / period:.0f}")
+                expect(mon.frames_dropped > 0, "no frame dropped with a consumer slower than the source")
+
+    expect(mean_ages["threaded"] < 2 * period, f"threaded mean frame age {mean_ages['threaded'] * 1000:.1f} ms "
+                                                f"(at most 2 frame periods expected)")
+    expect(mean_ages["threaded"] < mean_ages["sync"], "threaded frames are not fresher than the queued sync frames")
+
+    # Device lost: the grabber backs off, gives up after MAX_READ_FAILURES and get_raw_frame raises
+    class LostVideoCapture(FakeVideoCapture):
+        def __init__(self, nb_frames=3):
+            super().__init__()
+            self.nb_frames = nb_frames
+            self.nb_reads = 0
+
+        def read(self):
+            self.nb_reads += 1
+            if self.nb_reads > self.nb_frames:
+                return False, None
+            return super().read()
+
+    class LostMonitoring(Monitoring_v4l2):
+        MAX_READ_FAILURES = 10
+
+        def _open_capture(self):
+            return LostVideoCapture()
+
+    with LostMonitoring(threaded=True) as mon:
+        t0 = perf_counter()
+        error = None
+        while error is None and perf_counter() - t0 < 5.0:
+            try:
+                mon.get_raw_frame()
+            except RuntimeError as e:
+                error = e
+            sleep(0.01)
+        nb_reads = mon.cap.nb_reads
+        expect(error is not None, "get_raw_frame did not raise after the device stopped delivering frames")
+        expect(nb_reads == 3 + LostMonitoring.MAX_READ_FAILURES,
+               f"{nb_reads} reads ({3 + LostMonitoring.MAX_READ_FAILURES} expected: no retry after giving up)")
+        print(f"    lost: raised after {perf_counter() - t0:.2f} s, {nb_reads} reads ({error})")
+
+    # stop() while read() is blocked in the driver: the device is released by the grabber once read() returns,
+    # never under its feet
+    import threading
+
+    class BlockingVideoCapture(FakeVideoCapture):
+        def __init__(self):
+            super().__init__()
+            self.unblock = threading.Event()
+            self.nb_reads = 0
+            self.released = False
+
+        def read(self):
+            self.nb_reads += 1
+            if self.nb_reads > 1:
+                self.unblock.wait()
+            if self.released:
+                raise RuntimeError("read after release")
+            return super().read()
+
+        def release(self):
+            self.released = True
+
+    class BlockingMonitoring(Monitoring_v4l2):
+        def _open_capture(self):
+            return BlockingVideoCapture()
+
+    mon = BlockingMonitoring(threaded=True)
+    mon.start()
+    cap, thread = mon.cap, mon._thread
+    sleep(0.1)  # grabber blocked in its second read
+    mon.stop()
+    expect(not cap.released, "stop() released the device while the grabber was blocked in read()")
+    cap.unblock.set()
+    thread.join(timeout=2.0)
+    expect(not thread.is_alive(), "grabber thread still running after read() returned")
+    expect(cap.released, "device not released by the grabber after stop() gave up waiting")
+    print(f" blocked: released by the grabber after stop(): {cap.released}")
+
+    # Crop-before-convert microbenchmark against the previous full-frame conversion
+    def get_frame_np_legacy(mon, frame):
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        region = mon.monitor_region
+        frame = frame[region['top']:region['top'] + region['height'], region['left']:region['left'] + region['width']]
+        if frame.shape[:2] != (mon.crop_size, mon.crop_size):
+            frame = cv2.resize(frame, (mon.crop_size, mon.crop_size), interpolation=cv2.INTER_CUBIC)
         return frame
+
+    class StaticMonitoring(Monitoring_v4l2):
+        def get_raw_frame(self):
+            return self.raw_frame
+
+    rng = np.random.default_rng(0)
+    nb_iters = 500
+    for width, height in [(1920, 1080), (2560, 1440)]:
+        mon = StaticMonitoring()
+        mon.raw_frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        mon.monitor_region = mon._calculate_center_region(width, height, mon.crop_size)
+
+        expect(np.array_equal(get_frame_np_legacy(mon, mon.raw_frame), mon.get_frame_np()),
+               f"crop-first frame differs from the legacy conversion at {height}p")
+
+        for name, fn in [("legacy", lambda: get_frame_np_legacy(mon, mon.raw_frame)), ("crop-first", mon.get_frame_np)]:
+            t0 = perf_counter()
+            for _ in range(nb_iters):
+                fn()
+            dt = (perf_counter() - t0) / nb_iters
+            print(f"{height}p {name:>10}: {dt * 1e6:8.1f} us/frame")
+
+    sys.exit(1 if failures else 0)
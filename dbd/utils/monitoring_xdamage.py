@@ -0,0 +1,332 @@
+"""
+X11 XDamage Event-Driven Screen Capture Module
+
+Instead of grabbing the screen as fast as possible, this backend subscribes to XDamage
+events and only grabs (through the MIT-SHM segment of Monitoring_xshm) when the monitored
+region was actually repainted. get_frame_np blocks until the region is damaged, so the
+monitoring loop, and thus the AI model inference, goes idle when nothing changes on screen.
+
+Requirements:
+- Linux X11 session (or Xvfb), with the DAMAGE and MIT-SHM extensions
+- libX11, libXext and libXdamage
+
+Scripted painter demo (works under Xvfb), reports the damage rate versus the grab rate:
+    python -m dbd.utils.monitoring_xdamage
+Check with the scripted painter (exit code 1 on failure), on a fresh Xvfb server if DISPLAY is not set
+(skipped without Xvfb):
+    python -m dbd.utils.monitoring_xdamage --check
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+from time import perf_counter
+
+from dbd.utils.monitoring_xshm import Monitoring_xshm, XSHM_AVAILABLE, trap_x_errors
+
+XDamageReportRawRectangles = 0
+XDamageNotify = 0
+
+
+class XRectangle(ctypes.Structure):
+    _fields_ = [
+        ("x", ctypes.c_short),
+        ("y", ctypes.c_short),
+        ("width", ctypes.c_ushort),
+        ("height", ctypes.c_ushort),
+    ]
+
+
+class XDamageNotifyEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("serial", ctypes.c_ulong),
+        ("send_event", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("drawable", ctypes.c_ulong),
+        ("damage", ctypes.c_ulong),
+        ("level", ctypes.c_int),
+        ("more", ctypes.c_int),
+        ("timestamp", ctypes.c_ulong),
+        ("area", XRectangle),
+        ("geometry", XRectangle),
+    ]
+
+
+class XEvent(ctypes.Union):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("xdamage", XDamageNotifyEvent),
+        ("pad", ctypes.c_long * 24),
+    ]
+
+
+def _load_libs():
+    xlib = ctypes.cdll.LoadLibrary(ctypes.util.find_library("X11") or "libX11.so.6")
+    xdamage = ctypes.cdll.LoadLibrary(ctypes.util.find_library("Xdamage") or "libXdamage.so.1")
+
+    xlib.XPending.argtypes = [ctypes.c_void_p]
+    xlib.XPending.restype = ctypes.c_int
+    xlib.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.POINTER(XEvent)]
+    xlib.XConnectionNumber.argtypes = [ctypes.c_void_p]
+    xlib.XConnectionNumber.restype = ctypes.c_int
+    xlib.XFlush.argtypes = [ctypes.c_void_p]
+
+    xdamage.XDamageQueryExtension.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)]
+    xdamage.XDamageQueryExtension.restype = ctypes.c_int
+    xdamage.XDamageCreate.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int]
+    xdamage.XDamageCreate.restype = ctypes.c_ulong
+    xdamage.XDamageDestroy.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+
+    return xlib, xdamage
+
+
+XDAMAGE_AVAILABLE = False
+try:
+    if XSHM_AVAILABLE:
+        _xlib, _xdamage = _load_libs()
+        XDAMAGE_AVAILABLE = True
+except Exception:
+    pass
+
+
+class Monitoring_xdamage(Monitoring_xshm):
+    """
+    X11 capture driven by XDamage events: a frame is grabbed only when the monitored region was repainted.
+
+    get_frame_np blocks until the region is damaged. If nothing is repainted within `timeout` seconds,
+    the last frame is returned again so that the calling loop keeps control (stop requests, FPS display).
+    """
+
+    def __init__(self, monitor_id=1, crop_size=224, timeout=0.1):
+        super().__init__(monitor_id=monitor_id, crop_size=crop_size)
+        self.timeout = timeout
+
+        self._damage = None
+        self._event_base = None
+        self._fd = None
+        self._event = XEvent()
+        self._region_damaged = False
+
+        # Statistics
+        self.nb_damage_events = 0  # all damage events of the screen
+        self.nb_region_damage_events = 0  # damage events intersecting the monitored region
+        self.nb_grabs = 0
+        self._t_start = None
+        self._t_stop = None
+
+    def start(self):
+        if not XDAMAGE_AVAILABLE:
+            raise RuntimeError("X11 XDamage capture not available (requires a Linux X11 session with libXdamage).")
+
+        super().start()
+
+        try:
+            event_base, error_base = ctypes.c_int(), ctypes.c_int()
+            if not _xdamage.XDamageQueryExtension(self._display, ctypes.byref(event_base), ctypes.byref(error_base)):
+                raise RuntimeError("X server does not support the DAMAGE extension.")
+
+            self._event_base = event_base.value
+            with trap_x_errors() as x_errors:
+                self._damage = _xdamage.XDamageCreate(self._display, self._root, XDamageReportRawRectangles)
+                _xlib.XSync(self._display, 0)
+            if x_errors:
+                raise RuntimeError(f"XDamageCreate failed (X error codes {x_errors}).")
+            self._fd = _xlib.XConnectionNumber(self._display)
+        except Exception:
+            self.stop()
+            raise
+
+        self.nb_damage_events = 0
+        self.nb_region_damage_events = 0
+        self.nb_grabs = 0
+        self._t_start = perf_counter()
+        self._t_stop = None
+
+        # First frame is always grabbed
+        self._region_damaged = True
+
+    def stop(self):
+        if self._damage and self._display:
+            _xdamage.XDamageDestroy(self._display, self._damage)
+        if self._t_start is not None and self._t_stop is None:
+            self._t_stop = perf_counter()  # get_stats reports the rates of the capture session
+        self._damage = None
+        self._fd = None
+
+        super().stop()
+
+    def _intersects_region(self, area):
+        region = self.monitor_region
+        return (area.x < region["left"] + region["width"] and area.x + area.width > region["left"] and
+                area.y < region["top"] + region["height"] and area.y + area.height > region["top"])
+
+    def _process_events(self):
+        """Consume all pending X events, flag the region as damaged if any damage intersects it."""
+        damage_notify = self._event_base + XDamageNotify
+        # Asynchronous X errors are read with the events: recorded instead of exiting the process
+        with trap_x_errors() as x_errors:
+            while _xlib.XPending(self._display):
+                _xlib.XNextEvent(self._display, ctypes.byref(self._event))
+                if self._event.type != damage_notify:
+                    continue
+
+                self.nb_damage_events += 1
+                if self._intersects_region(self._event.xdamage.area):
+                    self.nb_region_damage_events += 1
+                    self._region_damaged = True
+        if x_errors:
+            raise RuntimeError(f"X error while reading the damage events (X error codes {x_errors}).")
+
+    def wait_for_damage(self, timeout=None) -> bool:
+        """
+        Block until the monitored region is repainted.
+        Returns:
+            True if the region was damaged since the last grab, False on timeout.
+        """
+        if self._fd is None:
+            raise RuntimeError("Monitoring_xdamage not started. Call start() before grabbing frames.")
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = perf_counter() + timeout
+
+        self._process_events()
+        while not self._region_damaged:
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                return False
+            select.select([self._fd], [], [], remaining)
+            self._process_events()
+
+        return True
+
+    def get_raw_frame(self):
+        if self.wait_for_damage():
+            self._region_damaged = False
+            self.nb_grabs += 1
+            return super().get_raw_frame()
+
+        return self._frame_view
+
+    def get_stats(self) -> dict:
+        """Damage rate versus grab rate between start and stop (events per second)."""
+        t_end = self._t_stop if self._t_stop is not None else perf_counter()
+        elapsed = max(t_end - self._t_start, 1e-9) if self._t_start else 1e-9
+        return {
+            "damage_rate": self.nb_damage_events / elapsed,
+            "region_damage_rate": self.nb_region_damage_events / elapsed,
+            "grab_rate": self.nb_grabs / elapsed,
+        }
+
+
+def format_stats(stats: dict) -> str:
+    return (f"damage {stats['damage_rate']:.1f}/s (monitored region {stats['region_damage_rate']:.1f}/s), "
+            f"grabs {stats['grab_rate']:.1f}/s")
+
+
+def _scripted_painter(region, paint_hz, duration):
+    """Repaint a window placed over the monitored region at a scripted rate (run in its own process)."""
+    from time import sleep
+
+    xlib = ctypes.cdll.LoadLibrary(ctypes.util.find_library("X11") or "libX11.so.6")
+    xlib.XOpenDisplay.restype = ctypes.c_void_p
+    xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+    xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+    xlib.XCreateSimpleWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int, ctypes.c_uint,
+                                         ctypes.c_uint, ctypes.c_uint, ctypes.c_ulong, ctypes.c_ulong]
+    xlib.XCreateSimpleWindow.restype = ctypes.c_ulong
+    xlib.XMapWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+    xlib.XCreateGC.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_void_p]
+    xlib.XCreateGC.restype = ctypes.c_void_p
+    xlib.XSetForeground.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong]
+    xlib.XFillRectangle.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+                                    ctypes.c_uint, ctypes.c_uint]
+    xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+
+    display = xlib.XOpenDisplay(None)
+    root = xlib.XDefaultRootWindow(display)
+    width, height = region["width"], region["height"]
+    window = xlib.XCreateSimpleWindow(display, root, region["left"], region["top"], width, height, 0, 0, 0)
+    xlib.XMapWindow(display, window)
+    gc = xlib.XCreateGC(display, window, 0, None)
+    xlib.XSync(display, 0)
+
+    i = 0
+    t_end = perf_counter() + duration
+    while perf_counter() < t_end:
+        xlib.XSetForeground(display, gc, (i * 0x101010) & 0xFFFFFF)
+        xlib.XFillRectangle(display, window, gc, 0, 0, width, height)
+        xlib.XSync(display, 0)
+        i += 1
+        sleep(1.0 / paint_hz)
+
+    xlib.XCloseDisplay(display)
+
+
+def check() -> bool:
+    """
+    Scripted painter over the monitored region: one grab per repaint while painting (damage driven),
+    no grab while the screen is static.
+    """
+    import multiprocessing
+
+    ok = True
+    paint_hz, duration = 10, 2.0
+    with Monitoring_xdamage(crop_size=224, timeout=0.2) as mon:
+        mon.get_frame_np()  # first frame, always grabbed
+
+        # Static screen: only timeouts, the last frame is returned again
+        nb_grabs = mon.nb_grabs
+        t_end = perf_counter() + 0.5
+        while perf_counter() < t_end:
+            mon.get_frame_np()
+        if mon.nb_grabs != nb_grabs:
+            print(f"Error: {mon.nb_grabs - nb_grabs} grabs on a static screen (0 expected)")
+            ok = False
+
+        painter = multiprocessing.Process(target=_scripted_painter, args=(mon.monitor_region, paint_hz, duration))
+        painter.start()
+        nb_grabs = mon.nb_grabs
+        t_end = perf_counter() + duration
+        while perf_counter() < t_end:
+            mon.get_frame_np()
+        painter.join()
+        nb_painted = mon.nb_grabs - nb_grabs
+
+    # The first repaints also map the painter window
+    expected = paint_hz * duration
+    if not 0.5 * expected <= nb_painted <= 1.5 * expected + 2:
+        print(f"Error: {nb_painted} grabs for ~{expected:.0f} repaints of the monitored region")
+        ok = False
+    print(f"xdamage: {format_stats(mon.get_stats())}")
+    if ok:
+        print("xdamage check passed")
+    return ok
+
+
+if __name__ == '__main__':
+    import multiprocessing
+
+    if "--check" in sys.argv[1:]:
+        if not os.environ.get("DISPLAY"):
+            from dbd.utils.xvfb import run_under_xvfb
+            sys.exit(run_under_xvfb("dbd.utils.monitoring_xdamage", ["--check"]))
+        sys.exit(0 if check() else 1)
+
+    duration = 3.0
+    for paint_hz in [0.5, 10, 60]:
+        with Monitoring_xdamage(crop_size=224, timeout=1.0) as mon:
+            painter = multiprocessing.Process(target=_scripted_painter, args=(mon.monitor_region, paint_hz, duration))
+            painter.start()
+
+            t_end = perf_counter() + duration
+            while perf_counter() < t_end:
+                mon.get_frame_np()
+
+            painter.join()
+            stats = mon.get_stats()
+            print(f"Painter {paint_hz:5.1f} Hz -> damage {stats['damage_rate']:6.1f}/s, "
+                  f"region damage {stats['region_damage_rate']:6.1f}/s, grabs {stats['grab_rate']:6.1f}/s")
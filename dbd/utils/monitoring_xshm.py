@@ -0,0 +1,356 @@
+"""
+X11 MIT-SHM Screen Capture Module
+
+Native X11 capture using the MIT shared memory extension (XShmGetImage).
+A shared memory segment sized to the monitored region is attached once to the X server,
+then every grab copies the region straight into it: no per-frame allocation, no Python
+object churn. The segment is exposed as a reusable numpy view.
+
+Requirements:
+- Linux X11 session (or Xvfb), with the MIT-SHM extension (enabled by default)
+- libX11 and libXext (installed with any X11 desktop)
+
+Benchmark against mss on the current display (works under Xvfb):
+    python -m dbd.utils.monitoring_xshm
+Check (exit code 1 on failure), on a fresh Xvfb server if DISPLAY is not set (skipped without Xvfb):
+    python -m dbd.utils.monitoring_xshm --check
+"""
+
+import ctypes
+import ctypes.util
+import os
+import sys
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from dbd.utils.monitoring_mss import Monitoring, Monitoring_mss
+
+ZPixmap = 2
+AllPlanes = 0xFFFFFFFF
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+
+class XImage(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+        ("obdata", ctypes.c_void_p),
+        ("f", ctypes.c_void_p * 6),
+    ]
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong),
+        ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte),
+        ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+
+XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent))
+
+
+def _load_libs():
+    xlib = ctypes.cdll.LoadLibrary(ctypes.util.find_library("X11") or "libX11.so.6")
+    xext = ctypes.cdll.LoadLibrary(ctypes.util.find_library("Xext") or "libXext.so.6")
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+    xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    xlib.XOpenDisplay.restype = ctypes.c_void_p
+    xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+    xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+    xlib.XDefaultScreen.restype = ctypes.c_int
+    xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+    xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+    xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDefaultVisual.restype = ctypes.c_void_p
+    xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDefaultDepth.restype = ctypes.c_int
+    xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XFree.argtypes = [ctypes.c_void_p]
+    xlib.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+    xlib.XSetErrorHandler.restype = ctypes.c_void_p
+
+    xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+    xext.XShmQueryExtension.restype = ctypes.c_int
+    xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+                                     ctypes.POINTER(XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+    xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+    xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+    xext.XShmAttach.restype = ctypes.c_int
+    xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+    xext.XShmDetach.restype = ctypes.c_int
+    xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage), ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+    xext.XShmGetImage.restype = ctypes.c_int
+
+    libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    libc.shmget.restype = ctypes.c_int
+    libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    libc.shmat.restype = ctypes.c_void_p
+    libc.shmdt.argtypes = [ctypes.c_void_p]
+    libc.shmdt.restype = ctypes.c_int
+    libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    libc.shmctl.restype = ctypes.c_int
+
+    return xlib, xext, libc
+
+
+# Check if X11 MIT-SHM capture is possible on this system
+XSHM_AVAILABLE = False
+try:
+    if sys.platform.startswith("linux") and os.environ.get("DISPLAY"):
+        _xlib, _xext, _libc = _load_libs()
+        XSHM_AVAILABLE = True
+except Exception:
+    pass
+
+
+# X errors are recorded instead of terminating the process (default Xlib handler), see trap_x_errors
+_x_errors = []
+
+
+@XErrorHandler
+def _x_error_handler(display, event):
+    _x_errors.append(event.contents.error_code)
+    return 0
+
+
+@contextmanager
+def trap_x_errors():
+    """
+    Record the X errors of the requests made in the block (error codes appended to the yielded list).
+    Errors of requests with a reply (XShmGetImage) are reported before the call returns, the others after an XSync.
+    """
+    _x_errors.clear()
+    previous_handler = _xlib.XSetErrorHandler(ctypes.cast(_x_error_handler, ctypes.c_void_p))
+    try:
+        yield _x_errors
+    finally:
+        _xlib.XSetErrorHandler(previous_handler)
+
+
+class Monitoring_xshm(Monitoring):
+    """
+    X11 screen capture through a persistent MIT-SHM segment.
+
+    The Xlib display connection is not thread-safe: start, grab and stop from the same thread.
+    """
+
+    def __init__(self, monitor_id=1, crop_size=224):
+        super().__init__()
+        self.crop_size = crop_size
+        self.monitor_region = Monitoring_mss._get_monitor_region(monitor_id, crop_size)
+
+        self._display = None
+        self._root = None
+        self._ximage = None
+        self._shminfo = None
+        self._frame_view = None  # (height, width, 4) BGRA view of the shared memory segment
+
+        # Persistent output buffers of get_frame_np
+        self._frame_out = np.empty((crop_size, crop_size, 3), dtype=np.uint8)
+        self._frame_resized = np.empty((crop_size, crop_size, 4), dtype=np.uint8)
+
+    def start(self):
+        if not XSHM_AVAILABLE:
+            raise RuntimeError("X11 MIT-SHM capture not available (requires a Linux X11 session with libX11 and libXext).")
+
+        self._display = _xlib.XOpenDisplay(None)
+        if not self._display:
+            raise RuntimeError(f"Could not open X display: {os.environ.get('DISPLAY')}")
+
+        try:
+            self._attach()
+        except Exception:
+            self.stop()
+            raise
+
+    def _attach(self):
+        if not _xext.XShmQueryExtension(self._display):
+            raise RuntimeError("X server does not support the MIT-SHM extension.")
+
+        screen = _xlib.XDefaultScreen(self._display)
+        self._root = _xlib.XDefaultRootWindow(self._display)
+        visual = _xlib.XDefaultVisual(self._display, screen)
+        depth = _xlib.XDefaultDepth(self._display, screen)
+
+        width, height = self.monitor_region["width"], self.monitor_region["height"]
+        self._shminfo = XShmSegmentInfo()
+        self._ximage = _xext.XShmCreateImage(self._display, visual, depth, ZPixmap, None, ctypes.byref(self._shminfo), width, height)
+        if not self._ximage:
+            raise RuntimeError("XShmCreateImage failed.")
+
+        ximage = self._ximage.contents
+        if ximage.bits_per_pixel != 32:
+            raise RuntimeError(f"Unsupported X11 pixel format: {ximage.bits_per_pixel} bits per pixel (32 expected).")
+
+        size = ximage.bytes_per_line * ximage.height
+        self._shminfo.shmid = _libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if self._shminfo.shmid < 0:
+            raise OSError(ctypes.get_errno(), "shmget failed")
+
+        shmaddr = _libc.shmat(self._shminfo.shmid, None, 0)
+        if shmaddr in (None, ctypes.c_void_p(-1).value):
+            _libc.shmctl(self._shminfo.shmid, IPC_RMID, None)
+            self._shminfo.shmid = -1
+            raise OSError(ctypes.get_errno(), "shmat failed")
+
+        self._shminfo.shmaddr = shmaddr
+        self._shminfo.readOnly = 0
+        ximage.data = shmaddr
+
+        with trap_x_errors() as x_errors:
+            attached = _xext.XShmAttach(self._display, ctypes.byref(self._shminfo))
+            _xlib.XSync(self._display, 0)
+
+        # The segment is freed automatically once both the X server and this process detached it
+        _libc.shmctl(self._shminfo.shmid, IPC_RMID, None)
+
+        if not attached or x_errors:
+            self._shminfo.shmseg = 0
+            raise RuntimeError("XShmAttach failed (MIT-SHM is not usable on a remote X display).")
+
+        buffer = (ctypes.c_ubyte * size).from_address(shmaddr)
+        view = np.frombuffer(buffer, dtype=np.uint8).reshape(ximage.height, ximage.bytes_per_line // 4, 4)
+        self._frame_view = view[:, :ximage.width]
+
+    def stop(self):
+        self._frame_view = None
+
+        if self._display:
+            if self._shminfo is not None and self._shminfo.shmseg:
+                _xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+                _xlib.XSync(self._display, 0)
+
+            if self._ximage:
+                _xlib.XFree(self._ximage)  # the data pointer is the shared memory segment, released below
+                self._ximage = None
+
+            _xlib.XCloseDisplay(self._display)
+            self._display = None
+
+        if self._shminfo is not None and self._shminfo.shmaddr:
+            _libc.shmdt(self._shminfo.shmaddr)
+        self._shminfo = None
+
+    @staticmethod
+    def get_monitors_info():
+        return Monitoring_mss.get_monitors_info()
+
+    def get_raw_frame(self) -> np.ndarray:
+        """
+        Grab the monitored region into the shared memory segment.
+        Returns:
+            np.ndarray: BGRA view (height x width x 4) of the segment, overwritten by the next grab.
+        """
+        if self._frame_view is None:
+            raise RuntimeError("Monitoring_xshm not started. Call start() before grabbing frames.")
+
+        # BadMatch when the region is (partly) off screen, e.g. after a monitor layout change
+        with trap_x_errors() as x_errors:
+            ok = _xext.XShmGetImage(self._display, self._root, self._ximage,
+                                    self.monitor_region["left"], self.monitor_region["top"], AllPlanes)
+        if not ok or x_errors:
+            raise RuntimeError(f"XShmGetImage failed (X error codes {x_errors}): "
+                               "is the monitored region still on screen?")
+
+        return self._frame_view
+
+    def get_frame_pil(self) -> Image.Image:
+        return Image.fromarray(self.get_frame_np())
+
+    def get_frame_np(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The frame (crop_size x crop_size x 3) in RGB format. The array is a persistent buffer
+            reused by the next call, copy it if it must be kept.
+        """
+        bgra = self.get_raw_frame()
+
+        if bgra.shape[:2] != (self.crop_size, self.crop_size):
+            bgra = cv2.resize(bgra, (self.crop_size, self.crop_size), dst=self._frame_resized, interpolation=cv2.INTER_CUBIC)
+
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=self._frame_out)
+
+
+def check() -> bool:
+    """Frames identical to mss on a static screen, and an off-screen region raises instead of exiting the process."""
+    with Monitoring_mss(crop_size=224) as mon_mss, Monitoring_xshm(crop_size=224) as mon_xshm:
+        if not np.array_equal(mon_mss.get_frame_np(), mon_xshm.get_frame_np()):
+            print("Error: xshm and mss frames differ on a static screen")
+            return False
+
+    # Region partly off the right edge of the screen (BadMatch): the default Xlib handler would exit the process
+    from mss import mss
+    with mss() as sct:
+        screen_width = sct.monitors[0]["width"]
+    mon = Monitoring_xshm(crop_size=224)
+    mon.monitor_region = dict(mon.monitor_region, left=screen_width - mon.monitor_region["width"] // 2)
+    try:
+        with mon:
+            mon.get_frame_np()
+        print("Error: grabbing a region partly off screen did not raise")
+        return False
+    except RuntimeError as e:
+        print(f"Region partly off screen: {e}")
+
+    print("xshm check passed")
+    return True
+
+
+if __name__ == '__main__':
+    if "--check" in sys.argv[1:]:
+        if not os.environ.get("DISPLAY"):
+            from dbd.utils.xvfb import run_under_xvfb
+            sys.exit(run_under_xvfb("dbd.utils.monitoring_xshm", ["--check"]))
+        sys.exit(0 if check() else 1)
+
+    # Head-to-head benchmark against mss on the current X display (works under Xvfb)
+    from time import perf_counter
+
+    nb_iters = 1000
+    for name, monitoring in [("mss", Monitoring_mss(crop_size=224)), ("xshm", Monitoring_xshm(crop_size=224))]:
+        with monitoring as mon:
+            for _ in range(50):
+                mon.get_frame_np()
+
+            t0 = perf_counter()
+            for _ in range(nb_iters):
+                mon.get_frame_np()
+            dt = (perf_counter() - t0) / nb_iters
+            print(f"{name:>5}: {dt * 1e6:8.1f} us/frame ({1 / dt:.0f} FPS)")
+
+    with Monitoring_mss(crop_size=224) as mon_mss, Monitoring_xshm(crop_size=224) as mon_xshm:
+        same = np.array_equal(mon_mss.get_frame_np(), mon_xshm.get_frame_np())
+        print(f"Identical frames on a static screen: {same}")
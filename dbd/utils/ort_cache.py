@@ -0,0 +1,179 @@
+# ort_cache.py
+# Disk cache of the ONNX Runtime optimized models, for a fast session startup.
+#
+# Creating an InferenceSession parses the model and runs the graph optimizations (constant folding,
+# node fusions, NCHWc layout transformation...) every time, i.e. on every RUN click of the Web UI.
+# The first session saves its optimized graph (SessionOptions.optimized_model_filepath) in the cache,
+# the next ones load it with the graph optimizations disabled.
+#
+# Cache entries are keyed by the model file hash, the ONNX Runtime version, the CPU model, the execution
+# providers and the session options that change the optimized graph: editing/replacing the model, upgrading
+# onnxruntime or changing the optimization level automatically creates a new entry (older ones are removed).
+# Entries are named <model stem>-<model path hash>-<key>.onnx: models of the same name in different folders
+# (e.g. models/model.onnx and another checkout's model.onnx) keep their own entries. Entries of the previous
+# naming (<model stem>-<key>.onnx, no path hash) are removed as well.
+#
+# Usage (time-to-first-inference, without and with the cache):
+#   python -m dbd.utils.ort_cache models/model.onnx
+
+import hashlib
+import os
+import re
+from pathlib import Path
+
+import onnxruntime as ort
+
+from dbd.utils.ort_tuner import cpu_model, file_hash
+
+# Cache folder lives next to the script (project root level)
+_CACHE_DIR = Path(__file__).resolve().parent.parent.parent / "ort_cache"
+
+
+def cache_key(model_path, sess_options: ort.SessionOptions, providers) -> str:
+    # Thread counts and memory options do not change the optimized graph, they are not part of the key
+    key = "|".join([
+        file_hash(model_path),
+        ort.__version__,
+        cpu_model(),
+        ",".join(providers),
+        str(sess_options.graph_optimization_level),
+        str(sess_options.execution_mode),
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _path_hash(model_path) -> str:
+    return hashlib.sha256(str(Path(model_path).resolve()).encode()).hexdigest()[:8]
+
+
+def cached_model_path(model_path, sess_options: ort.SessionOptions, providers) -> Path:
+    stem = Path(model_path).stem
+    return _CACHE_DIR / f"{stem}-{_path_hash(model_path)}-{cache_key(model_path, sess_options, providers)}.onnx"
+
+
+def _remove_stale_entries(cache_path: Path):
+    """Remove the older entries of the same model file (same stem and path hash), and the legacy entries of its stem."""
+    prefix = cache_path.stem.rsplit("-", 1)[0]
+    stem = prefix.rsplit("-", 1)[0]
+    legacy_name = re.compile(re.escape(stem) + r"-[0-9a-f]{16}")
+    for path in _CACHE_DIR.glob(f"{stem}-*.onnx"):
+        if path == cache_path:
+            continue
+        if path.stem.rsplit("-", 1)[0] == prefix or legacy_name.fullmatch(path.stem):
+            path.unlink(missing_ok=True)
+
+
+def create_session(model_path, sess_options: ort.SessionOptions, providers) -> ort.InferenceSession:
+    """
+    ort.InferenceSession with the optimized model cache (CPU provider only: the optimized graphs of the GPU
+    providers depend on the device). On a cache miss, the session optimizes the model and saves it in the cache.
+    """
+    if list(providers) != ["CPUExecutionProvider"]:
+        return ort.InferenceSession(model_path, providers=providers, sess_options=sess_options)
+
+    cache_path = cached_model_path(model_path, sess_options, providers)
+
+    if cache_path.exists():
+        graph_optimization_level = sess_options.graph_optimization_level
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return ort.InferenceSession(str(cache_path), providers=providers, sess_options=sess_options)
+        except Exception as e:
+            print(f"Warning: invalid optimized model in cache ({e}), rebuilding it.")
+            cache_path.unlink(missing_ok=True)
+        finally:
+            sess_options.graph_optimization_level = graph_optimization_level
+
+    try:
+        _CACHE_DIR.mkdir(exist_ok=True)
+    except OSError:
+        return ort.InferenceSession(model_path, providers=providers, sess_options=sess_options)
+
+    # Written under a temporary name then renamed, so that an interrupted save never leaves a truncated entry
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    sess_options.optimized_model_filepath = str(tmp_path)
+    # The hardware-specific optimizations warning does not apply: the CPU model is part of the cache key
+    log_severity_level = sess_options.log_severity_level
+    sess_options.log_severity_level = 3
+    try:
+        session = ort.InferenceSession(model_path, providers=providers, sess_options=sess_options)
+    finally:
+        sess_options.optimized_model_filepath = ""
+        sess_options.log_severity_level = log_severity_level
+
+    try:
+        os.replace(tmp_path, cache_path)
+        _remove_stale_entries(cache_path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+    return session
+
+
+def clear_cache():
+    for path in _CACHE_DIR.glob("*.onnx"):
+        path.unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    import sys
+    import subprocess
+    from time import perf_counter
+
+    import numpy as np
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "models/model.onnx"
+
+    if len(sys.argv) > 2:
+        # Child process: time-to-first-inference of a fresh interpreter (no warm ORT state)
+        use_cache = sys.argv[2] == "cache"
+        t0 = perf_counter()
+        sess_options = ort.SessionOptions()
+        providers = ["CPUExecutionProvider"]
+        if use_cache:
+            session = create_session(model_path, sess_options, providers)
+        else:
+            session = ort.InferenceSession(model_path, providers=providers, sess_options=sess_options)
+        t1 = perf_counter()
+        model_input = session.get_inputs()[0]
+        shape = [d if isinstance(d, int) else 1 for d in model_input.shape]
+        dtype = np.uint8 if model_input.type == "tensor(uint8)" else np.float32
+        session.run(None, {model_input.name: np.zeros(shape, dtype=dtype)})
+        t2 = perf_counter()
+        print(f"{(t1 - t0) * 1000:.1f} {(t2 - t0) * 1000:.1f}")
+        sys.exit(0)
+
+    def measure(mode, nb_runs=5):
+        runs = [subprocess.run([sys.executable, "-m", "dbd.utils.ort_cache", model_path, mode],
+                               capture_output=True, text=True, check=True).stdout.split() for _ in range(nb_runs)]
+        load, first = np.median(np.array(runs, dtype=np.float64), axis=0)
+        return load, first
+
+    clear_cache()
+    print(f"Time-to-first-inference of {model_path} (median of 5 processes, session creation + first run):")
+    load, first = measure("nocache")
+    print(f"  no cache      : session {load:6.1f} ms | first inference {first:6.1f} ms")
+    load, first = measure("cache", nb_runs=1)
+    print(f"  cache miss    : session {load:6.1f} ms | first inference {first:6.1f} ms (optimizes and saves)")
+    load, first = measure("cache")
+    print(f"  cache hit     : session {load:6.1f} ms | first inference {first:6.1f} ms")
+
+    # Same process, e.g. a new AI_model on each RUN click of the Web UI
+    def reload(use_cache, nb_runs=10):
+        times = []
+        for _ in range(nb_runs):
+            t0 = perf_counter()
+            if use_cache:
+                session = create_session(model_path, ort.SessionOptions(), ["CPUExecutionProvider"])
+            else:
+                session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+            model_input = session.get_inputs()[0]
+            shape = [d if isinstance(d, int) else 1 for d in model_input.shape]
+            dtype = np.uint8 if model_input.type == "tensor(uint8)" else np.float32
+            session.run(None, {model_input.name: np.zeros(shape, dtype=dtype)})
+            times.append(perf_counter() - t0)
+        return np.median(times) * 1000
+
+    print("Reload in the same process (median of 10):")
+    print(f"  no cache      : first inference {reload(False):6.1f} ms")
+    print(f"  cache hit     : first inference {reload(True):6.1f} ms")
@@ -0,0 +1,268 @@
+# ort_tuner.py
+# Auto-tuning of the ONNX Runtime CPU session options.
+#
+# The fastest session configuration depends on the machine (core count, SMT, caches)
+# and on the model. The tuner sweeps a grid of session options with the actual model,
+# measures the p50/p99 inference latency of each configuration, and saves the winner
+# (ort_tuning.json) per (model hash, CPU model). AI_model applies it automatically.
+#
+# Usage:
+#   python -m dbd.utils.ort_tuner models/model.onnx [--exhaustive]
+
+import hashlib
+import itertools
+import json
+import os
+import platform
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+import numpy as np
+import onnxruntime as ort
+
+# Tuning file lives next to the script (project root level)
+_TUNING_PATH = Path(__file__).resolve().parent.parent.parent / "ort_tuning.json"
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+# Starting point of the staged search: the 4 threads of the "Normal" CPU workload of the UIs (onnxruntime itself
+# defaults to 0 = all cores), a single inter-op thread, the other options at their onnxruntime defaults
+DEFAULT_CONFIG = {
+    "intra_op_num_threads": 4,
+    "inter_op_num_threads": 1,
+    "graph_optimization_level": "all",
+    "execution_mode": "sequential",
+    "allow_spinning": True,
+    "enable_cpu_mem_arena": True,
+    "enable_mem_pattern": True,
+}
+
+
+_file_hashes = {}  # (path, size, mtime) -> digest, the model is hashed once per process
+
+
+def file_hash(path) -> str:
+    """Short sha256 digest of a file content."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _file_hashes:
+        return _file_hashes[memo_key]
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    _file_hashes[memo_key] = sha.hexdigest()[:16]
+    return _file_hashes[memo_key]
+
+
+def cpu_model() -> str:
+    """CPU model name and logical core count, e.g. 'AMD Ryzen 7 5800X (16 threads)'."""
+    name = None
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    name = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+
+    name = name or platform.processor() or platform.machine() or "unknown CPU"
+    return f"{name} ({os.cpu_count()} threads)"
+
+
+def _tuning_key(model_path) -> str:
+    return f"{file_hash(model_path)}|{cpu_model()}"
+
+
+def apply_session_config(sess_options: ort.SessionOptions, config: dict):
+    """Apply a tuned configuration (see DEFAULT_CONFIG keys) to ONNX Runtime session options."""
+    sess_options.intra_op_num_threads = config["intra_op_num_threads"]
+    sess_options.inter_op_num_threads = config["inter_op_num_threads"]
+    sess_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[config["graph_optimization_level"]]
+    sess_options.execution_mode = EXECUTION_MODES[config["execution_mode"]]
+    sess_options.enable_cpu_mem_arena = config["enable_cpu_mem_arena"]
+    sess_options.enable_mem_pattern = config["enable_mem_pattern"]
+
+    spinning = "1" if config["allow_spinning"] else "0"
+    sess_options.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    sess_options.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+
+
+def load_tuning(model_path) -> Optional[dict]:
+    """Return the saved configuration of this model on this CPU, or None if it was never tuned."""
+    if not _TUNING_PATH.exists():
+        return None
+
+    try:
+        with open(_TUNING_PATH, "r") as f:
+            tunings = json.load(f)
+        return tunings[_tuning_key(model_path)]["config"]
+    except (json.JSONDecodeError, IOError, KeyError):
+        return None
+
+
+def save_tuning(model_path, config: dict, p50: float, p99: float):
+    tunings = {}
+    if _TUNING_PATH.exists():
+        try:
+            with open(_TUNING_PATH, "r") as f:
+                tunings = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            pass
+
+    tunings[_tuning_key(model_path)] = {
+        "model": os.path.basename(model_path),
+        "onnxruntime": ort.__version__,
+        "p50_ms": round(p50 * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3),
+        "config": config,
+    }
+
+    with open(_TUNING_PATH, "w") as f:
+        json.dump(tunings, f, indent=2)
+
+
+def benchmark_config(model_path, config: dict, nb_warmup=20, nb_iter=200):
+    """
+    Measure the inference latency of the model with a session configuration.
+    Returns:
+        (p50, p99) latency in seconds
+    """
+    sess_options = ort.SessionOptions()
+    apply_session_config(sess_options, config)
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"], sess_options=sess_options)
+
+    model_input = session.get_inputs()[0]
+    shape = [d if isinstance(d, int) else 1 for d in model_input.shape]
+    if model_input.type == "tensor(uint8)":
+        x = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    else:
+        x = np.random.default_rng(0).standard_normal(shape).astype(np.float32)
+    inputs = {model_input.name: x}
+
+    for _ in range(nb_warmup):
+        session.run(None, inputs)
+
+    latencies = np.empty(nb_iter, dtype=np.float64)
+    for i in range(nb_iter):
+        t0 = perf_counter()
+        session.run(None, inputs)
+        latencies[i] = perf_counter() - t0
+
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def _score(p50, p99):
+    # Mostly the typical latency, with a penalty on the tail (late frames miss great skill checks)
+    return p50 + 0.25 * p99
+
+
+def _thread_counts(max_threads):
+    counts = [1, 2, 4, 6, 8, 12, 16]
+    return [n for n in counts if n <= max_threads] or [1]
+
+
+def candidate_grid(max_threads=None, exhaustive=False):
+    """
+    Session configurations to benchmark. The exhaustive grid is the product of all options,
+    the default staged search is built in tune() from the best result of each stage.
+    """
+    max_threads = max_threads or os.cpu_count() or 1
+    grid = {
+        "intra_op_num_threads": _thread_counts(max_threads),
+        "inter_op_num_threads": [1, 2] if max_threads > 1 else [1],
+        "graph_optimization_level": list(GRAPH_OPTIMIZATION_LEVELS),
+        "execution_mode": list(EXECUTION_MODES),
+        "allow_spinning": [True, False],
+        "enable_cpu_mem_arena": [True, False],
+        "enable_mem_pattern": [True, False],
+    }
+
+    if exhaustive:
+        keys = list(grid)
+        return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+    return grid
+
+
+def tune(model_path, max_threads=None, exhaustive=False, nb_warmup=20, nb_iter=200, save=True, verbose=True):
+    """
+    Sweep session options on this machine and return the fastest configuration (saved to ort_tuning.json).
+
+    The default staged search tunes the thread counts and spin-wait first, then the graph optimization level,
+    the execution mode and the memory arena/pattern options one group at a time with the best configuration
+    so far. exhaustive=True benchmarks the full grid (several minutes).
+    """
+    results = []
+    max_threads = max_threads or os.cpu_count() or 1
+
+    # Baseline: the starting point of the staged search (DEFAULT_CONFIG)
+    baseline = dict(DEFAULT_CONFIG, intra_op_num_threads=min(DEFAULT_CONFIG["intra_op_num_threads"], max_threads))
+
+    def run(config):
+        p50, p99 = benchmark_config(model_path, config, nb_warmup, nb_iter)
+        results.append((_score(p50, p99), p50, p99, config))
+        if verbose:
+            print(f"p50 {p50 * 1000:7.3f} ms | p99 {p99 * 1000:7.3f} ms | {config}")
+        return _score(p50, p99)
+
+    run(baseline)
+    baseline_result = results[0]
+
+    if exhaustive:
+        for config in candidate_grid(max_threads, exhaustive=True):
+            run(config)
+    else:
+        grid = candidate_grid(max_threads)
+        best = baseline
+        stages = [
+            ("intra_op_num_threads", "allow_spinning"),
+            ("graph_optimization_level",),
+            ("execution_mode", "inter_op_num_threads"),
+            ("enable_cpu_mem_arena", "enable_mem_pattern"),
+        ]
+        for keys in stages:
+            stage = [dict(best, **dict(zip(keys, values))) for values in itertools.product(*(grid[k] for k in keys))]
+            # Inter-op threads only matter in parallel execution mode
+            stage = [c for c in stage if c["execution_mode"] == "parallel" or c["inter_op_num_threads"] == 1]
+            scores = [run(config) for config in stage]
+            best = stage[int(np.argmin(scores))]
+
+    score, p50, p99, config = min(results, key=lambda r: r[0])
+    if verbose:
+        print(f"\nBest configuration on {cpu_model()}: p50 {p50 * 1000:.3f} ms, p99 {p99 * 1000:.3f} ms")
+        print(f"  {config}")
+        print(f"Baseline ({baseline['intra_op_num_threads']} threads, starting point of the search): "
+              f"p50 {baseline_result[1] * 1000:.3f} ms, p99 {baseline_result[2] * 1000:.3f} ms")
+
+    if save:
+        save_tuning(model_path, config, p50, p99)
+        if verbose:
+            print(f"Saved to {_TUNING_PATH}")
+
+    return config
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Auto-tune the ONNX Runtime CPU session options for a model")
+    parser.add_argument("model_path", nargs="?", default="models/model.onnx")
+    parser.add_argument("--exhaustive", action="store_true", help="benchmark the full grid instead of the staged search")
+    parser.add_argument("--max-threads", type=int, default=None, help="maximum number of threads (default: all)")
+    parser.add_argument("--iterations", type=int, default=200, help="timed inferences per configuration")
+    args = parser.parse_args()
+
+    tune(args.model_path, max_threads=args.max_threads, exhaustive=args.exhaustive, nb_iter=args.iterations)
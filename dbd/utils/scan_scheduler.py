@@ -0,0 +1,113 @@
+# scan_scheduler.py
+# Two-tier adaptive scan rate for the monitoring loops.
+#
+# While nothing but class 0 ("None") has been seen recently, the loop runs in a
+# low-rate "patrol" tier (e.g. 20 Hz). As soon as a skill check shows up (non-None
+# class, or rising non-None probability), the scheduler switches instantly to the
+# full rate tier, and falls back to patrol after a quiet period. Skill checks have a
+# visible wind-up before the cursor reaches the great area, so patrol does not miss hits.
+
+from time import perf_counter, sleep
+from typing import Optional
+
+PATROL = "patrol"
+FULL = "full"
+
+
+class AdaptiveScanRate:
+    """Throttle the monitoring loop to a patrol rate while no skill check is visible.
+
+    Usage:
+        scheduler = AdaptiveScanRate()
+        while running:
+            scheduler.wait()
+            frame = ai_model.grab_screenshot()
+            prediction = ai_model.predict(frame)
+            scheduler.update(prediction.pred, prediction.none_probability)
+    """
+
+    def __init__(self, patrol_hz: float = 20.0, quiet_period: float = 1.0,
+                 probability_threshold: float = 0.1, probability_rise: float = 0.05):
+        """
+        Args:
+            patrol_hz: scan rate of the patrol tier
+            quiet_period: seconds without any non-None sign before falling back to the patrol tier
+            probability_threshold: non-None probability (1 - P(None)) switching to full rate
+            probability_rise: increase of the non-None probability between two frames switching to full rate
+        """
+        self.patrol_period = 1.0 / patrol_hz
+        self.quiet_period = quiet_period
+        self.probability_threshold = probability_threshold
+        self.probability_rise = probability_rise
+
+        self.tier = PATROL
+        self._last_grab: Optional[float] = None
+        self._last_active: float = 0.0
+        self._prev_non_none = 0.0
+
+        # Statistics
+        self._t_tier = perf_counter()
+        self.time_in_tier = {PATROL: 0.0, FULL: 0.0}
+        self.nb_switches = {PATROL: 0, FULL: 0}  # switches to each tier
+        self.switch_latencies: list[float] = []  # patrol -> full: seconds from the triggering frame grab to the switch
+
+    def wait(self):
+        """Sleep as needed before grabbing the next frame (patrol tier only), then timestamp the grab."""
+        now = perf_counter()
+        if self.tier == PATROL and self._last_grab is not None:
+            delay = self._last_grab + self.patrol_period - now
+            if delay > 0:
+                sleep(delay)
+                now = perf_counter()
+        self._last_grab = now
+
+    def update(self, pred: int, none_probability: Optional[float] = None):
+        """Update the tier with the prediction of the last grabbed frame.
+
+        Args:
+            pred: predicted class index (0 is "None")
+            none_probability: optional probability of class 0 ("None"), used to detect a rising non-None probability
+        """
+        now = perf_counter()
+        non_none = 1.0 - none_probability if none_probability is not None else float(pred != 0)
+        active = (pred != 0 or non_none >= self.probability_threshold or
+                  non_none - self._prev_non_none >= self.probability_rise)
+        self._prev_non_none = non_none
+
+        if active:
+            self._last_active = now
+            if self.tier == PATROL:
+                self._switch(FULL, now)
+                if self._last_grab is not None:
+                    self.switch_latencies.append(now - self._last_grab)
+        elif self.tier == FULL and now - self._last_active >= self.quiet_period:
+            self._switch(PATROL, now)
+
+    def _switch(self, tier, now):
+        self.time_in_tier[self.tier] += now - self._t_tier
+        self._t_tier = now
+        self.tier = tier
+        self.nb_switches[tier] += 1
+
+    def get_stats(self) -> dict:
+        """Time spent in each tier and patrol -> full switch latencies (seconds)."""
+        time_in_tier = dict(self.time_in_tier)
+        time_in_tier[self.tier] += perf_counter() - self._t_tier
+        total = sum(time_in_tier.values()) or 1e-9
+        latencies = sorted(self.switch_latencies)
+
+        return {
+            "tier": self.tier,
+            "time_patrol": time_in_tier[PATROL],
+            "time_full": time_in_tier[FULL],
+            "patrol_ratio": time_in_tier[PATROL] / total,
+            "switches_to_full": self.nb_switches[FULL],
+            "switches_to_patrol": self.nb_switches[PATROL],
+            "switch_latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "switch_latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+    def __repr__(self):
+        stats = self.get_stats()
+        return (f"AdaptiveScanRate(tier={self.tier}, patrol={stats['patrol_ratio']:.0%}, "
+                f"switches={stats['switches_to_full']}, latency_mean={stats['switch_latency_mean'] * 1000:.1f}ms)")
@@ -0,0 +1,156 @@
+# stage_timer.py
+# Per-stage latency histograms of the monitoring loops.
+#
+# Each stage of an iteration (capture, preprocess, inference, ...) is timed with perf_counter_ns
+# and recorded in a fixed-bucket histogram (log-spaced buckets from 1 us to 10 s, ~6% wide): recording
+# a sample is a bisect and a counter increment, with constant memory for sessions of any length.
+# Percentiles are read from the buckets, which tells whether a machine is capture-bound or inference-bound.
+
+import json
+import math
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+# Stages of the monitoring loops, in iteration order
+CAPTURE = "capture"
+PRESENCE = "presence"  # cascade stage 1, when a presence model is used
+PREPROCESS = "preprocess"
+INFERENCE = "inference"
+POSTPROCESS = "postprocess"
+DECISION = "decision"
+KEY_DISPATCH = "key dispatch"
+SLEEP = "sleep"
+STAGES = (CAPTURE, PRESENCE, PREPROCESS, INFERENCE, POSTPROCESS, DECISION, KEY_DISPATCH, SLEEP)
+
+# Stage latency reports are saved in the logs folder (project root level)
+_LOG_DIR = Path(__file__).resolve().parent.parent.parent / "logs"
+
+# Histogram buckets: 40 per decade from 1 us to 10 s
+_BUCKETS_PER_DECADE = 40
+_MIN_NS = 1_000
+_MAX_NS = 10_000_000_000
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets of durations in nanoseconds."""
+
+    # Upper edge of each bucket, shared by all histograms
+    EDGES = [int(_MIN_NS * 10 ** (i / _BUCKETS_PER_DECADE))
+             for i in range(round(math.log10(_MAX_NS / _MIN_NS) * _BUCKETS_PER_DECADE) + 1)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.EDGES) + 1)  # last bucket: above _MAX_NS
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+
+    def record(self, duration_ns: int):
+        self.counts[bisect_right(self.EDGES, duration_ns)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        if self.min_ns is None or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+
+    def percentile(self, q: float) -> float:
+        """Approximate q-th percentile (0-100) in nanoseconds: geometric middle of the bucket, within [min, max]."""
+        if self.count == 0:
+            return 0.0
+
+        rank = q / 100 * self.count
+        cumulative = 0
+        for i, c in enumerate(self.counts):
+            cumulative += c
+            if c and cumulative >= rank:
+                low = self.EDGES[i - 1] if i > 0 else 0
+                high = self.EDGES[i] if i < len(self.EDGES) else self.max_ns
+                value = math.sqrt(max(low, 1) * high)
+                return float(min(max(value, self.min_ns), self.max_ns))
+
+        return float(self.max_ns)
+
+    def summary(self) -> dict:
+        """count, mean, p50, p95, p99 and max, durations in milliseconds."""
+        return {
+            "count": self.count,
+            "mean": self.total_ns / self.count / 1e6 if self.count else 0.0,
+            "p50": self.percentile(50) / 1e6,
+            "p95": self.percentile(95) / 1e6,
+            "p99": self.percentile(99) / 1e6,
+            "max": self.max_ns / 1e6,
+        }
+
+
+class StageTimer:
+    """Latency histograms of the stages of the monitoring loop.
+
+    Usage:
+        timer = StageTimer()
+        t0 = perf_counter_ns()
+        frame = ai_model.grab_screenshot()
+        timer.record(CAPTURE, perf_counter_ns() - t0)
+        ...
+        print(timer.format_table())
+        timer.dump_json()
+
+    Thread-safe: the pipelined loops record from their capture and inference threads while the UI reads summaries.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration_ns: int):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(duration_ns)
+
+    def summary(self) -> dict:
+        """{stage: {count, mean, p50, p95, p99, max}} (ms) of the recorded stages, in iteration order."""
+        with self._lock:
+            recorded = list(self.histograms)
+            stages = [s for s in STAGES if s in recorded] + [s for s in recorded if s not in STAGES]
+            return {stage: self.histograms[stage].summary() for stage in stages}
+
+    def rows(self) -> list:
+        """[stage, p50, p95, p99, max, count] rows for the UIs, durations in ms rounded to 0.01."""
+        return [[stage, round(s["p50"], 2), round(s["p95"], 2), round(s["p99"], 2), round(s["max"], 2), s["count"]]
+                for stage, s in self.summary().items()]
+
+    def format_table(self) -> str:
+        lines = [f"{'stage':<14} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'count':>9}  (ms)"]
+        for stage, p50, p95, p99, max_ms, count in self.rows():
+            lines.append(f"{stage:<14} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} {max_ms:>9.2f} {count:>9}")
+        return "\n".join(lines)
+
+    def dump_json(self, path: Optional[str] = None, metadata: Optional[dict] = None) -> Path:
+        """
+        Save the stage summaries and the raw histograms (bucket upper edges in ns and counts).
+        Returns:
+            path of the JSON file (default: logs/stage_latency_<session start>.json)
+        """
+        if path is None:
+            _LOG_DIR.mkdir(exist_ok=True)
+            path = _LOG_DIR / f"stage_latency_{self.started.strftime('%Y%m%d_%H%M%S')}.json"
+
+        with self._lock:
+            histograms = {stage: list(h.counts) for stage, h in self.histograms.items()}
+        data = {
+            "started": self.started.isoformat(timespec="seconds"),
+            "ended": datetime.now().isoformat(timespec="seconds"),
+            "metadata": metadata or {},
+            "stages": self.summary(),
+            "bucket_edges_ns": LatencyHistogram.EDGES,
+            "histograms": histograms,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+        return Path(path)
@@ -0,0 +1,190 @@
+# trace_profiler.py
+# Profiling mode of tui.py and app.py (--profile): one Chrome/Perfetto trace of the monitoring session.
+#
+# The trace merges:
+#   - the ONNX Runtime profile of the classifier session (session initialization, every run and every operator kernel),
+#   - the stage spans of the monitoring loop (capture, preprocess, inference, decision, key dispatch, sleep...),
+#     recorded by TracingStageTimer on each Python thread (main loop, pipeline threads).
+# and a per-operator time summary, by operator type and by part of the MobileNetV3 graph (stem, inverted residual
+# blocks, squeeze-excitation, classifier...), to tell what dominates the inference on a given CPU.
+# Open the trace in https://ui.perfetto.dev or chrome://tracing.
+# The ONNX Runtime profile covers the first InferenceEngine.PROFILE_MAX_RUNS runs of the session, the stage spans the
+# last max_spans stages.
+#
+# ONNX Runtime fuses the activations in the convolutions (Conv + HardSwish/ReLU run as one Conv kernel) and converts
+# the layout to NCHWc (ReorderInput/ReorderOutput kernels): the summary reports the kernels that actually run.
+
+import json
+import os
+import re
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter_ns, time_ns
+from typing import Optional
+
+from dbd.utils.stage_timer import StageTimer
+
+# Traces are saved in the logs folder (project root level)
+_LOG_DIR = Path(__file__).resolve().parent.parent.parent / "logs"
+
+# Parts of the MobileNetV3 graph, from the node names of the exported model (torchvision module paths)
+_GRAPH_PARTS = [
+    ("classifier", re.compile(r"^/model/(classifier|avgpool|Flatten)")),
+    ("squeeze-excitation", re.compile(r"/block\.\d+/(avgpool|fc1|fc2|activation|scale_activation|Mul)")),
+    ("stem", re.compile(r"^/model/features/features\.0/")),
+    ("inverted residual blocks", re.compile(r"/block/")),
+    ("last conv", re.compile(r"^/model/features/features\.\d+/")),
+    ("layout reorder (NCHWc)", re.compile(r"^Reorder")),
+]
+
+
+class TracingStageTimer(StageTimer):
+    """StageTimer that also keeps the span (start, duration, thread) of every recorded stage, for the trace."""
+
+    def __init__(self, max_spans=1_000_000):
+        super().__init__()
+        self.spans = deque(maxlen=max_spans)  # (stage, start perf_counter_ns, duration ns, thread id, thread name)
+
+    def record(self, stage: str, duration_ns: int):
+        super().record(stage, duration_ns)
+        # Stages are recorded when they end
+        thread = threading.current_thread()
+        self.spans.append((stage, perf_counter_ns() - duration_ns, duration_ns, threading.get_native_id(), thread.name))
+
+
+def graph_part(node_name: str) -> str:
+    for part, pattern in _GRAPH_PARTS:
+        if pattern.search(node_name):
+            return part
+    return "other"
+
+
+def operator_summary(ort_events: list) -> dict:
+    """
+    Time spent in the operator kernels of the ONNX Runtime profile.
+    Returns:
+        {"runs", "by_operator", "by_part", "top_nodes"}, times in ms, per-run means and share of the kernel time
+    """
+    nb_runs = sum(1 for e in ort_events if e.get("name") == "model_run") or 1
+    by_operator = defaultdict(lambda: [0, 0])  # op type -> [total us, kernel calls]
+    by_part = defaultdict(lambda: [0, 0])
+    by_node = defaultdict(lambda: [0, 0])
+    for e in ort_events:
+        if e.get("cat") != "Node" or not e.get("name", "").endswith("_kernel_time"):
+            continue
+        node = e["name"][:-len("_kernel_time")]
+        for key, table in ((e.get("args", {}).get("op_name", "?"), by_operator), (graph_part(node), by_part),
+                           (node, by_node)):
+            table[key][0] += e["dur"]
+            table[key][1] += 1
+
+    total_us = sum(t for t, _ in by_operator.values()) or 1
+
+    def rows(table, limit=None):
+        items = sorted(table.items(), key=lambda item: -item[1][0])[:limit]
+        return [{"name": name, "ms_per_run": t / nb_runs / 1000, "share": t / total_us, "kernels_per_run": n / nb_runs}
+                for name, (t, n) in items]
+
+    return {
+        "runs": nb_runs,
+        "kernel_ms_per_run": total_us / nb_runs / 1000,
+        "by_operator": rows(by_operator),
+        "by_part": rows(by_part),
+        "top_nodes": rows(by_node, limit=10),
+    }
+
+
+def format_summary(summary: dict) -> str:
+    lines = [f"Operator time over {summary['runs']} runs ({summary['kernel_ms_per_run']:.3f} ms of kernels per run):"]
+    for title in ("by_part", "by_operator", "top_nodes"):
+        lines.append(f"  {title.replace('_', ' ')}:")
+        for row in summary[title]:
+            lines.append(f"    {row['name'][-60:]:<60} {row['ms_per_run']:8.3f} ms {row['share']:7.1%}")
+    return "\n".join(lines)
+
+
+def build_trace(ort_events: list, ort_start_ns: int, spans, metadata: Optional[dict] = None) -> dict:
+    """
+    Merge the ONNX Runtime profile events (timestamps in us since ort_start_ns, ns since the epoch) and the stage spans
+    (perf_counter_ns) in a Chrome trace (JSON object format), on the ONNX Runtime time base.
+    """
+    # perf_counter and the epoch clock are aligned once, at export time
+    clock_offset_ns = time_ns() - perf_counter_ns()
+    pid = os.getpid()
+    loop_pid = pid + 1  # stage spans in their own process row, above the ONNX Runtime events
+
+    events = [
+        {"ph": "M", "name": "process_name", "pid": pid, "tid": 0, "args": {"name": "ONNX Runtime (classifier)"}},
+        {"ph": "M", "name": "process_name", "pid": loop_pid, "tid": 0, "args": {"name": "Monitoring loop stages"}},
+    ]
+    for e in ort_events:
+        e = dict(e)
+        e["pid"] = pid
+        events.append(e)
+
+    thread_names = {}
+    for stage, start_ns, duration_ns, tid, thread_name in spans:
+        thread_names[tid] = thread_name
+        events.append({"ph": "X", "cat": "stage", "name": stage, "pid": loop_pid, "tid": tid,
+                       "ts": (start_ns + clock_offset_ns - ort_start_ns) / 1000, "dur": duration_ns / 1000})
+    for tid, thread_name in thread_names.items():
+        events.append({"ph": "M", "name": "thread_name", "pid": loop_pid, "tid": tid, "args": {"name": thread_name}})
+
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {"metadata": metadata or {}, "operator_summary": operator_summary(ort_events)},
+    }
+
+
+def export_trace(ai_model, stage_timer: Optional[StageTimer] = None, path=None, metadata: Optional[dict] = None):
+    """
+    End the profiling of the AI model and save the merged trace.
+    Returns:
+        (trace path, operator summary), or None if the AI model was not profiled (e.g. TensorRT engine)
+    """
+    profile = ai_model.end_profiling()
+    if profile is None:
+        return None
+
+    ort_profile_path, ort_start_ns = profile
+    # Loaded at once: its size is bounded by InferenceEngine.PROFILE_MAX_RUNS
+    with open(ort_profile_path, "r") as f:
+        ort_events = json.load(f)
+
+    spans = list(getattr(stage_timer, "spans", []))
+    trace = build_trace(ort_events, ort_start_ns, spans, metadata)
+
+    if path is None:
+        _LOG_DIR.mkdir(exist_ok=True)
+        path = _LOG_DIR / f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(path, "w") as f:
+        json.dump(trace, f)
+    os.remove(ort_profile_path)  # merged in the trace
+
+    return Path(path), trace["otherData"]["operator_summary"]
+
+
+if __name__ == '__main__':
+    # Profile a few inferences (no screen capture) and print the operator summary:
+    #   python -m dbd.utils.trace_profiler [model_path] [nb_runs]
+    import sys
+
+    import numpy as np
+
+    from dbd.inference_engine import InferenceEngine
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "models/model.onnx"
+    nb_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    model = InferenceEngine(model_path, profile=True)
+    model.stage_timer = TracingStageTimer()
+    frame = np.random.default_rng(0).integers(0, 256, (224, 224, 3), dtype=np.uint8)
+    for _ in range(nb_runs):
+        model.predict(frame)
+
+    trace_path, summary = export_trace(model, model.stage_timer, metadata={"model": os.path.basename(model_path)})
+    print(format_summary(summary))
+    print(f"Trace saved to {trace_path}")
@@ -0,0 +1,64 @@
+# xvfb.py
+# Virtual X server (Xvfb) for the checks of the X11 capture backends (monitoring_xshm, monitoring_xdamage)
+# on headless machines.
+#
+# run_under_xvfb re-runs a module in a child process whose DISPLAY is a fresh Xvfb server: the X11 backends detect
+# the display when they are imported, so the check cannot switch displays in the current process.
+
+import os
+import select
+import shutil
+import subprocess
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def xvfb_available() -> bool:
+    return sys.platform.startswith("linux") and shutil.which("Xvfb") is not None
+
+
+@contextmanager
+def xvfb_display(width=1920, height=1080, timeout=10.0):
+    """
+    Start an Xvfb server (MIT-SHM and DAMAGE are enabled by default) on a free display number.
+    Yields:
+        display name, e.g. ":99"
+    """
+    # Xvfb picks a free display number and writes it to the -displayfd pipe once it accepts connections
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(["Xvfb", "-displayfd", str(write_fd), "-screen", "0", f"{width}x{height}x24",
+                                "-nolisten", "tcp"], pass_fds=(write_fd,),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    try:
+        with os.fdopen(read_fd) as f:
+            if not select.select([f], [], [], timeout)[0]:
+                raise RuntimeError(f"Xvfb did not start within {timeout:.0f} seconds")
+            number = f.readline().strip()
+        if not number:
+            raise RuntimeError(f"Xvfb failed to start (exit code {process.poll()})")
+        yield f":{number}"
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_under_xvfb(module, args=()) -> int:
+    """
+    Run `python -m module args` with DISPLAY set to a fresh Xvfb server.
+    Returns:
+        exit code of the module, 0 if Xvfb is not installed (check skipped)
+    """
+    if not xvfb_available():
+        print(f"Skipped: Xvfb is not installed, {module} needs an X display.")
+        return 0
+
+    with xvfb_display() as display:
+        env = dict(os.environ, DISPLAY=display)
+        return subprocess.run([sys.executable, "-m", module, *args], cwd=_ROOT_DIR, env=env).returncode
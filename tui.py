@@ -13,7 +13,7 @@ import threading
 import argparse
 import logging
 from datetime import datetime
-from time import time, sleep
+from time import time, sleep, perf_counter_ns
 from pathlib import Path
 from rich.console import Console
 from rich.panel import Panel
@@ -24,8 +24,13 @@ from rich import box
 
 from dbd.AI_model import AI_model
 from dbd.utils.directkeys import PressKey, ReleaseKey, SPACE, SHIFT, ACTIVE_INPUT_MODE
+from dbd.utils.frame_gate import FrameGate
+from dbd.utils.frame_pipeline import FramePipeline, format_stats
 from dbd.utils.humanizer import Humanizer
 from dbd.utils.monitoring_mss import Monitoring_mss
+from dbd.utils.scan_scheduler import AdaptiveScanRate
+from dbd.utils.stage_timer import CAPTURE, DECISION, KEY_DISPATCH, SLEEP, StageTimer
+from dbd.utils.trace_profiler import TracingStageTimer, export_trace, format_summary
 
 # Optional imports
 try:
@@ -41,6 +46,24 @@ except ImportError:
     v4l2_ok = False
     V4L2_AVAILABLE = False
 
+try:
+    from dbd.utils.monitoring_xshm import Monitoring_xshm, XSHM_AVAILABLE
+    xshm_ok = XSHM_AVAILABLE
+except ImportError:
+    xshm_ok = False
+
+try:
+    from dbd.utils.monitoring_xdamage import Monitoring_xdamage, XDAMAGE_AVAILABLE, format_stats as format_xdamage_stats
+    xdamage_ok = XDAMAGE_AVAILABLE
+except ImportError:
+    xdamage_ok = False
+
+try:
+    from dbd.utils.monitoring_replay import Monitoring_replay, REPLAY_AVAILABLE
+    replay_ok = REPLAY_AVAILABLE
+except ImportError:
+    replay_ok = False
+
 
 console = Console()
 
@@ -185,7 +208,7 @@ class DBDAutoSkillCheck:
         self.running = False
         self.fps = 0.0
         self.last_hit_desc = ""
-        self.last_probs = {}
+        self.last_prediction = None  # probabilities computed lazily, on display refresh
         self.total_hits = 0
         self.session_start = None
         self.lock = threading.Lock()
@@ -203,6 +226,14 @@ class DBDAutoSkillCheck:
         self.cpu_threads = 4
         self.humanizer = Humanizer()
         self.use_hesitation = True  # Default: active for realism
+        self.use_frame_gate = False  # Reuse last prediction on unchanged frames (opt-in, see FrameGate)
+        self.frame_gate = None
+        self.use_adaptive_scan = True  # Patrol rate while no skill check is visible
+        self.scan_scheduler = None
+        self.use_pipeline = False  # Capture and inference on their own threads
+        self.pipeline = None
+        self.stage_timer = None  # per-stage latency histograms of the monitoring loop
+        self.profile = False  # ONNX Runtime profiling and stage spans, merged in a trace (--profile)
 
         # On Wayland, trigger input consent dialog early
         self._consent_thread = None
@@ -240,7 +271,7 @@ class DBDAutoSkillCheck:
             return []
         return [(f, os.path.join(models_folder, f))
                 for f in os.listdir(models_folder)
-                if f.endswith(".onnx") or f.endswith(".trt")]
+                if (f.endswith(".onnx") or f.endswith(".trt")) and not f.endswith("_presence.onnx")]
 
     def get_monitoring_choices(self):
         choices = ["mss"]
@@ -248,12 +279,22 @@ class DBDAutoSkillCheck:
             choices.insert(0, "bettercam")
         if v4l2_ok:
             choices.append("v4l2 (OBS VirtualCam)")
+        if xshm_ok and not self.platform_info["is_wayland"] and not self.platform_info["is_windows"]:
+            choices.append("xshm")
+        if xdamage_ok and not self.platform_info["is_wayland"] and not self.platform_info["is_windows"]:
+            choices.append("xdamage")
+        if replay_ok:
+            choices.append("replay")
         return choices
 
     def get_monitor_list(self, monitoring_type):
         try:
             if monitoring_type.startswith("v4l2") and v4l2_ok:
                 return Monitoring_v4l2.get_monitors_info()
+            elif monitoring_type == "replay" and replay_ok:
+                return Monitoring_replay.get_monitors_info()
+            elif monitoring_type in ("xshm", "xdamage") and xshm_ok:
+                return Monitoring_xshm.get_monitors_info()
             elif monitoring_type == "bettercam" and bettercam_ok:
                 return Monitoring_bettercam.get_monitors_info()
             else:
@@ -282,6 +323,12 @@ class DBDAutoSkillCheck:
             self.cpu_threads = config["cpu_threads"]
         if "use_hesitation" in config:
             self.use_hesitation = config["use_hesitation"]
+        if "use_frame_gate" in config:
+            self.use_frame_gate = config["use_frame_gate"]
+        if "use_adaptive_scan" in config:
+            self.use_adaptive_scan = config["use_adaptive_scan"]
+        if "use_pipeline" in config:
+            self.use_pipeline = config["use_pipeline"]
         if "model_index" in config:
             models = self.get_available_models()
             idx = config["model_index"]
@@ -342,6 +389,12 @@ class DBDAutoSkillCheck:
                 extra = " [dim](Windows - high performance)[/dim]"
             elif method == "mss":
                 extra = " [dim](cross-platform, X11 only on Linux)[/dim]"
+            elif method == "xshm":
+                extra = " [dim](Linux X11 - native shared memory capture)[/dim]"
+            elif method == "xdamage":
+                extra = " [dim](Linux X11 - grabs only on repaint, low idle CPU)[/dim]"
+            elif method == "replay":
+                extra = " [dim](recorded session from replays/, testing)[/dim]"
             console.print(f"  [dim]{i}.[/dim] {method}{extra}{is_default}")
 
         mon_choice = IntPrompt.ask("[yellow]Select method[/yellow]", default=default_idx)
@@ -395,6 +448,28 @@ class DBDAutoSkillCheck:
         status = "Active" if self.use_hesitation else "Disabled"
         console.print(f"[green]> Hesitation: {status}[/green]\n")
 
+        # --- Frame Gate ---
+        console.print("[bold cyan]Skip Unchanged Frames:[/bold cyan]")
+        console.print("[dim]Reuses the last AI prediction when the frame did not change (lobby, idle). Reduces CPU usage.[/dim]")
+        console.print("[dim]May miss a skill check whose cursor moves between unsampled pixels.[/dim]")
+        self.use_frame_gate = Confirm.ask("[yellow]Enable frame gate?[/yellow]", default=False)
+        status = "Active" if self.use_frame_gate else "Disabled"
+        console.print(f"[green]> Frame gate: {status}[/green]\n")
+
+        # --- Adaptive Scan Rate ---
+        console.print("[bold cyan]Adaptive Scan Rate:[/bold cyan]")
+        console.print("[dim]Scans at 20 FPS while no skill check is visible, switches instantly to full rate when one shows up.[/dim]")
+        self.use_adaptive_scan = Confirm.ask("[yellow]Enable adaptive scan rate?[/yellow]", default=True)
+        status = "Active" if self.use_adaptive_scan else "Disabled"
+        console.print(f"[green]> Adaptive scan rate: {status}[/green]\n")
+
+        # --- Pipelined Loop ---
+        console.print("[bold cyan]Pipelined Loop:[/bold cyan]")
+        console.print("[dim]Captures the next frame while the AI model classifies the current one. Higher FPS on multi-core CPUs.[/dim]")
+        self.use_pipeline = Confirm.ask("[yellow]Enable pipelined loop?[/yellow]", default=False)
+        status = "Active" if self.use_pipeline else "Disabled"
+        console.print(f"[green]> Pipelined loop: {status}[/green]\n")
+
         return True
 
     def edit_defaults(self):
@@ -481,6 +556,12 @@ class DBDAutoSkillCheck:
                 extra = " [dim](Windows - high performance)[/dim]"
             elif method == "mss":
                 extra = " [dim](cross-platform, X11 only)[/dim]"
+            elif method == "xshm":
+                extra = " [dim](Linux X11 - shared memory)[/dim]"
+            elif method == "xdamage":
+                extra = " [dim](Linux X11 - repaint events)[/dim]"
+            elif method == "replay":
+                extra = " [dim](recorded session from replays/)[/dim]"
 
             console.print(f"  [dim]{i}.[/dim] {method}{extra}{marker_str}")
 
@@ -550,6 +631,36 @@ class DBDAutoSkillCheck:
         )
         console.print(f"[green]> Hesitation: {'Active' if config['use_hesitation'] else 'Disabled'}[/green]\n")
 
+        # --- Frame Gate ---
+        current_gate = existing.get("use_frame_gate", False) if existing else False
+        console.print("[bold cyan]Default Frame Gate Setting (skip unchanged frames):[/bold cyan]")
+        console.print(f"  [dim]Current: {'Active' if current_gate else 'Disabled'}[/dim]")
+        config["use_frame_gate"] = Confirm.ask(
+            "[yellow]Enable frame gate by default?[/yellow]",
+            default=current_gate
+        )
+        console.print(f"[green]> Frame gate: {'Active' if config['use_frame_gate'] else 'Disabled'}[/green]\n")
+
+        # --- Adaptive Scan Rate ---
+        current_scan = existing.get("use_adaptive_scan", True) if existing else True
+        console.print("[bold cyan]Default Adaptive Scan Rate Setting (20 FPS patrol while idle):[/bold cyan]")
+        console.print(f"  [dim]Current: {'Active' if current_scan else 'Disabled'}[/dim]")
+        config["use_adaptive_scan"] = Confirm.ask(
+            "[yellow]Enable adaptive scan rate by default?[/yellow]",
+            default=current_scan
+        )
+        console.print(f"[green]> Adaptive scan rate: {'Active' if config['use_adaptive_scan'] else 'Disabled'}[/green]\n")
+
+        # --- Pipelined Loop ---
+        current_pipeline = existing.get("use_pipeline", False) if existing else False
+        console.print("[bold cyan]Default Pipelined Loop Setting (capture overlaps with inference):[/bold cyan]")
+        console.print(f"  [dim]Current: {'Active' if current_pipeline else 'Disabled'}[/dim]")
+        config["use_pipeline"] = Confirm.ask(
+            "[yellow]Enable pipelined loop by default?[/yellow]",
+            default=current_pipeline
+        )
+        console.print(f"[green]> Pipelined loop: {'Active' if config['use_pipeline'] else 'Disabled'}[/green]\n")
+
         # --- Summary & Save ---
         console.print(Panel("[bold]Default Settings Summary[/bold]", box=box.ROUNDED))
 
@@ -563,6 +674,9 @@ class DBDAutoSkillCheck:
         summary.add_row("CPU Threads", str(config["cpu_threads"]))
         summary.add_row("Input Mode", ACTIVE_INPUT_MODE)
         summary.add_row("Hesitation", "Active" if config.get("use_hesitation", True) else "Disabled")
+        summary.add_row("Frame Gate", "Active" if config.get("use_frame_gate", False) else "Disabled")
+        summary.add_row("Adaptive Scan", "Active" if config.get("use_adaptive_scan", True) else "Disabled")
+        summary.add_row("Pipelined Loop", "Active" if config.get("use_pipeline", False) else "Disabled")
         console.print(summary)
         console.print()
 
@@ -589,14 +703,28 @@ class DBDAutoSkillCheck:
                 stats_table.add_row("Duration", f"{int(elapsed // 60):02d}:{int(elapsed % 60):02d}")
             if self.last_hit_desc:
                 stats_table.add_row("Last Hit", self.last_hit_desc)
+            if self.frame_gate is not None:
+                gate = self.frame_gate
+                stats_table.add_row("Skipped Frames", f"{gate.hits}/{gate.hits + gate.misses} ({gate.hit_rate:.0%})")
+            if self.scan_scheduler is not None:
+                scan_stats = self.scan_scheduler.get_stats()
+                stats_table.add_row("Scan Tier", f"{scan_stats['tier']} (patrol {scan_stats['patrol_ratio']:.0%} of time)")
+            if self.ai_model is not None and self.ai_model.presence_model_path is not None:
+                cascade_stats = self.ai_model.get_cascade_stats()
+                stats_table.add_row("Cascade", f"{cascade_stats['escalation_rate']:.0%} of frames escalated to the classifier")
+            if self.pipeline is not None:
+                pipeline_stats = self.pipeline.get_stats()
+                stats_table.add_row("Pipeline", f"capture {pipeline_stats['capture_fps']:.0f} / inference "
+                                                f"{pipeline_stats['inference_fps']:.0f} FPS, "
+                                                f"latency {pipeline_stats['latency_ms'][0]:.1f} ms")
 
         probs_table = Table(box=box.ROUNDED, expand=True)
         probs_table.add_column("Class", style="cyan")
         probs_table.add_column("Probability", style="yellow")
 
         with self.lock:
-            if self.last_probs:
-                for label, prob in sorted(self.last_probs.items(), key=lambda x: x[1], reverse=True):
+            if self.last_prediction is not None:
+                for label, prob in sorted(self.last_prediction.probs.items(), key=lambda x: x[1], reverse=True):
                     bar_len = int(prob * 20)
                     bar = "\u2588" * bar_len + "\u2591" * (20 - bar_len)
                     probs_table.add_row(label, f"{bar} {prob:.1%}")
@@ -609,6 +737,16 @@ class DBDAutoSkillCheck:
             Panel(probs_table, title="[bold]AI Predictions[/bold]", border_style="magenta")
         )
 
+        if self.stage_timer is not None:
+            latency_table = Table(box=box.SIMPLE, expand=True)
+            latency_table.add_column("Stage", style="cyan")
+            for column in ["p50", "p95", "p99", "max"]:
+                latency_table.add_column(column, style="green", justify="right")
+            latency_table.add_column("count", style="dim", justify="right")
+            for stage, p50, p95, p99, max_ms, count in self.stage_timer.rows():
+                latency_table.add_row(stage, f"{p50:.2f}", f"{p95:.2f}", f"{p99:.2f}", f"{max_ms:.2f}", str(count))
+            grid.add_row(Panel(latency_table, title="[bold]Stage Latency (ms)[/bold]", border_style="blue"), "")
+
         status = "[bold green]\u25cf RUNNING[/bold green]" if self.running else "[bold red]\u25cf STOPPED[/bold red]"
         return Panel(
             grid,
@@ -620,11 +758,18 @@ class DBDAutoSkillCheck:
 
     def create_monitoring(self):
         if self.monitoring_type.startswith("v4l2") and v4l2_ok:
-            return Monitoring_v4l2(device_id=self.monitor_id, crop_size=224)
+            return Monitoring_v4l2(device_id=self.monitor_id, crop_size=224, threaded=True)
+        elif self.monitoring_type == "replay" and replay_ok:
+            return Monitoring_replay(self.monitor_id, crop_size=224, realtime=True)
+        elif self.monitoring_type == "xshm" and xshm_ok:
+            return Monitoring_xshm(monitor_id=self.monitor_id, crop_size=224)
+        elif self.monitoring_type == "xdamage" and xdamage_ok:
+            return Monitoring_xdamage(monitor_id=self.monitor_id, crop_size=224)
         elif self.monitoring_type == "bettercam" and bettercam_ok:
             return Monitoring_bettercam(monitor_id=self.monitor_id, crop_size=224, target_fps=240)
         else:
-            return Monitoring_mss(monitor_id=self.monitor_id, crop_size=224)
+            # Threaded capture: mss is owned by its own worker thread, grabbing overlaps with inference
+            return Monitoring_mss(monitor_id=self.monitor_id, crop_size=224, threaded=True)
 
     def ui_update_loop(self):
         """Background thread: update terminal UI."""
@@ -681,6 +826,9 @@ class DBDAutoSkillCheck:
             console.print(f"[dim]  Threads   : {self.cpu_threads}[/dim]")
             console.print(f"[dim]  Input Mode: {ACTIVE_INPUT_MODE}[/dim]")
             console.print(f"[dim]  Humanizer : {'Hesitation ON' if self.use_hesitation else 'Hesitation OFF'}[/dim]")
+            console.print(f"[dim]  Frame Gate: {'ON' if self.use_frame_gate else 'OFF'}[/dim]")
+            console.print(f"[dim]  Adaptive  : {'ON' if self.use_adaptive_scan else 'OFF'}[/dim]")
+            console.print(f"[dim]  Pipeline  : {'ON' if self.use_pipeline else 'OFF'}[/dim]")
             console.print()
         else:
             if not self.select_settings():
@@ -702,7 +850,10 @@ class DBDAutoSkillCheck:
 
         try:
             monitoring = self.create_monitoring()
-            self.ai_model = AI_model(self.model_path, self.use_gpu, self.cpu_threads, monitoring)
+            # Cascade stage-1 presence model, if saved next to the classifier
+            presence_model_path = AI_model.find_presence_model(self.model_path)
+            self.ai_model = AI_model(self.model_path, self.use_gpu, self.cpu_threads, monitoring,
+                                     presence_model_path=presence_model_path, profile=self.profile)
             ep = self.ai_model.check_provider()
 
             if "CUDA" in ep:
@@ -711,6 +862,9 @@ class DBDAutoSkillCheck:
                 console.print("[green]Running on GPU (DirectML)[/green]")
             elif "TensorRT" in ep:
                 console.print("[green]Running on GPU (TensorRT)[/green]")
+            elif self.ai_model.session_config is not None:
+                console.print(f"[yellow]Running on CPU (auto-tuned: "
+                              f"{self.ai_model.session_config['intra_op_num_threads']} threads)[/yellow]")
             else:
                 console.print(f"[yellow]Running on CPU ({self.cpu_threads} threads)[/yellow]")
         except Exception as e:
@@ -723,48 +877,94 @@ class DBDAutoSkillCheck:
         self.running = True
         self.session_start = time()
         self.total_hits = 0
+        self.frame_gate = FrameGate() if self.use_frame_gate else None
+        self.scan_scheduler = AdaptiveScanRate() if self.use_adaptive_scan else None
+        self.stage_timer = TracingStageTimer() if self.profile else StageTimer()
+        self.ai_model.stage_timer = self.stage_timer
+        self.pipeline = FramePipeline(self.ai_model, frame_gate=self.frame_gate, scan_scheduler=self.scan_scheduler,
+                                      stage_timer=self.stage_timer) if self.use_pipeline else None
+        timer = self.stage_timer
 
         # UI update in background thread
         ui_thread = threading.Thread(target=self.ui_update_loop, daemon=True)
         ui_thread.start()
 
-        # Main monitoring loop (same thread as mss - mss is NOT thread-safe)
+        # Main monitoring loop (mss capture runs on its own thread, see Monitoring_mss threaded mode)
         t0 = time()
         nb_frames = 0
+        prediction = None  # last AI model prediction (pred, desc, probs, should_hit)
 
         try:
+            if self.pipeline is not None:
+                self.pipeline.start()
+
             while self.running:
                 if self.ai_model is None:
                     break
 
-                frame_np = self.ai_model.grab_screenshot()
+                if self.pipeline is not None:
+                    # Capture, frame gate and inference run on the pipeline threads
+                    item = self.pipeline.get()
+                    if item is None:
+                        continue
+                    frame_np, prediction = item
+                else:
+                    if self.scan_scheduler is not None:
+                        t_sleep = perf_counter_ns()
+                        self.scan_scheduler.wait()
+                        timer.record(SLEEP, perf_counter_ns() - t_sleep)
+
+                    t_capture = perf_counter_ns()
+                    frame_np = self.ai_model.grab_screenshot()
+                    timer.record(CAPTURE, perf_counter_ns() - t_capture)
+
+                    # Frame gate: reuse the last prediction if the frame did not change
+                    if self.frame_gate is None or self.frame_gate.changed(frame_np):
+                        prediction = self.ai_model.predict(frame_np)  # records preprocess, inference, postprocess
+
+                t_decision = perf_counter_ns()
                 nb_frames += 1
 
-                pred, desc, probs, should_hit = self.ai_model.predict(frame_np)
+                pred = prediction.pred
                 with self.lock:
-                    self.last_probs = probs
+                    self.last_prediction = prediction
+
+                if self.scan_scheduler is not None:
+                    self.scan_scheduler.update(pred, prediction.none_probability)
 
-                if should_hit:
+                if prediction.hit:
+                    t_sleep = perf_counter_ns()
+                    timer.record(DECISION, t_sleep - t_decision)
                     if pred == 2 and self.hit_ante > 0:
                         sleep(self.hit_ante * 0.001)
 
                     # Humanized key press
+                    t_press = perf_counter_ns()
                     cooldown = self.humanizer.press(
                         SPACE, PressKey, ReleaseKey, use_hesitation=self.use_hesitation
                     )
-                    
+                    timer.record(KEY_DISPATCH, perf_counter_ns() - t_press)
+
                     if enable_logging:
-                        logging.info(f"HIT | Pred: {pred} | Desc: {desc} | Cooldown: {cooldown:.4f}s")
+                        logging.info(f"HIT | Pred: {pred} | Desc: {prediction.desc} | Cooldown: {cooldown:.4f}s")
 
                     with self.lock:
                         self.total_hits += 1
-                        self.last_hit_desc = desc
+                        self.last_hit_desc = prediction.desc
 
+                    t_cooldown = perf_counter_ns()
                     sleep(cooldown)
+                    timer.record(SLEEP, perf_counter_ns() - t_cooldown + t_press - t_sleep)  # cooldown + ante-frontier delay
+                    if self.frame_gate is not None:
+                        self.frame_gate.reset()  # do not reuse the hit prediction on a still unchanged frame
+                    if self.pipeline is not None:
+                        self.pipeline.flush()  # frames captured during the cooldown are stale
                     t0 = time()
                     nb_frames = 0
                     continue
 
+                timer.record(DECISION, perf_counter_ns() - t_decision)
+
                 t_diff = time() - t0
                 if t_diff > 1.0:
                     with self.lock:
@@ -780,7 +980,26 @@ class DBDAutoSkillCheck:
             self.running = False
             sleep(0.5)
             console.print("\n[yellow]Stopping...[/yellow]")
+            cascade_stats = None
+            pipeline_stats = None
+            capture_stats = None
+            if self.pipeline is not None:
+                pipeline_stats = self.pipeline.get_stats()
+                self.pipeline.stop()
+            trace = None
             if self.ai_model is not None:
+                if self.ai_model.presence_model_path is not None:
+                    cascade_stats = self.ai_model.get_cascade_stats()
+                if xdamage_ok and isinstance(self.ai_model.monitor, Monitoring_xdamage):
+                    capture_stats = self.ai_model.monitor.get_stats()
+                if self.profile:
+                    try:
+                        trace = export_trace(self.ai_model, self.stage_timer, metadata={
+                            "model": os.path.basename(self.model_path), "device": "GPU" if self.use_gpu else "CPU",
+                            "capture": self.monitoring_type, "cpu_threads": self.cpu_threads,
+                            "pipeline": self.use_pipeline})
+                    except (OSError, ValueError) as e:
+                        console.print(f"[red]Could not save the profiling trace: {e}[/red]")
                 del self.ai_model
                 self.ai_model = None
             console.print("[green]Cleanup done.[/green]")
@@ -789,6 +1008,40 @@ class DBDAutoSkillCheck:
                 console.print(f"\n[bold cyan]Session Summary:[/bold cyan]")
                 console.print(f"  Duration: {int(elapsed // 60)}m {int(elapsed % 60)}s")
                 console.print(f"  Total Hits: {self.total_hits}")
+                if self.frame_gate is not None:
+                    gate = self.frame_gate
+                    console.print(f"  Skipped Frames: {gate.hits}/{gate.hits + gate.misses} ({gate.hit_rate:.0%})")
+                if self.scan_scheduler is not None:
+                    scan_stats = self.scan_scheduler.get_stats()
+                    console.print(f"  Scan Tiers: patrol {scan_stats['time_patrol']:.0f}s, full {scan_stats['time_full']:.0f}s, "
+                                  f"{scan_stats['switches_to_full']} switches to full rate "
+                                  f"(latency mean {scan_stats['switch_latency_mean'] * 1000:.1f}ms, "
+                                  f"max {scan_stats['switch_latency_max'] * 1000:.1f}ms)")
+                if cascade_stats is not None:
+                    console.print(f"  Cascade: {cascade_stats['stage2']}/{cascade_stats['stage1']} frames escalated "
+                                  f"to the classifier ({cascade_stats['escalation_rate']:.0%})")
+                if pipeline_stats is not None:
+                    console.print(f"  Pipeline: {format_stats(pipeline_stats)}")
+                if capture_stats is not None:
+                    console.print(f"  xdamage: {format_xdamage_stats(capture_stats)}")
+                if self.stage_timer is not None and self.stage_timer.histograms:
+                    console.print("  Stage Latency:")
+                    for line in self.stage_timer.format_table().splitlines():
+                        console.print(f"    {line}", markup=False, highlight=False)
+                    try:
+                        latency_file = self.stage_timer.dump_json(metadata={
+                            "model": os.path.basename(self.model_path), "device": "GPU" if self.use_gpu else "CPU",
+                            "capture": self.monitoring_type, "cpu_threads": self.cpu_threads,
+                            "pipeline": self.use_pipeline})
+                        console.print(f"  [dim]Stage latency saved to {latency_file}[/dim]")
+                    except OSError as e:
+                        console.print(f"  [red]Could not save the stage latency: {e}[/red]")
+                if trace is not None:
+                    trace_path, summary = trace
+                    console.print("  Profile:")
+                    for line in format_summary(summary).splitlines():
+                        console.print(f"    {line}", markup=False, highlight=False)
+                    console.print(f"  [dim]Trace saved to {trace_path} (open in https://ui.perfetto.dev)[/dim]")
 
 
 def main():
@@ -799,6 +1052,8 @@ def main():
                "  python tui.py          # Interactive settings\n"
                "  python tui.py -s       # Quick start with saved/platform defaults\n"
                "  python tui.py -d       # Edit & save default settings\n"
+               "  python tui.py --autotune models/model.onnx  # Tune CPU inference for this machine\n"
+               "  python tui.py -s --profile  # Save a profiling trace of the session\n"
     )
     parser.add_argument("-s", "--skip", action="store_true",
                         help="Skip settings menu, start with saved defaults or platform defaults")
@@ -806,9 +1061,19 @@ def main():
                         help="Edit and save default settings to config.json")
     parser.add_argument("-l", "--log", action="store_true",
                         help="Enable logging to logs/ directory")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile the AI model (ONNX Runtime) and the loop stages, save a Chrome/Perfetto trace at exit")
+    parser.add_argument("--autotune", nargs="?", const="models/model.onnx", metavar="MODEL",
+                        help="Benchmark ONNX Runtime CPU session options for MODEL on this machine, save the fastest and exit")
     args = parser.parse_args()
 
+    if args.autotune:
+        from dbd.utils.ort_tuner import tune
+        tune(args.autotune)
+        return
+
     app = DBDAutoSkillCheck()
+    app.profile = args.profile
 
     def signal_handler(sig, frame):
         app.running = False